@@ -0,0 +1,109 @@
+"""
+Crash-safe file writes for XMP presets
+
+Every preset is written to a temporary file in its own folder and moved over
+the original with os.replace, so a preset is always either the old or the new
+version, never a truncated one. With fsync enabled the new content is flushed
+to disk before the rename, and the folders are flushed afterwards to make the
+renames themselves durable; folder flushes are batched, so a bulk update
+flushes each folder once per batch instead of once per file.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+# Sufixo dos arquivos temporários: não termina em .xmp, então o escaneamento os ignora
+TEMP_SUFFIX = ".tmp"
+
+
+def fsync_directory(folder):
+    """Grava em disco as entradas de uma pasta (renomeações); sem efeito onde não há suporte (Windows)"""
+    if os.name == 'nt':
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class AtomicWriter:
+    """
+    Substitui arquivos de forma atômica: arquivo temporário + fsync opcional + os.replace
+
+    As pastas com renomeações pendentes são sincronizadas a cada dir_sync_batch
+    gravações e em flush(); use o writer como gerenciador de contexto para garantir
+    o flush final. Um mesmo writer pode ser usado por várias threads.
+    """
+
+    def __init__(self, fsync=True, dir_sync_batch=64):
+        self.fsync = fsync
+        self.dir_sync_batch = dir_sync_batch
+        self._pending_dirs = set()
+        self._pending_writes = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def write_text(self, file_path, content, encoding='utf-8'):
+        """
+        Grava content (str) em file_path, preservando as permissões do arquivo original
+
+        As quebras de linha são convertidas como no modo texto (os.linesep).
+
+        Returns:
+            Os bytes gravados (para calcular o hash sem reler o arquivo)
+        """
+        if os.linesep != '\n':
+            content = content.replace('\n', os.linesep)
+        data = content.encode(encoding)
+        self._write(file_path, data)
+        return data
+
+    def write_bytes(self, file_path, data):
+        """Grava data (bytes) em file_path sem nenhuma conversão, preservando as permissões"""
+        self._write(file_path, data)
+
+    def _write(self, file_path, data):
+        folder, name = os.path.split(file_path)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=TEMP_SUFFIX, dir=folder or None)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            try:
+                shutil.copymode(file_path, temp_path)
+            except OSError:
+                pass
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        if self.fsync:
+            with self._lock:
+                self._pending_dirs.add(folder or os.curdir)
+                self._pending_writes += 1
+                batch_full = self._pending_writes >= self.dir_sync_batch
+            if batch_full:
+                self.flush()
+
+    def flush(self):
+        """Sincroniza as pastas com renomeações ainda não gravadas em disco"""
+        with self._lock:
+            pending, self._pending_dirs = self._pending_dirs, set()
+            self._pending_writes = 0
+        for folder in pending:
+            try:
+                fsync_directory(folder)
+            except OSError as e:
+                print(f"Error syncing folder {folder}: {str(e)}")
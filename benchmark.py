@@ -0,0 +1,382 @@
+"""
+Microbenchmarks for Preset Catalog
+
+Generates a synthetic library of realistic Lightroom presets (large tone curves
+and mask sections after the metadata) in a temporary folder and times the
+XMPManager operations that dominate a scan of a big library.
+
+Usage:
+    python benchmark.py extract [--files N] [--size KB]
+    python benchmark.py memory [--files N]
+    python benchmark.py search [--files N]
+    python benchmark.py write [--files N] [--size KB]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from atomic_io import AtomicWriter
+from xmp_manager import (
+    READ_MODES, PresetRecord, XMPManager, read_metadata_full, read_metadata_mmap, read_metadata_prefix, scan_metadata
+)
+
+
+PRESET_TEMPLATE = '''<x:xmpmeta xmlns:x="adobe:ns:meta/" x:xmptk="Adobe XMP Core 7.0-c000 1.000000, 0000/00/00-00:00:00        ">
+ <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+  <rdf:Description rdf:about=""
+    xmlns:crs="http://ns.adobe.com/camera-raw-settings/1.0/"
+    crs:PresetType="Normal"
+    crs:Cluster="{cluster}"
+    crs:UUID="{uuid:032x}"
+    crs:SupportsAmount="True"
+    crs:Version="15.0"
+    crs:ProcessVersion="11.0"
+    crs:Exposure2012="+0.35"
+    crs:Contrast2012="+12"
+    crs:HasSettings="True">
+   <crs:Name>
+    <rdf:Alt>
+     <rdf:li xml:lang="x-default">{name}</rdf:li>
+    </rdf:Alt>
+   </crs:Name>
+{group}   <crs:ToneCurvePV2012>
+    <rdf:Seq>
+{curve}    </rdf:Seq>
+   </crs:ToneCurvePV2012>
+   <crs:MaskGroupBasedCorrections>
+    <rdf:Seq>
+{masks}    </rdf:Seq>
+   </crs:MaskGroupBasedCorrections>
+  </rdf:Description>
+ </rdf:RDF>
+</x:xmpmeta>
+'''
+
+GROUP_TEMPLATE = '''   <crs:Group>
+    <rdf:Alt>
+     <rdf:li xml:lang="x-default">{group}</rdf:li>
+    </rdf:Alt>
+   </crs:Group>
+'''
+
+MASK_TEMPLATE = '''     <rdf:li>
+      <rdf:Description
+       crs:What="Correction"
+       crs:CorrectionAmount="1.000000"
+       crs:CorrectionActive="true"
+       crs:CorrectionName="Mask {index}"
+       crs:LocalExposure2012="0.120000"
+       crs:LocalContrast2012="-0.080000"
+       crs:LocalHighlights2012="-0.250000">
+      <crs:CorrectionMasks>
+       <rdf:Seq>
+        <rdf:li
+         crs:What="Mask/Image"
+         crs:MaskActive="true"
+         crs:MaskName="Subject {index}"
+         crs:MaskSubType="1"/>
+       </rdf:Seq>
+      </crs:CorrectionMasks>
+      </rdf:Description>
+     </rdf:li>
+'''
+
+
+def make_library(folder, files, size_kb):
+    """
+    Cria `files` presets de aproximadamente `size_kb` KB em clusters/grupos de exemplo
+
+    Um em cada três presets não tem a tag crs:Group (presets do usuário sem grupo),
+    o pior caso para a extração, que precisa olhar até o fim da rdf:Description.
+    """
+    mask_size = len(MASK_TEMPLATE.format(index=0))
+    masks = ''.join(MASK_TEMPLATE.format(index=i) for i in range(max(1, size_kb * 1024 // mask_size)))
+    curve = ''.join(f'     <rdf:li>{k}, {min(255, k + k // 8)}</rdf:li>\n' for k in range(0, 256, 4))
+
+    paths = []
+    for i in range(files):
+        cluster = f"Cluster {i % 7}"
+        group = f"Group {i % 31}"
+        group_xml = GROUP_TEMPLATE.format(group=group) if i % 3 else ""
+        subfolder = os.path.join(folder, cluster, group)
+        os.makedirs(subfolder, exist_ok=True)
+        path = os.path.join(subfolder, f"Preset {i:05d}.xmp")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(PRESET_TEMPLATE.format(
+                cluster=cluster, group=group_xml, name=f"Preset {i}", uuid=i, curve=curve, masks=masks
+            ))
+        paths.append(path)
+    return paths
+
+
+def legacy_extract_metadata(file_path):
+    """Extração anterior (regex por chamada sobre o arquivo inteiro), usada como referência"""
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        return legacy_parse_metadata(f.read())
+
+
+def legacy_parse_metadata(content):
+    cluster = ""
+    group = ""
+    cluster_match = re.search(r'crs:Cluster\s*=\s*"([^"]*)"', content)
+    if cluster_match:
+        cluster = cluster_match.group(1)
+    for pattern in [
+        r'<crs:Group>.*?<rdf:li xml:lang="x-default">(.*?)</rdf:li>',
+        r'<crs:Group><rdf:Alt><rdf:li.*?>(.*?)</rdf:li>',
+        r'crs:Group="([^"]*)"'
+    ]:
+        group_match = re.search(pattern, content, re.DOTALL)
+        if group_match:
+            group = group_match.group(1)
+            break
+    return cluster, group
+
+
+def time_per_file(label, fn, items, repeat):
+    """Executa fn em todos os itens `repeat` vezes e imprime o melhor tempo por arquivo"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<44} {best / len(items) * 1e6:10.1f} us/file  {len(items) / best:10.0f} files/s")
+    return best
+
+
+def peak_allocation_per_file(fn, items):
+    """Média do pico de memória alocada (tracemalloc) durante cada chamada de fn"""
+    total = 0
+    tracemalloc.start()
+    try:
+        for item in items:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(item)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / len(items)
+
+
+def bench_extract(args):
+    manager = XMPManager()
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_library(folder, args.files, args.size)
+        size = sum(os.path.getsize(path) for path in paths) / len(paths)
+        print(f"extract_metadata: {len(paths)} presets, {size / 1024:.0f} KB each (best of {args.repeat})")
+
+        # Todos os caminhos precisam concordar antes de comparar o tempo
+        for path in paths:
+            expected = legacy_extract_metadata(path)
+            for read_mode in READ_MODES:
+                if manager.extract_metadata(path, read_mode) != expected:
+                    print(f"  mismatch in {path} ({read_mode})")
+                    return 1
+
+        # Só a análise, com o conteúdo já em memória
+        contents = []
+        for path in paths:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                contents.append(f.read())
+        legacy = time_per_file("parse: legacy (re.search)", legacy_parse_metadata, contents, args.repeat)
+        current = time_per_file("parse: scan_metadata", scan_metadata, contents, args.repeat)
+        print(f"  parse speedup: {legacy / current:.1f}x")
+
+        # Leitura + análise (o que o escaneamento paga por arquivo)
+        legacy = time_per_file("read+parse: legacy", legacy_extract_metadata, paths, args.repeat)
+        for read_mode in READ_MODES:
+            current = time_per_file(f"read+parse: extract_metadata ({read_mode})",
+                                    lambda path: manager.extract_metadata(path, read_mode), paths, args.repeat)
+            print(f"  read+parse speedup ({read_mode}): {legacy / current:.1f}x")
+
+        # Bytes lidos (ou examinados, no mmap) e pico de memória alocada por arquivo em cada modo
+        readers = {'full': read_metadata_full, 'prefix': read_metadata_prefix, 'mmap': read_metadata_mmap}
+        for read_mode in READ_MODES:
+            read = sum(readers[read_mode](path)[2] for path in paths)
+            peak = peak_allocation_per_file(lambda path: manager.extract_metadata(path, read_mode), paths)
+            print(f"  {read_mode:<6} bytes read {read / len(paths) / 1024:8.1f} KB/file   "
+                  f"peak allocation {peak / 1024:8.1f} KB/file")
+    return 0
+
+
+def legacy_record(root, folder, file, cluster, group):
+    """Dicionário de seis chaves que o escaneamento produzia antes do PresetRecord"""
+    file_path = os.path.join(root, file)
+    rel_file_path = os.path.relpath(file_path, folder)
+    return {
+        'filename': file,
+        'display_name': rel_file_path,
+        'path': file_path,
+        'rel_path': rel_file_path,
+        # Cada arquivo lido produzia strings próprias para cluster e grupo
+        'cluster': ''.join(cluster),
+        'group': ''.join(group),
+    }
+
+
+def compact_record(root, folder, file, cluster, group):
+    file_path = os.path.join(root, file)
+    return PresetRecord(file_path, len(file_path) - len(file), len(os.path.join(folder, '')),
+                        sys.intern(''.join(cluster)), sys.intern(''.join(group)))
+
+
+def traced_size(build):
+    """Memória retida (tracemalloc) pelo resultado de build()"""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        result = build()
+        size = tracemalloc.get_traced_memory()[0] - base
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def bench_memory(args):
+    folder = os.path.join(tempfile.gettempdir(), "Presets")
+    # Mesma distribuição do escaneamento real: poucos clusters/grupos, muitos arquivos
+    entries = []
+    for i in range(args.files):
+        cluster = f"Cluster {i % 7}"
+        group = f"Group {i % 31}"
+        entries.append((os.path.join(folder, cluster, group), f"Preset {i:05d}.xmp", cluster, group))
+    print(f"scanned preset records: {len(entries)} presets")
+
+    results = {}
+    for label, make in (("dict (legacy)", legacy_record), ("PresetRecord", compact_record)):
+        size, records = traced_size(lambda: [make(root, folder, file, cluster, group)
+                                             for root, file, cluster, group in entries])
+        results[label] = size
+        print(f"  {label:<16} {size / 1024 / 1024:8.2f} MB  {size / len(records):8.0f} bytes/preset")
+        del records
+    print(f"  memory reduction: {results['dict (legacy)'] / results['PresetRecord']:.1f}x")
+    return 0
+
+
+def bench_search(args):
+    manager = XMPManager()
+    folder = os.path.join(tempfile.gettempdir(), "Presets")
+    words = ["Warm", "Cold", "Film", "Portra", "Moody", "Vintage", "Matte", "BW", "Teal", "Orange"]
+    for i in range(args.files):
+        cluster = f"Cluster {i % 37}"
+        group = f"{words[i % 10]} {i % 30}"
+        record = compact_record(os.path.join(folder, cluster, group), folder,
+                                f"{words[i * 7 % 10]} {words[i * 3 % 10]} {i:05d}.xmp", cluster, group)
+        manager.ids_by_path[record.path] = i
+        manager.xmp_files.append(record)
+        manager.catalog.add(i, record)
+
+    start = time.perf_counter()
+    manager.search_presets("")
+    print(f"search_presets: {args.files} presets, index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # O modelo da tabela da janela, ordenado pelo nome, se o PySide6 estiver instalado
+    try:
+        from PySide6.QtCore import QCoreApplication
+        from models import PresetTableModel
+    except ImportError:
+        table = None
+        print("  PySide6 not installed: table pass not measured")
+    else:
+        app = QCoreApplication.instance() or QCoreApplication([])
+        table = PresetTableModel()
+        table.append_files(manager.xmp_files)
+        table.set_visible_rows([])
+        table.sort(PresetTableModel.NAME_COLUMN)
+
+    # Digitação de uma consulta, uma tecla por vez, em cada modo
+    for mode, query in (("contains", "portra 1"), ("prefix", "moody m"), ("regex", r"teal.*4\.xmp$")):
+        worst = worst_table = 0
+        for length in range(1, len(query) + 1):
+            start = time.perf_counter()
+            try:
+                ids = manager.search_presets(query[:length], mode)
+            except re.error:
+                continue  # Expressão ainda incompleta, como na barra de filtro
+            searched = time.perf_counter()
+            worst = max(worst, searched - start)
+            if table is not None:
+                # Como em apply_filter: troca as linhas exibidas, que são reordenadas pelo modelo
+                table.set_visible_rows(ids)
+                app.processEvents()
+                worst_table = max(worst_table, time.perf_counter() - searched)
+        line = f"  {mode:<8} {query!r:<18} {len(ids):6d} matches   worst keystroke {worst * 1000:6.1f} ms"
+        if table is not None:
+            line += f" + table {worst_table * 1000:6.1f} ms"
+        print(line)
+    return 0
+
+
+def legacy_write(file_path, content):
+    """Gravação anterior: o arquivo é truncado e reescrito no lugar"""
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def bench_write(args):
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_library(folder, args.files, args.size)
+        contents = {}
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                contents[path] = f.read()
+        print(f"preset writes: {len(paths)} presets, {args.size} KB each, in {len({os.path.dirname(p) for p in paths})} folders")
+
+        strategies = [
+            ("in place (legacy, not crash-safe)", None),
+            ("atomic, no fsync", AtomicWriter(fsync=False)),
+            ("atomic, fsync, folder sync per file", AtomicWriter(fsync=True, dir_sync_batch=1)),
+            ("atomic, fsync, folder sync per 64 files", AtomicWriter(fsync=True, dir_sync_batch=64)),
+        ]
+        for label, writer in strategies:
+            start = time.perf_counter()
+            if writer is None:
+                for path in paths:
+                    legacy_write(path, contents[path])
+            else:
+                with writer:
+                    for path in paths:
+                        writer.write_text(path, contents[path])
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<44} {elapsed / len(paths) * 1000 * 1000:10.1f} ms/1000 files  "
+                  f"{len(paths) / elapsed:8.0f} files/s")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preset Catalog microbenchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser("extract", help="metadata extraction per file")
+    extract.add_argument("--files", type=int, default=500, help="number of presets (default: 500)")
+    extract.add_argument("--size", type=int, default=200, help="approximate preset size in KB (default: 200)")
+    extract.add_argument("--repeat", type=int, default=3, help="repetitions, best time is reported (default: 3)")
+    extract.set_defaults(func=bench_extract)
+
+    memory = subparsers.add_parser("memory", help="memory held by the scanned preset records")
+    memory.add_argument("--files", type=int, default=40000, help="number of presets (default: 40000)")
+    memory.set_defaults(func=bench_memory)
+
+    search = subparsers.add_parser("search", help="filter bar search per keystroke")
+    search.add_argument("--files", type=int, default=50000, help="number of presets (default: 50000)")
+    search.set_defaults(func=bench_search)
+
+    write = subparsers.add_parser("write", help="cost of crash-safe preset writes")
+    write.add_argument("--files", type=int, default=1000, help="number of presets (default: 1000)")
+    write.add_argument("--size", type=int, default=20, help="approximate preset size in KB (default: 20)")
+    write.set_defaults(func=bench_write)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+In-memory inverted index over the scanned presets
+
+Keeps an interned vocabulary of the cluster, group and folder strings (a large
+library has tens of thousands of presets but only a few hundred distinct values)
+and maps each value to the ids of the presets that use it. Preset ids are the
+positions in XMPManager.xmp_files. The index is rebuilt on every scan and kept
+up to date on every write, so questions like "all presets in cluster X" are
+answered without iterating the library or re-reading files.
+"""
+
+import os
+
+
+class CatalogIndex:
+    """Vocabulário internado e índices invertidos cluster/grupo/pasta -> ids dos presets"""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._vocabulary = {}  # Valor -> instância única do valor
+        self._by_cluster = {}  # Cluster -> set de ids
+        self._by_group = {}  # Grupo -> set de ids
+        self._by_folder = {}  # Pasta (normalizada) -> set de ids (somente arquivos diretamente na pasta)
+
+    def intern(self, value):
+        """Retorna a instância única de value no vocabulário"""
+        return self._vocabulary.setdefault(value, value)
+
+    # Atualização
+
+    def add(self, preset_id, record):
+        """
+        Indexa um preset recém-escaneado
+
+        Os valores de cluster e grupo do registro são substituídos pelas instâncias do vocabulário.
+        """
+        record.cluster = self.intern(record.cluster)
+        record.group = self.intern(record.group)
+        folder = self.intern(os.path.normpath(os.path.dirname(record.path)))
+
+        self._by_cluster.setdefault(record.cluster, set()).add(preset_id)
+        self._by_group.setdefault(record.group, set()).add(preset_id)
+        self._by_folder.setdefault(folder, set()).add(preset_id)
+
+    def update(self, preset_id, record, cluster, group):
+        """Move um preset para os novos valores de cluster e grupo, atualizando o registro"""
+        cluster = self.intern(cluster)
+        group = self.intern(group)
+        if cluster is not record.cluster:
+            self._move(self._by_cluster, preset_id, record.cluster, cluster)
+            record.cluster = cluster
+        if group is not record.group:
+            self._move(self._by_group, preset_id, record.group, group)
+            record.group = group
+
+    @staticmethod
+    def _move(index, preset_id, old_value, new_value):
+        ids = index.get(old_value)
+        if ids is not None:
+            ids.discard(preset_id)
+            if not ids:
+                del index[old_value]
+        index.setdefault(new_value, set()).add(preset_id)
+
+    # Consultas (ids em ordem de escaneamento)
+
+    def ids_with_cluster(self, cluster):
+        return sorted(self._by_cluster.get(cluster, ()))
+
+    def ids_with_group(self, group):
+        return sorted(self._by_group.get(group, ()))
+
+    def ids_in_folder(self, folder, recursive=True):
+        """Ids dos presets na pasta (e, se recursive, em todas as subpastas)"""
+        folder = os.path.normpath(folder)
+        if not recursive:
+            return sorted(self._by_folder.get(folder, ()))
+
+        prefix = os.path.join(folder, "")
+        ids = set()
+        for name, folder_ids in self._by_folder.items():
+            if name == folder or name.startswith(prefix):
+                ids.update(folder_ids)
+        return sorted(ids)
+
+    def ids_matching_cluster(self, predicate):
+        """Set de ids dos presets cujo cluster satisfaz predicate (testado uma vez por valor distinto)"""
+        return self._ids_matching(self._by_cluster, predicate)
+
+    def ids_matching_group(self, predicate):
+        """Set de ids dos presets cujo grupo satisfaz predicate (testado uma vez por valor distinto)"""
+        return self._ids_matching(self._by_group, predicate)
+
+    @staticmethod
+    def _ids_matching(index, predicate):
+        ids = set()
+        # Cópia dos itens: o escaneamento pode acrescentar valores a partir de outra thread
+        for value, value_ids in list(index.items()):
+            if predicate(value):
+                ids.update(value_ids)
+        return ids
+
+    def cluster_counts(self):
+        """Cluster -> número de presets"""
+        return {cluster: len(ids) for cluster, ids in self._by_cluster.items()}
+
+    def group_counts(self):
+        """Grupo -> número de presets"""
+        return {group: len(ids) for group, ids in self._by_group.items()}
+
+    def folder_counts(self):
+        """Pasta -> número de presets diretamente nela"""
+        return {folder: len(ids) for folder, ids in self._by_folder.items()}
@@ -0,0 +1,120 @@
+"""
+Filesystem watcher for the Preset Catalog GUI
+
+Watches the folders and the preset files of the scanned library with
+QFileSystemWatcher and reports, after a short debounce, which folders changed
+(files added, removed or renamed) and which presets were edited in place (a
+change to a file's content does not notify its folder), so the catalog can be
+refreshed incrementally instead of rescanning everything. When the paths cannot
+be watched (e.g. watch limit reached or unsupported network shares) it falls
+back to asking for a periodic full check of the library.
+"""
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+
+class CatalogWatcher(QObject):
+    """Observa as pastas da biblioteca e agrupa as notificações de mudança"""
+
+    folders_changed = Signal(list)  # pastas com arquivos ou subpastas adicionados/removidos/substituídos
+    files_changed = Signal(list)  # presets modificados no lugar (sem mudança na pasta)
+    poll_requested = Signal()  # modo polling: hora de verificar a biblioteca inteira
+
+    def __init__(self, parent=None, debounce_ms=500, poll_interval_ms=30000):
+        super().__init__(parent)
+        self._watcher = None
+        self._pending = set()
+        self._pending_files = set()
+        self.mode = None  # None, 'watch' ou 'poll'
+
+        # Uma cópia de arquivo ou uma gravação do Lightroom gera várias notificações seguidas
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self._flush)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(poll_interval_ms)
+        self._poll_timer.timeout.connect(self.poll_requested)
+
+    def watch(self, folders, files=()):
+        """
+        Passa a observar as pastas e os arquivos informados
+
+        Args:
+            folders: A pasta raiz e todas as subpastas escaneadas
+            files: Os presets escaneados, para perceber edições feitas no próprio arquivo
+        """
+        self.stop()
+        if not folders:
+            return
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+        paths = list(folders) + list(files)
+        failed = self._watcher.addPaths(paths)
+        if failed:
+            print(f"Could not watch {len(failed)} of {len(paths)} folders and files, polling for changes instead")
+            self._start_polling()
+        else:
+            self.mode = 'watch'
+
+    def add_paths(self, folders=(), files=()):
+        """
+        Acrescenta à observação pastas e arquivos novos (criados depois do escaneamento)
+
+        Também serve para arquivos substituídos por uma gravação atômica, que deixam de
+        ser observados quando o original é trocado.
+        """
+        paths = list(folders) + list(files)
+        if self.mode != 'watch' or not paths:
+            return
+        # Caminhos já observados são devolvidos em failed; só os demais contam como falha
+        watched = set(self._watcher.directories()) | set(self._watcher.files())
+        paths = [path for path in paths if path not in watched]
+        failed = self._watcher.addPaths(paths) if paths else []
+        if failed:
+            print(f"Could not watch {len(failed)} new folders and files, polling for changes instead")
+            self._start_polling()
+
+    def stop(self):
+        """Para de observar (por exemplo, quando uma nova pasta vai ser escaneada)"""
+        self._debounce.stop()
+        self._poll_timer.stop()
+        self._pending.clear()
+        self._pending_files.clear()
+        self._release_watcher()
+        self.mode = None
+
+    def _start_polling(self):
+        self._release_watcher()
+        self._pending.clear()
+        self._pending_files.clear()
+        self.mode = 'poll'
+        self._poll_timer.start()
+
+    def _release_watcher(self):
+        if self._watcher is not None:
+            self._watcher.directoryChanged.disconnect(self._on_directory_changed)
+            self._watcher.fileChanged.disconnect(self._on_file_changed)
+            self._watcher.deleteLater()
+            self._watcher = None
+
+    def _on_directory_changed(self, folder):
+        self._pending.add(folder)
+        self._debounce.start()
+
+    def _on_file_changed(self, file_path):
+        self._pending_files.add(file_path)
+        self._debounce.start()
+
+    def _flush(self):
+        if self._pending:
+            folders = sorted(self._pending)
+            self._pending.clear()
+            self.folders_changed.emit(folders)
+        if self._pending_files:
+            files = sorted(self._pending_files)
+            self._pending_files.clear()
+            self.files_changed.emit(files)
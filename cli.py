@@ -0,0 +1,308 @@
+"""
+Headless command-line interface for Preset Catalog
+
+Drives XMPManager directly, without PySide6, so presets can be cataloged on
+build servers and in pipelines. Results are written as JSON or CSV to stdout
+(or to --output); the scan log goes to stderr.
+
+Usage:
+    python cli.py scan FOLDER [--format json|csv]
+    python cli.py report FOLDER
+    python cli.py smart-detect FOLDER [--apply] [--dry-run]
+    python cli.py apply FOLDER [--cluster NAME] [--group NAME] [--filter QUERY] [--dry-run]
+    python cli.py apply FOLDER --plan PATH [--dry-run]
+    python cli.py fix FOLDER [--dry-run]
+    python cli.py resume FOLDER --journal PATH
+    python cli.py rollback FOLDER --journal PATH
+    python cli.py undo FOLDER --snapshots DIR [--count N] [--force] [--list]
+    python cli.py backup FOLDER ZIP_PATH
+
+Common options: --workers N, --scan-mode serial|thread|process, --read-mode
+full|prefix|mmap, --index PATH (persistent metadata index), --no-recursive,
+--no-fsync, --quiet. With --dry-run the write commands print the change plan
+(old -> new values, group repairs, bytes to write) without touching any file;
+--plan-out PATH saves that plan, and apply --plan PATH later writes exactly it,
+skipping presets modified in the meantime. With --journal PATH they record each file's progress, so an interrupted run can
+be finished with resume or undone with rollback. With --snapshots DIR every run
+keeps the original bytes of the files it rewrites, so the last runs can be
+reverted with undo.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import re
+import sys
+
+from search_index import SEARCH_FIELDS, SEARCH_MODES
+from xmp_manager import READ_MODES, SCAN_MODES, EditPlan, XMPManager
+
+# Colunas da saída CSV de cada comando
+PRESET_FIELDS = ['path', 'rel_path', 'cluster', 'group']
+REPORT_FIELDS = ['kind', 'value', 'count']
+DETECTION_FIELDS = ['path', 'current_cluster', 'current_group', 'suggested_cluster', 'suggested_group',
+                    'needs_cluster_update', 'needs_group_update']
+RESULT_FIELDS = ['path', 'written', 'unchanged', 'cluster', 'group', 'repaired', 'new_cluster', 'new_group', 'error']
+HISTORY_FIELDS = ['id', 'created', 'description', 'files']
+PLAN_FIELDS = ['path', 'changed', 'old_cluster', 'new_cluster', 'old_group', 'new_group', 'repair', 'bytes', 'error']
+
+
+def write_output(args, rows, fields):
+    """
+    Grava rows (lista de dicionários) como JSON ou CSV em args.output ou na saída padrão
+
+    Só as chaves de fields são gravadas, nos dois formatos (as linhas podem ter outras,
+    como o PresetRecord em file_info das sugestões da detecção inteligente).
+    """
+    with contextlib.ExitStack() as stack:
+        if args.output:
+            out = stack.enter_context(open(args.output, 'w', encoding='utf-8', newline=''))
+        else:
+            out = args.stdout
+        if args.format == 'csv':
+            writer = csv.DictWriter(out, fieldnames=fields, extrasaction='ignore', lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump([{field: row.get(field) for field in fields} for row in rows], out, indent=2, ensure_ascii=False)
+            out.write('\n')
+
+
+def preset_row(record):
+    return {'path': record.path, 'rel_path': record.rel_path, 'cluster': record.cluster, 'group': record.group}
+
+
+def result_row(result):
+    return {field: result[field] for field in RESULT_FIELDS}
+
+
+def scan(args):
+    """Cria o XMPManager com as opções comuns e escaneia a pasta"""
+    if not os.path.isdir(args.folder):
+        raise SystemExit(f"error: folder not found: {args.folder}")
+    manager = XMPManager(index_path=args.index, read_mode=args.read_mode, fsync=not args.no_fsync,
+                         snapshot_dir=args.snapshots)
+    manager.scan_xmp_files(args.folder, recursive=not args.no_recursive, force_rebuild=args.rebuild_index,
+                           mode=args.scan_mode, workers=args.workers)
+    return manager
+
+
+def selected_files(args, manager):
+    """Presets escolhidos por --filter (todos, sem filtro), na ordem do escaneamento"""
+    if not args.filter:
+        return list(manager.xmp_files)
+    try:
+        ids = manager.search_presets(args.filter, args.filter_mode, args.filter_fields)
+    except re.error as e:
+        raise SystemExit(f"error: invalid --filter regex: {e}")
+    return [manager.xmp_files[i] for i in ids]
+
+
+def exit_code(results):
+    return 1 if any(result['error'] for result in results) else 0
+
+
+def run_edits(args, manager, targets, repair_groups=True):
+    """Planeja os alvos (file_path, cluster, grupo) e grava o plano, ou só o mostra com --dry-run"""
+    plan = manager.plan_edits(targets, repair_groups=repair_groups)
+    if args.plan_out:
+        plan.save(args.plan_out)
+    return run_plan(args, manager, plan)
+
+
+def run_plan(args, manager, plan):
+    """Executa um plano de plan_edits, ou só o mostra com --dry-run"""
+    if args.dry_run:
+        summary = plan.summary()
+        print(f"Dry run: {summary['changed']} of {summary['files']} files would change "
+              f"({summary['bytes']} bytes), {summary['errors']} errors")
+        write_output(args, [{field: getattr(entry, field) for field in PLAN_FIELDS} for entry in plan.entries],
+                     PLAN_FIELDS)
+        return 1 if summary['errors'] else 0
+
+    results = manager.execute_plan(plan, journal_path=args.journal, workers=args.workers)
+    write_output(args, [result_row(result) for result in results], RESULT_FIELDS)
+    return exit_code(results)
+
+
+def cmd_scan(args):
+    manager = scan(args)
+    write_output(args, [preset_row(record) for record in selected_files(args, manager)], PRESET_FIELDS)
+    return 0
+
+
+def cmd_report(args):
+    manager = scan(args)
+    catalog = manager.catalog
+    errors = sum(1 for record in manager.xmp_files if record.cluster == '(error)')
+    rows = [
+        {'kind': 'total', 'value': '', 'count': len(manager.xmp_files)},
+        {'kind': 'errors', 'value': '', 'count': errors},
+        {'kind': 'missing_cluster', 'value': '', 'count': len(catalog.ids_with_cluster(''))},
+        {'kind': 'missing_group', 'value': '', 'count': len(catalog.ids_with_group(''))},
+    ]
+    for kind, counts in (('cluster', catalog.cluster_counts()), ('group', catalog.group_counts())):
+        rows.extend({'kind': kind, 'value': value, 'count': count}
+                    for value, count in sorted(counts.items()) if value)
+    write_output(args, rows, REPORT_FIELDS)
+    return 0
+
+
+def cmd_smart_detect(args):
+    manager = scan(args)
+    if args.apply or args.dry_run:
+        return run_edits(args, manager, manager.smart_detection_targets(args.folder))
+
+    discoveries = [discovery for discovery in manager.auto_discover_metadata(args.folder)
+                   if discovery['needs_cluster_update'] or discovery['needs_group_update']]
+    write_output(args, discoveries, DETECTION_FIELDS)
+    return 0
+
+
+def cmd_apply(args):
+    if args.plan:
+        if args.cluster is not None or args.group is not None or args.filter or args.plan_out:
+            raise SystemExit("error: apply --plan cannot be combined with --cluster, --group, --filter or --plan-out")
+        try:
+            plan = EditPlan.load(args.plan)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"error: cannot read plan {args.plan}: {e}")
+        return run_plan(args, scan(args), plan)
+    if args.cluster is None and args.group is None:
+        raise SystemExit("error: apply needs --cluster and/or --group (or --plan)")
+    manager = scan(args)
+    targets = [(record.path, args.cluster, args.group) for record in selected_files(args, manager)]
+    return run_edits(args, manager, targets)
+
+
+def cmd_fix(args):
+    manager = scan(args)
+    return run_edits(args, manager, [(record.path, None, None) for record in selected_files(args, manager)])
+
+
+def cmd_resume(args):
+    manager = scan(args)
+    results = manager.resume_batch(args.journal, workers=args.workers)
+    if results is None:
+        raise SystemExit(f"error: no interrupted batch in {args.journal}")
+    write_output(args, [result_row(result) for result in results], RESULT_FIELDS)
+    return exit_code(results)
+
+
+def cmd_rollback(args):
+    manager = scan(args)
+    results = manager.rollback_batch(args.journal)
+    if results is None:
+        raise SystemExit(f"error: no interrupted batch in {args.journal}")
+    write_output(args, [result_row(result) for result in results], RESULT_FIELDS)
+    return exit_code(results)
+
+
+def cmd_undo(args):
+    if not args.snapshots:
+        raise SystemExit("error: undo needs --snapshots")
+    manager = scan(args)
+    if args.list:
+        rows = [{'id': operation['id'], 'created': operation['created'], 'description': operation['description'],
+                 'files': len(operation['files'])} for operation in manager.snapshots.operations()]
+        write_output(args, rows, HISTORY_FIELDS)
+        return 0
+    results = manager.undo(args.count, force=args.force)
+    write_output(args, [result_row(result) for result in results], RESULT_FIELDS)
+    return exit_code(results)
+
+
+def cmd_backup(args):
+    manager = scan(args)
+    paths = [record.path for record in selected_files(args, manager)]
+    total = manager.create_backup(args.zip_path, args.folder, paths)
+    write_output(args, [{'kind': 'backup', 'value': args.zip_path, 'count': total}], REPORT_FIELDS)
+    return 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("folder", help="preset library folder")
+    common.add_argument("--format", choices=('json', 'csv'), default='json', help="output format (default: json)")
+    common.add_argument("--output", "-o", help="write the output to this file instead of stdout")
+    common.add_argument("--workers", type=int, default=None,
+                        help="parallel scan and write workers (default: pool default)")
+    common.add_argument("--scan-mode", choices=SCAN_MODES, default='thread',
+                        help="metadata extraction mode (default: thread)")
+    common.add_argument("--read-mode", choices=READ_MODES, default='prefix', help="file read mode (default: prefix)")
+    common.add_argument("--index", help="persistent metadata index (SQLite file) to reuse between runs")
+    common.add_argument("--rebuild-index", action='store_true', help="ignore the index and re-read every preset")
+    common.add_argument("--no-recursive", action='store_true', help="do not scan subfolders")
+    common.add_argument("--no-fsync", action='store_true', help="do not fsync written presets (faster, less safe)")
+    common.add_argument("--snapshots", help="keep the original content of rewritten presets in this folder (see undo)")
+    common.add_argument("--filter", help="only presets matching this query (see the GUI filter bar)")
+    common.add_argument("--filter-mode", choices=SEARCH_MODES, default='contains', help="filter mode (default: contains)")
+    common.add_argument("--filter-fields", nargs='+', choices=SEARCH_FIELDS, default=SEARCH_FIELDS,
+                        help="fields matched by --filter (default: all)")
+    common.add_argument("--quiet", "-q", action='store_true', help="suppress the scan log on stderr")
+
+    # Opções dos comandos que gravam presets
+    edits = argparse.ArgumentParser(add_help=False)
+    edits.add_argument("--dry-run", action='store_true', help="show the changes without writing")
+    edits.add_argument("--journal", help="record the run in this journal file (see resume and rollback)")
+    edits.add_argument("--plan-out", help="save the planned changes to this file (with --dry-run, "
+                                          "to review them and write them later with apply --plan)")
+
+    parser = argparse.ArgumentParser(description="Preset Catalog command-line interface")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("scan", parents=[common], help="list presets with cluster and group").set_defaults(
+        func=cmd_scan)
+    subparsers.add_parser("report", parents=[common], help="preset counts per cluster and group").set_defaults(
+        func=cmd_report)
+
+    smart = subparsers.add_parser("smart-detect", parents=[common, edits],
+                                  help="suggest cluster/group from the folder structure")
+    smart.add_argument("--apply", action='store_true', help="write the suggested values")
+    smart.set_defaults(func=cmd_smart_detect)
+
+    apply = subparsers.add_parser("apply", parents=[common, edits], help="set cluster and/or group")
+    apply.add_argument("--cluster", help="new cluster")
+    apply.add_argument("--group", help="new group")
+    apply.add_argument("--plan", help="write the changes of a plan saved with --plan-out instead of planning again "
+                                      "(presets modified since then are skipped)")
+    apply.set_defaults(func=cmd_apply)
+
+    subparsers.add_parser("fix", parents=[common, edits], help="repair malformed crs:Group tags").set_defaults(
+        func=cmd_fix)
+
+    for name, func, description in (("resume", cmd_resume, "finish an interrupted apply/fix/smart-detect run"),
+                                    ("rollback", cmd_rollback, "undo the files written by an interrupted run")):
+        command = subparsers.add_parser(name, parents=[common], help=description)
+        command.add_argument("--journal", required=True, help="journal file of the interrupted run")
+        command.set_defaults(func=func)
+
+    undo = subparsers.add_parser("undo", parents=[common], help="revert the last runs recorded with --snapshots")
+    undo.add_argument("--count", type=int, default=1, help="number of runs to undo (default: 1)")
+    undo.add_argument("--force", action='store_true', help="also restore presets modified after the run")
+    undo.add_argument("--list", action='store_true', help="list the runs that can be undone")
+    undo.set_defaults(func=cmd_undo)
+
+    backup = subparsers.add_parser("backup", parents=[common], help="ZIP the presets keeping the folder structure")
+    backup.add_argument("zip_path", help="ZIP file to create")
+    backup.set_defaults(func=cmd_backup)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # A saída do comando vai para stdout; o log do XMPManager (print) vai para stderr
+    args.stdout = sys.stdout
+    log = open(os.devnull, 'w') if args.quiet else sys.stderr
+    try:
+        with contextlib.redirect_stdout(log):
+            return args.func(args)
+    finally:
+        if args.quiet:
+            log.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
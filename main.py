@@ -1,17 +1,37 @@
+import time
+
+# Início da inicialização, antes de carregar o PySide6 (referência do modo --startup-profile)
+_STARTUP_START = time.perf_counter()
+
 import sys
 import os
+import re
+from bisect import bisect_left
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                               QHBoxLayout, QPushButton, QLabel, QLineEdit, 
-                              QFileDialog, QTableWidget, QTableWidgetItem, 
-                              QHeaderView, QCheckBox, QGridLayout, QFrame,
-                              QProgressDialog, QTreeWidget, QTreeWidgetItem,
-                              QSplitter, QTabWidget, QAbstractItemView)
-from PySide6.QtCore import Qt, QSettings, QCoreApplication
+                              QFileDialog, QTableView, 
+                              QHeaderView, QGridLayout, QFrame,
+                              QTreeView,
+                              QSplitter, QTabWidget, QAbstractItemView,
+                              QComboBox, QSpinBox, QProgressBar)
+from PySide6.QtCore import Qt, QEvent, QObject, QSettings, QStandardPaths, QTimer
 from PySide6.QtGui import QIcon
-from xmp_manager import XMPManager
+from xmp_manager import XMPManager, SCAN_MODES, READ_MODES
+from write_journal import WriteJournal
+from search_index import SEARCH_FIELDS
+from workers import Job, JobManager
+from catalog_watcher import CatalogWatcher
+from models import PresetTableModel, FolderTreeModel
 from styles import STYLE_SHEET
 
 class PresetCatalogApp(QMainWindow):
+    # Os arquivos escaneados são exibidos em blocos de até LOAD_CHUNK_SIZE itens,
+    # ou a cada LOAD_CHUNK_INTERVAL segundos, o que ocorrer primeiro
+    LOAD_CHUNK_SIZE = 500
+    LOAD_CHUNK_INTERVAL = 0.05
+    # Intervalo sem digitação antes de aplicar o filtro da barra de busca
+    FILTER_DEBOUNCE_MS = 150
+    
     def __init__(self):
         super().__init__()
         
@@ -26,7 +46,11 @@ class PresetCatalogApp(QMainWindow):
         # Configuração para salvar preferências
         self.settings = QSettings("RafaelAndrade", "PresetCatalog")
         
-        self.xmp_manager = XMPManager()
+        read_mode = self.settings.value("read_mode", "prefix")
+        if read_mode not in READ_MODES:
+            read_mode = "prefix"
+        self.xmp_manager = XMPManager(index_path=self.get_index_path(), read_mode=read_mode,
+                                      snapshot_dir=self.get_snapshot_dir())
         
         # Tentar obter a última pasta usada ou usar a pasta padrão do Camera Raw
         self.current_folder = self.settings.value("last_folder", "")
@@ -40,18 +64,30 @@ class PresetCatalogApp(QMainWindow):
         self.suggested_groups = {}  # Mapeamento de arquivo para grupo sugerido
         self.smart_detection_active = False
         
+        # Operações longas (escaneamento, atualizações, backup) rodam em segundo plano
+        self.job_manager = JobManager(self)
+        self.scan_job = None
+        
+        # Mudanças feitas fora do aplicativo atualizam só os presets afetados, sem reescanear
+        self.catalog_watcher = CatalogWatcher(self)
+        self.catalog_watcher.folders_changed.connect(lambda folders: self.refresh_catalog(folders=folders))
+        self.catalog_watcher.files_changed.connect(lambda files: self.refresh_catalog(paths=files))
+        self.catalog_watcher.poll_requested.connect(
+            lambda: self.refresh_catalog(folders=[self.xmp_manager.root_folder], recursive=True))
+        
         self.initUI()
         
-        # Carrega a última pasta usada, se existir
-        self.load_last_folder()
+        # Carrega a última pasta usada, se existir, depois que a janela for exibida:
+        # o escaneamento roda em segundo plano e reaproveita o índice de metadados
+        QTimer.singleShot(0, self.load_last_folder)
+        # Uma atualização em lote interrompida (aplicativo fechado no meio dela) pode ser concluída ou desfeita
+        QTimer.singleShot(0, self.check_interrupted_batch)
+        QTimer.singleShot(0, self._update_undo_button)
         
     def initUI(self):
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
         
-        # Process events more frequently to avoid UI freezes
-        QApplication.instance().processEvents()
-        
         main_layout = QVBoxLayout(main_widget)
         
         # Header with copyright
@@ -64,11 +100,21 @@ class PresetCatalogApp(QMainWindow):
         backup_button.setToolTip("Create a ZIP backup of your preset files")
         backup_button.clicked.connect(self.create_backup)
         
+        self.undo_button = QPushButton("Undo")
+        self.undo_button.setEnabled(False)  # Ver _update_undo_button
+        self.undo_button.clicked.connect(self.undo_last_update)
+        
+        rebuild_index_button = QPushButton("Rebuild Index")
+        rebuild_index_button.setToolTip("Re-read every preset instead of reusing the cached metadata index")
+        rebuild_index_button.clicked.connect(self.rebuild_index)
+        
         about_button = QPushButton("About")
         about_button.clicked.connect(self.show_about)
         
         header_layout.addWidget(copyright_label)
         header_layout.addStretch()
+        header_layout.addWidget(self.undo_button)
+        header_layout.addWidget(rebuild_index_button)
         header_layout.addWidget(backup_button)
         header_layout.addWidget(about_button)
         main_layout.addLayout(header_layout)
@@ -92,6 +138,42 @@ class PresetCatalogApp(QMainWindow):
         folder_selection.addWidget(browse_button, 0)  # O botão mantém seu tamanho natural (proporção 0)
         folder_layout.addLayout(folder_selection)
         
+        # Opções de escaneamento (extração de metadados em paralelo)
+        scan_options = QHBoxLayout()
+        self.scan_mode_combo = QComboBox()
+        self.scan_mode_combo.addItem("Serial", "serial")
+        self.scan_mode_combo.addItem("Threads (network shares)", "thread")
+        self.scan_mode_combo.addItem("Processes (CPU bound)", "process")
+        self.scan_mode_combo.setToolTip("How preset metadata is read when scanning a folder")
+        saved_mode = self.settings.value("scan_mode", "serial")
+        if saved_mode in SCAN_MODES:
+            self.scan_mode_combo.setCurrentIndex(self.scan_mode_combo.findData(saved_mode))
+        self.scan_mode_combo.currentIndexChanged.connect(self.save_scan_options)
+        
+        self.scan_workers_spin = QSpinBox()
+        self.scan_workers_spin.setRange(0, 64)
+        self.scan_workers_spin.setSpecialValueText("Auto")  # 0 = padrão do pool
+        self.scan_workers_spin.setToolTip("Number of parallel workers used by the Threads/Processes modes")
+        self.scan_workers_spin.setValue(int(self.settings.value("scan_workers", 0)))
+        self.scan_workers_spin.valueChanged.connect(self.save_scan_options)
+        
+        self.read_mode_combo = QComboBox()
+        self.read_mode_combo.addItem("Prefix", "prefix")
+        self.read_mode_combo.addItem("Memory-mapped", "mmap")
+        self.read_mode_combo.addItem("Full file", "full")
+        self.read_mode_combo.setToolTip("How each preset file is read to find its cluster and group")
+        self.read_mode_combo.setCurrentIndex(self.read_mode_combo.findData(self.xmp_manager.read_mode))
+        self.read_mode_combo.currentIndexChanged.connect(self.save_scan_options)
+        
+        scan_options.addWidget(QLabel("Scan mode:"))
+        scan_options.addWidget(self.scan_mode_combo)
+        scan_options.addWidget(QLabel("Workers:"))
+        scan_options.addWidget(self.scan_workers_spin)
+        scan_options.addWidget(QLabel("Read:"))
+        scan_options.addWidget(self.read_mode_combo)
+        scan_options.addStretch()
+        folder_layout.addLayout(scan_options)
+        
         # Description
         description = QLabel("This will edit all XMP files in this folder and its subdirectories. Tick/untick items to be updated below.")
         folder_layout.addWidget(description)
@@ -124,21 +206,70 @@ class PresetCatalogApp(QMainWindow):
         tree_label.setStyleSheet("color: gray;")
         tree_layout.addWidget(tree_label)
         
-        # Create folder tree with checkboxes
-        self.folder_tree = QTreeWidget()
-        self.folder_tree.setHeaderLabels(["Folders & Files", "Cluster", "Group"])
+        # Barra de filtro: enquanto há um filtro, a tabela com os presets encontrados substitui a árvore
+        filter_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter presets...")
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_mode_combo = QComboBox()
+        self.filter_mode_combo.addItem("Contains", "contains")
+        self.filter_mode_combo.addItem("Starts with", "prefix")
+        self.filter_mode_combo.addItem("Regex", "regex")
+        self.filter_field_combo = QComboBox()
+        self.filter_field_combo.addItem("All fields", SEARCH_FIELDS)
+        self.filter_field_combo.addItem("Name", ("name",))
+        self.filter_field_combo.addItem("Cluster", ("cluster",))
+        self.filter_field_combo.addItem("Group", ("group",))
+        self.filter_field_combo.addItem("Folder", ("folder",))
+        self.select_matches_button = QPushButton("Select Matches")
+        self.select_matches_button.setToolTip("Select exactly the presets that match the filter")
+        self.select_matches_button.setEnabled(False)
+        
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(self.filter_timer.start)
+        self.filter_mode_combo.currentIndexChanged.connect(self.apply_filter)
+        self.filter_field_combo.currentIndexChanged.connect(self.apply_filter)
+        self.select_matches_button.clicked.connect(self.select_filter_matches)
+        
+        filter_layout.addWidget(self.filter_input, 1)
+        filter_layout.addWidget(self.filter_mode_combo)
+        filter_layout.addWidget(self.filter_field_combo)
+        filter_layout.addWidget(self.select_matches_button)
+        tree_layout.addLayout(filter_layout)
+        self.filter_rows = None  # Linhas da tabela encontradas pelo filtro atual (None = sem filtro)
+        
+        # Create folder tree with checkboxes (modelo preguiçoso: os nós são criados ao expandir as pastas)
+        self.tree_model = FolderTreeModel(self)
+        self.folder_tree = QTreeView()
+        self.folder_tree.setModel(self.tree_model)
+        self.folder_tree.setUniformRowHeights(True)
         self.folder_tree.setColumnWidth(0, 400)  # Wider first column
         self.folder_tree.setColumnWidth(1, 150)
         self.folder_tree.setColumnWidth(2, 150)
         self.folder_tree.setAlternatingRowColors(False)
+        # Habilita a seleção de itens
+        self.folder_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
         
         tree_layout.addWidget(self.folder_tree)
         
-        main_layout.addWidget(tree_widget)
-        
-        # Esconder a tabela, mas mantê-la para compatibilidade com o código existente
-        self.file_table = QTableWidget(0, 4)
+        # A tabela só é exibida com os resultados da barra de filtro
+        # A tabela é virtual: só as linhas visíveis são materializadas pela view
+        # O modelo filtra e ordena por conta própria (sem QSortFilterProxyModel, ver PresetTableModel)
+        self.table_model = PresetTableModel(self)
+        self.file_table = QTableView()
+        self.file_table.setModel(self.table_model)
+        self.file_table.setColumnHidden(PresetTableModel.CHECK_COLUMN, True)  # A seleção fica na árvore
+        self.file_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.file_table.verticalHeader().setVisible(False)
+        self.file_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.file_table.horizontalHeader().setStretchLastSection(True)
         self.file_table.setVisible(False)
+        tree_layout.addWidget(self.file_table)
+        
+        main_layout.addWidget(tree_widget)
         
         # Bottom controls
         bottom_layout = QVBoxLayout()
@@ -181,7 +312,16 @@ class PresetCatalogApp(QMainWindow):
         bottom_layout.addLayout(bottom_grid)
         main_layout.addLayout(bottom_layout)
         
-        # Status bar
+        # Status bar, com progresso e cancelamento das operações em segundo plano
+        self.job_progress = QProgressBar()
+        self.job_progress.setMaximumWidth(200)
+        self.job_progress.setVisible(False)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        self.cancel_button.setVisible(False)
+        self.statusBar().addPermanentWidget(self.job_progress)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+        self.job_manager.busy_changed.connect(self._on_jobs_busy_changed)
         self.statusBar().showMessage("Preset Catalog ready - www.rafaelandrade.art.br")
     
     def load_last_folder(self):
@@ -218,7 +358,85 @@ class PresetCatalogApp(QMainWindow):
                 self.statusBar().showMessage(f"Error loading files: {str(e)}")
                 print(f"Error loading files: {str(e)}")
     
-    def load_xmp_files(self, folder):
+    def save_scan_options(self):
+        """Salva o modo de escaneamento, o número de workers e o modo de leitura nas configurações"""
+        self.settings.setValue("scan_mode", self.scan_mode_combo.currentData())
+        self.settings.setValue("scan_workers", self.scan_workers_spin.value())
+        self.settings.setValue("read_mode", self.read_mode_combo.currentData())
+        self.xmp_manager.read_mode = self.read_mode_combo.currentData()
+    
+    def rebuild_index(self):
+        """Descarta o índice de metadados da pasta atual e relê todos os arquivos"""
+        if not self.current_folder or not os.path.exists(self.current_folder):
+            self.statusBar().showMessage("Please select a folder first", 3000)
+            return
+        
+        try:
+            self.load_xmp_files(self.current_folder, force_rebuild=True)
+            self.statusBar().showMessage(f"Rebuilt metadata index for {self.current_folder}", 5000)
+        except Exception as e:
+            self.statusBar().showMessage(f"Error rebuilding index: {str(e)}")
+            print(f"Error rebuilding index: {str(e)}")
+    
+    def load_xmp_files(self, folder, force_rebuild=False, status_message=None):
+        """
+        Escaneia a pasta em segundo plano, preenchendo a tabela e a árvore à medida que os arquivos chegam
+        
+        Args:
+            folder: Pasta a ser escaneada (sempre recursivamente)
+            force_rebuild: Se True, ignora o índice de metadados
+            status_message: Mensagem exibida ao final no lugar de "Loaded N XMP files"
+        """
+        # Um novo escaneamento substitui o que ainda estiver em andamento ou na fila
+        if self.scan_job is not None:
+            self.job_manager.cancel(self.scan_job)
+        self.catalog_watcher.stop()
+        
+        mode = self.scan_mode_combo.currentData()
+        workers = self.scan_workers_spin.value() or None
+        chunk_size = self.LOAD_CHUNK_SIZE
+        chunk_interval = self.LOAD_CHUNK_INTERVAL
+        xmp_manager = self.xmp_manager
+        
+        def run_scan(job):
+            # Scan for XMP files (always recursive), sending the results to the UI in chunks
+            scan = xmp_manager.iter_xmp_files(folder, recursive=True, force_rebuild=force_rebuild,
+                                              mode=mode, workers=workers)
+            chunk = []
+            last_flush = time.monotonic()
+            try:
+                for file_info in scan:
+                    chunk.append(file_info)
+                    
+                    if len(chunk) >= chunk_size or time.monotonic() - last_flush >= chunk_interval:
+                        job.emit_chunk(chunk)
+                        job.report_progress(0, 0, f"Loading... {len(xmp_manager.xmp_files)} XMP files found")
+                        chunk = []
+                        last_flush = time.monotonic()
+                        
+                        if job.is_canceled():
+                            break
+                
+                job.emit_chunk(chunk)
+            finally:
+                scan.close()
+            return len(xmp_manager.xmp_files)
+        
+        job = Job("scan", run_scan)
+        job.signals.started.connect(lambda: self._on_scan_started(job, folder))
+        job.signals.chunk.connect(lambda files: self._on_scan_chunk(job, files))
+        job.signals.finished.connect(lambda count: self._on_scan_finished(job, folder, count, False, status_message))
+        job.signals.canceled.connect(lambda count: self._on_scan_finished(job, folder, count, True, status_message))
+        job.signals.failed.connect(lambda error: self._on_scan_failed(job, error))
+        job.signals.progress.connect(self._on_job_progress)
+        self.scan_job = job
+        self.job_manager.submit(job)
+    
+    def _on_scan_started(self, job, folder):
+        """Limpa a tabela e a árvore quando o escaneamento realmente começa"""
+        if job is not self.scan_job:
+            return
+        
         # Resetar qualquer estado de detecção inteligente
         self.suggested_clusters.clear()
         self.suggested_groups.clear()
@@ -226,82 +444,189 @@ class PresetCatalogApp(QMainWindow):
         self.cluster_input.setEnabled(True)
         self.group_input.setEnabled(True)
         
-        # Always use recursive scanning (as requested)
-        recursive = True
+        self.table_model.clear()
+        self.file_table.setSortingEnabled(False)  # Disable sorting while loading
+        if self.filter_rows is not None:
+            # O filtro é recalculado ao final do escaneamento
+            self.filter_rows = []
+            self.table_model.set_visible_rows(self.filter_rows)
+            self.select_matches_button.setEnabled(False)
+        self._init_folder_tree(folder)
         
         # Update status bar with loading message
         self.statusBar().showMessage(f"Loading files from {folder} (including subdirectories)...")
-        QApplication.processEvents()  # Make sure UI updates
+    
+    def _on_scan_chunk(self, job, files):
+        """Adiciona um bloco de arquivos recém-escaneados à tabela e à árvore"""
+        if job is not self.scan_job:
+            return
         
-        # Scan for XMP files
-        files = self.xmp_manager.scan_xmp_files(folder, recursive=True)
-        self.file_table.setRowCount(0)  # Clear table first
-        self.file_table.setRowCount(len(files))
+        self._add_files_to_table(files)
+        self._add_files_to_tree(files)
+    
+    def _on_scan_finished(self, job, folder, count, canceled, status_message):
+        if job is not self.scan_job:
+            return
+        self.scan_job = None
         
-        print(f"Loading {len(files)} XMP files from {folder}")
+        count = count or 0
+        print(f"Loaded {count} XMP files from {folder}")
         
-        self.file_table.setSortingEnabled(False)  # Disable sorting while loading
+        self.file_table.setSortingEnabled(True)  # Re-enable sorting
+        self._finish_folder_tree()
+        if self.filter_input.text():
+            # Incluir no filtro os arquivos que chegaram depois dele
+            self.apply_filter()
+        
+        if not canceled:
+            # Daqui em diante, mudanças na pasta são aplicadas incrementalmente
+            self.catalog_watcher.watch(sorted(self.xmp_manager.scanned_folders),
+                                       [record.path for record in self.xmp_manager.xmp_files])
+        
+        if canceled:
+            self.statusBar().showMessage(f"Scan canceled after {count} XMP files", 5000)
+        elif status_message:
+            self.statusBar().showMessage(status_message, 5000)
+        else:
+            self.statusBar().showMessage(f"Loaded {count} XMP files", 3000)
+    
+    def _on_scan_failed(self, job, error):
+        if job is not self.scan_job:
+            return
+        self.scan_job = None
+        self._finish_folder_tree()
+        self.statusBar().showMessage(f"Error loading files: {error}")
+        print(f"Error loading files: {error}")
+    
+    def refresh_catalog(self, folders=None, paths=None, recursive=False, status_message=None):
+        """
+        Aplica à tabela e à árvore as mudanças em disco de algumas pastas ou arquivos
         
-        for i, file_info in enumerate(files):
-            try:
-                # Checkbox for selection
-                checkbox = QCheckBox()
-                checkbox_cell = QWidget()
-                checkbox_layout = QHBoxLayout(checkbox_cell)
-                checkbox_layout.addWidget(checkbox)
-                checkbox_layout.setAlignment(Qt.AlignCenter)
-                checkbox_layout.setContentsMargins(0, 0, 0, 0)
-                self.file_table.setCellWidget(i, 0, checkbox_cell)
-                
-                # Cluster
-                cluster = file_info.get('cluster', '')
-                self.file_table.setItem(i, 1, QTableWidgetItem(cluster))
-                
-                # Group
-                group = file_info.get('group', '')
-                self.file_table.setItem(i, 2, QTableWidgetItem(group))
-                
-                # File name with relative path if in subdirectory
-                display_name = file_info.get('display_name', file_info['filename'])
-                self.file_table.setItem(i, 3, QTableWidgetItem(display_name))
-                
-                # Update UI every 50 items to keep responsive
-                if i % 50 == 0:
-                    QApplication.processEvents()
-            except Exception as e:
-                print(f"Error loading file at index {i}: {str(e)}")
+        Só os presets adicionados, removidos ou modificados são relidos e atualizados nas views.
         
-        self.file_table.setSortingEnabled(True)  # Re-enable sorting
+        Args:
+            folders: Pastas a verificar (ver XMPManager.refresh_folders)
+            paths: Arquivos a verificar (ex.: os arquivos gravados por uma atualização)
+            recursive: Se True, verifica também as subpastas de folders
+            status_message: Mensagem exibida ao final
+        """
+        xmp_manager = self.xmp_manager
         
-        # Construir a visualização em árvore
-        self.build_folder_tree(folder, files)
+        def run_refresh(job):
+            if paths is not None:
+                return xmp_manager.refresh_paths(paths)
+            return xmp_manager.refresh_folders(folders, recursive)
         
-        self.statusBar().showMessage(f"Loaded {len(files)} XMP files", 3000)
+        job = Job("refresh", run_refresh)
+        job.signals.finished.connect(lambda changes: self._on_refresh_finished(changes, status_message))
+        job.signals.failed.connect(lambda error: self.statusBar().showMessage(f"Error refreshing files: {error}", 5000))
+        self.job_manager.submit(job)
     
-    def select_all_items(self):
-        """Seleciona todos os itens na árvore"""
-        # Desconecta temporariamente o sinal para evitar múltiplas atualizações
-        self.folder_tree.itemChanged.disconnect(self.on_tree_item_changed)
+    def _on_refresh_finished(self, changes, status_message):
+        """Remove, atualiza e acrescenta as linhas afetadas, mantendo tabela, árvore e XMPManager alinhados"""
+        if self.scan_job is not None:
+            # Um novo escaneamento já está na fila e vai recarregar tudo
+            return
         
-        # Marca recursivamente todos os itens
-        self._set_check_state_recursive(self.folder_tree.invisibleRootItem(), Qt.Checked)
+        removed, modified, added = changes['removed'], changes['modified'], changes['added']
+        if removed:
+            self.table_model.remove_rows(removed)
+            self.tree_model.remove_files(removed)
+        if modified:
+            self.table_model.refresh_rows(modified)
+            self.tree_model.refresh_files(modified)
+        if added:
+            if self.tree_model.file_count() == 0:
+                self._init_folder_tree(self.current_folder)
+            self._add_files_to_table(added)
+            self._add_files_to_tree(added)
+        if removed or added:
+            self._finish_folder_tree()
+        # Arquivos novos e regravados (uma gravação atômica troca o arquivo observado)
+        xmp_files = self.xmp_manager.xmp_files
+        self.catalog_watcher.add_paths(changes['folders'], [record.path for record in added] +
+                                       [xmp_files[preset_id].path for preset_id in modified])
+        
+        if self.filter_input.text() and (removed or modified or added):
+            self.apply_filter()
+        
+        if status_message:
+            self.statusBar().showMessage(status_message, 5000)
+        elif removed or added:
+            self.statusBar().showMessage(
+                f"Catalog updated: {len(added)} added, {len(removed)} removed, {len(modified)} modified", 3000)
+    
+    def cancel_jobs(self):
+        """Cancela a operação em segundo plano em andamento"""
+        for job in self.job_manager.running_jobs():
+            self.job_manager.cancel(job)
+        self.statusBar().showMessage("Canceling...")
+    
+    def _on_job_progress(self, done, total, message):
+        """Atualiza a barra de progresso da barra de status"""
+        if total > 0:
+            self.job_progress.setRange(0, total)
+            self.job_progress.setValue(done)
+        else:
+            self.job_progress.setRange(0, 0)  # Indeterminado
+        if message:
+            self.statusBar().showMessage(message)
+    
+    def _on_jobs_busy_changed(self, busy):
+        self.job_progress.setVisible(busy)
+        self.cancel_button.setVisible(busy)
+        if busy:
+            self.job_progress.setRange(0, 0)
+    
+    def apply_filter(self):
+        """Filtra a tabela pelo texto da barra de busca (ou volta para a árvore sem filtro)"""
+        self.filter_timer.stop()
+        query = self.filter_input.text()
+        if not query:
+            self.filter_rows = None
+            self.table_model.set_visible_rows(None)
+            self.file_table.setVisible(False)
+            self.folder_tree.setVisible(True)
+            self.select_matches_button.setEnabled(False)
+            return
         
-        # Reconecta o sinal
-        self.folder_tree.itemChanged.connect(self.on_tree_item_changed)
+        try:
+            ids = self.xmp_manager.search_presets(query, self.filter_mode_combo.currentData(),
+                                                  self.filter_field_combo.currentData())
+        except re.error as e:
+            self.statusBar().showMessage(f"Invalid regular expression: {str(e)}", 3000)
+            return
         
+        # Os ids são as posições na tabela; durante o escaneamento, a tabela pode ainda não ter os últimos
+        loaded = len(self.table_model.files())
+        self.filter_rows = ids[:bisect_left(ids, loaded)]
+        self.table_model.set_visible_rows(self.filter_rows)
+        self.folder_tree.setVisible(False)
+        self.file_table.setVisible(True)
+        self.select_matches_button.setEnabled(bool(self.filter_rows))
+        self.statusBar().showMessage(f"{len(self.filter_rows)} presets match the filter", 3000)
+    
+    def select_filter_matches(self):
+        """Marca na árvore exatamente os presets encontrados pelo filtro (a seleção usada nas atualizações)"""
+        if not self.filter_rows:
+            return
+        # A tabela e a árvore recebem os mesmos blocos do escaneamento, na mesma ordem:
+        # a linha da tabela é também o índice do arquivo na árvore
+        self.tree_model.set_checked_files(self.filter_rows)
+        self.statusBar().showMessage(f"Selected {len(self.filter_rows)} files", 3000)
+    
+    def _add_files_to_table(self, files):
+        """Acrescenta linhas à tabela de arquivos"""
+        self.table_model.append_files(files)
+    
+    def select_all_items(self):
+        """Seleciona todos os itens na árvore"""
+        self.tree_model.set_all_checked(True)
         self.statusBar().showMessage("Selected all items", 3000)
     
     def deselect_all_items(self):
         """Desmarca todos os itens na árvore"""
-        # Desconecta temporariamente o sinal para evitar múltiplas atualizações
-        self.folder_tree.itemChanged.disconnect(self.on_tree_item_changed)
-        
-        # Desmarca recursivamente todos os itens
-        self._set_check_state_recursive(self.folder_tree.invisibleRootItem(), Qt.Unchecked)
-        
-        # Reconecta o sinal
-        self.folder_tree.itemChanged.connect(self.on_tree_item_changed)
-        
+        self.tree_model.set_all_checked(False)
         self.statusBar().showMessage("Deselected all items", 3000)
     
     def get_selected_files(self):
@@ -309,44 +634,6 @@ class PresetCatalogApp(QMainWindow):
         # Agora usamos diretamente os checkboxes da árvore
         return self.get_checked_files()
     
-    def update_clusters(self):
-        new_cluster = self.cluster_input.text().strip()
-        if not new_cluster:
-            self.statusBar().showMessage("Please enter a cluster name", 3000)
-            return
-        
-        selected_files = self.get_selected_files()
-        if not selected_files:
-            self.statusBar().showMessage("No files selected", 3000)
-            return
-        
-        # Show progress in status bar
-        self.statusBar().showMessage(f"Updating {len(selected_files)} files with cluster '{new_cluster}'...")
-        QApplication.processEvents()
-        
-        count = self.xmp_manager.update_cluster(selected_files, new_cluster)
-        self.statusBar().showMessage(f"Updated {count} files with cluster '{new_cluster}'", 5000)
-        self.load_xmp_files(self.current_folder)  # Refresh
-    
-    def update_groups(self):
-        new_group = self.group_input.text().strip()
-        if not new_group:
-            self.statusBar().showMessage("Please enter a group name", 3000)
-            return
-        
-        selected_files = self.get_selected_files()
-        if not selected_files:
-            self.statusBar().showMessage("No files selected", 3000)
-            return
-        
-        # Show progress in status bar
-        self.statusBar().showMessage(f"Updating {len(selected_files)} files with group '{new_group}'...")
-        QApplication.processEvents()
-        
-        count = self.xmp_manager.update_group(selected_files, new_group)
-        self.statusBar().showMessage(f"Updated {count} files with group '{new_group}'", 5000)
-        self.load_xmp_files(self.current_folder)  # Refresh
-        
     def show_about(self):
         from PySide6.QtWidgets import QMessageBox
         
@@ -368,10 +655,8 @@ class PresetCatalogApp(QMainWindow):
     
     def create_backup(self):
         """Creates a ZIP backup of all XMP files in the current folder while preserving folder structure"""
-        import zipfile
         import datetime
-        import os
-        from PySide6.QtWidgets import QFileDialog, QProgressDialog, QMessageBox
+        from PySide6.QtWidgets import QMessageBox
         
         # Check if we have a current folder selected
         if not self.current_folder or not os.path.exists(self.current_folder):
@@ -379,7 +664,7 @@ class PresetCatalogApp(QMainWindow):
             return
         
         # Get the list of files to back up (all XMP files in the current folder)
-        if not hasattr(self.xmp_manager, 'xmp_files') or not self.xmp_manager.xmp_files:
+        if not self.xmp_manager.xmp_files:
             QMessageBox.warning(self, "Backup Error", "No XMP files found to back up.")
             return
             
@@ -402,58 +687,46 @@ class PresetCatalogApp(QMainWindow):
         if not backup_path.lower().endswith('.zip'):
             backup_path += '.zip'
         
-        try:
-            # Create progress dialog
-            total_files = len(self.xmp_manager.xmp_files)
-            progress = QProgressDialog("Creating backup archive...", "Cancel", 0, total_files, self)
-            progress.setWindowTitle("Creating Backup")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setMinimumDuration(0)
-            progress.setValue(0)
-            
-            # Create ZIP file
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                base_folder = os.path.basename(self.current_folder)
-                
-                # Add all XMP files to the ZIP
-                for i, file_info in enumerate(self.xmp_manager.xmp_files):
-                    if progress.wasCanceled():
-                        # Delete partial ZIP file
-                        zipf.close()
-                        os.remove(backup_path)
-                        self.statusBar().showMessage("Backup operation canceled", 3000)
-                        return
-                        
-                    file_path = file_info['path']
-                    filename = os.path.basename(file_path)
-                    
-                    # Update progress
-                    progress.setValue(i)
-                    progress.setLabelText(f"Adding {i+1} of {total_files}: {filename}")
-                    QApplication.processEvents()
-                    
-                    # Calculate relative path for maintaining folder structure
-                    rel_path = os.path.relpath(file_path, os.path.dirname(self.current_folder))
-                    
-                    # Add file to ZIP
-                    zipf.write(file_path, rel_path)
-            
-            # Complete
-            progress.setValue(total_files)
-            
-            # Show success message
-            QMessageBox.information(
-                self, 
-                "Backup Complete", 
-                f"Successfully backed up {total_files} XMP files to:\n{backup_path}"
-            )
-            
-            self.statusBar().showMessage(f"Backup created successfully: {backup_path}", 5000)
+        base_folder = self.current_folder
+        file_paths = [file_info.path for file_info in self.xmp_manager.xmp_files]
+        
+        def run_backup(job):
+            def progress(done, total, filename):
+                job.report_progress(done, total, f"Adding {done+1} of {total}: {filename}" if filename else "")
             
-        except Exception as e:
-            QMessageBox.critical(self, "Backup Error", f"Error creating backup: {str(e)}")
-            self.statusBar().showMessage(f"Backup failed: {str(e)}", 5000)
-            print(f"Error creating backup: {str(e)}")
+            return self.xmp_manager.create_backup(backup_path, base_folder, file_paths,
+                                                  progress_callback=progress, should_cancel=job.is_canceled)
+        
+        job = Job("backup", run_backup)
+        job.signals.progress.connect(self._on_job_progress)
+        job.signals.finished.connect(lambda total_files: self._on_backup_finished(backup_path, total_files))
+        job.signals.canceled.connect(lambda _: self.statusBar().showMessage("Backup operation canceled", 3000))
+        job.signals.failed.connect(self._on_backup_failed)
+        self.statusBar().showMessage("Creating backup archive...")
+        self.job_manager.submit(job)
+    
+    def _on_backup_finished(self, backup_path, total_files):
+        from PySide6.QtWidgets import QMessageBox
+        
+        if total_files is None:
+            self.statusBar().showMessage("Backup operation canceled", 3000)
+            return
+        
+        # Show success message
+        QMessageBox.information(
+            self, 
+            "Backup Complete", 
+            f"Successfully backed up {total_files} XMP files to:\n{backup_path}"
+        )
+        
+        self.statusBar().showMessage(f"Backup created successfully: {backup_path}", 5000)
+    
+    def _on_backup_failed(self, error):
+        from PySide6.QtWidgets import QMessageBox
+        
+        QMessageBox.critical(self, "Backup Error", f"Error creating backup: {error}")
+        self.statusBar().showMessage(f"Backup failed: {error}", 5000)
+        print(f"Error creating backup: {error}")
     
     def smart_path_detection(self):
         """Executa a detecção inteligente de cluster e grupo baseada no caminho do arquivo"""
@@ -465,134 +738,67 @@ class PresetCatalogApp(QMainWindow):
         if not self.xmp_manager.xmp_files:
             self.statusBar().showMessage("No XMP files found to analyze", 3000)
             return
-            
-        total_files = len(self.xmp_manager.xmp_files)
-            
-        # Criar barra de progresso
-        progress = QProgressDialog("Analyzing file paths for smart detection...", "Abort", 0, total_files, self)
-        progress.setWindowTitle("Smart Detection")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)  # Mostrar imediatamente
-        progress.setValue(0)
         
-        # Executar a auto-descoberta
-        self.statusBar().showMessage("Analyzing file paths for smart detection...")
-        QApplication.processEvents()  # Atualizar UI
+        files = list(self.xmp_manager.xmp_files)
+        base_folder = self.current_folder
+        total_files = len(files)
         
-        try:
-            # Preparar para descoberta manual com progresso
-            discoveries = []
-            self.suggested_clusters.clear()
-            self.suggested_groups.clear()
-            self.smart_detection_active = True
+        def run_detection(job):
+            suggested_clusters = {}
+            suggested_groups = {}
+            files_with_suggestions = 0
             
             # Processar cada arquivo com atualização de progresso
-            for i, file_info in enumerate(self.xmp_manager.xmp_files):
-                if progress.wasCanceled():
-                    self.statusBar().showMessage("Smart detection canceled", 3000)
-                    return
-                    
-                file_path = file_info['path']
+            for i, file_info in enumerate(files):
+                if job.is_canceled():
+                    return None
                 
-                # Atualizar barra de progresso
-                progress.setValue(i)
-                filename = os.path.basename(file_path)
-                progress.setLabelText(f"Processing {i+1} of {total_files}: {filename}")
-                QCoreApplication.processEvents()
+                file_path = file_info.path
+                if i % 200 == 0:
+                    job.report_progress(i, total_files, f"Processing {i+1} of {total_files}: {file_info.filename}")
                 
                 # Detectar cluster e grupo para este arquivo
-                auto_cluster, auto_group = self.xmp_manager.detect_cluster_group_from_path(file_path, self.current_folder)
-                
-                # Preparar item de descoberta
-                item = {
-                    'file_info': file_info,
-                    'path': file_path,
-                    'current_cluster': file_info['cluster'],
-                    'current_group': file_info['group'],
-                    'suggested_cluster': auto_cluster,
-                    'suggested_group': auto_group,
-                    'needs_cluster_update': auto_cluster != file_info['cluster'] and auto_cluster != '',
-                    'needs_group_update': auto_group != file_info['group'] and auto_group != ''
-                }
+                auto_cluster, auto_group = self.xmp_manager.detect_cluster_group_from_path(file_path, base_folder)
+                needs_cluster_update = auto_cluster != file_info.cluster and auto_cluster != ''
+                needs_group_update = auto_group != file_info.group and auto_group != ''
                 
-                discoveries.append(item)
-            
-            # Marcar como completo
-            progress.setValue(total_files)
-            
-            # Processar resultados
-            files_with_suggestions = 0
-            cluster_changes = 0
-            group_changes = 0
-            
-            for item in discoveries:
-                file_path = item['path']
-                
-                if item['needs_cluster_update']:
-                    self.suggested_clusters[file_path] = item['suggested_cluster']
-                    cluster_changes += 1
-                    
-                if item['needs_group_update']:
-                    self.suggested_groups[file_path] = item['suggested_group']
-                    group_changes += 1
-                    
-                if item['needs_cluster_update'] or item['needs_group_update']:
+                if needs_cluster_update:
+                    suggested_clusters[file_path] = auto_cluster
+                if needs_group_update:
+                    suggested_groups[file_path] = auto_group
+                if needs_cluster_update or needs_group_update:
                     files_with_suggestions += 1
             
-            # Criar nova barra de progresso para atualização da tabela
-            progress = QProgressDialog("Updating table with suggestions...", "Abort", 0, self.file_table.rowCount(), self)
-            progress.setWindowTitle("Smart Detection - Updating UI")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setMinimumDuration(0)
-            progress.setValue(0)
+            job.report_progress(total_files, total_files, "")
+            return suggested_clusters, suggested_groups, files_with_suggestions
+        
+        job = Job("smart_detection", run_detection)
+        job.signals.progress.connect(self._on_job_progress)
+        job.signals.finished.connect(self._on_smart_detection_finished)
+        job.signals.canceled.connect(lambda _: self.statusBar().showMessage("Smart detection canceled", 3000))
+        job.signals.failed.connect(
+            lambda error: self.statusBar().showMessage(f"Error during Smart Detection: {error}", 5000))
+        
+        # Executar a auto-descoberta
+        self.statusBar().showMessage("Analyzing file paths for smart detection...")
+        self.job_manager.submit(job)
+    
+    def _on_smart_detection_finished(self, result):
+        """Aplica as sugestões da detecção inteligente à tabela, à árvore e aos campos de entrada"""
+        suggested_clusters, suggested_groups, files_with_suggestions = result
+        cluster_changes = len(suggested_clusters)
+        group_changes = len(suggested_groups)
+        
+        try:
+            self.suggested_clusters = suggested_clusters
+            self.suggested_groups = suggested_groups
+            self.smart_detection_active = True
             
             # Atualizar a tabela para mostrar sugestões
-            self.file_table.setSortingEnabled(False)  # Desabilitar ordenação durante a atualização
-            
-            # Atualizar os valores de display na tabela
-            for row in range(self.file_table.rowCount()):
-                if progress.wasCanceled():
-                    break
-                    
-                progress.setValue(row)
-                QCoreApplication.processEvents()
-                
-                # Obter o caminho do arquivo para esta linha
-                file_path = None
-                item = self.file_table.item(row, 3)  # coluna do nome do arquivo
-                if item:
-                    display_name = item.text()
-                    # Encontrar o caminho completo do arquivo
-                    for file_info in self.xmp_manager.xmp_files:
-                        if file_info.get('display_name') == display_name:
-                            file_path = file_info['path']
-                            break
-                
-                if file_path:
-                    # Verificar se há sugestões para este arquivo
-                    cluster_cell = self.file_table.item(row, 1)
-                    if file_path in self.suggested_clusters and cluster_cell:
-                        current = cluster_cell.text()
-                        suggested = self.suggested_clusters[file_path]
-                        cluster_cell.setText(f"{current} → {suggested}")
-                        # Destacar visualmente as células com sugestões
-                        cluster_cell.setBackground(Qt.yellow)
-                    
-                    group_cell = self.file_table.item(row, 2)
-                    if file_path in self.suggested_groups and group_cell:
-                        current = group_cell.text()
-                        suggested = self.suggested_groups[file_path]
-                        group_cell.setText(f"{current} → {suggested}")
-                        # Destacar visualmente as células com sugestões
-                        group_cell.setBackground(Qt.yellow)
-            
-            # Marcar como completo
-            progress.setValue(self.file_table.rowCount())
-            
-            self.file_table.setSortingEnabled(True)  # Reabilitar ordenação
+            self.table_model.set_suggestions(self.suggested_clusters, self.suggested_groups)
             
             # Atualizar a visualização em árvore
-            self.build_folder_tree(self.current_folder, self.xmp_manager.xmp_files)
+            self.tree_model.set_suggestions(self.suggested_clusters, self.suggested_groups)
             
             # Atualizar os campos de entrada para indicar múltiplos valores
             if cluster_changes > 0:
@@ -614,7 +820,7 @@ class PresetCatalogApp(QMainWindow):
             self.statusBar().showMessage(f"Error during Smart Detection: {str(e)}", 5000)
             print(f"Error during Smart Detection: {str(e)}")
     
-    def reset_smart_detection(self):
+    def reset_smart_detection(self, reload=True):
         """Limpa o estado de detecção inteligente"""
         if self.smart_detection_active:
             self.suggested_clusters.clear()
@@ -625,9 +831,10 @@ class PresetCatalogApp(QMainWindow):
             self.cluster_input.clear()
             self.group_input.clear()
             
-            # Recarregar a tabela para remover as sugestões visuais
-            if self.current_folder:
-                self.load_xmp_files(self.current_folder)
+            # Atualizar a tabela e a árvore para remover as sugestões visuais
+            if reload:
+                self.table_model.set_suggestions(self.suggested_clusters, self.suggested_groups)
+                self.tree_model.set_suggestions(self.suggested_clusters, self.suggested_groups)
     
     def update_clusters(self):
         new_cluster = self.cluster_input.text().strip()
@@ -640,62 +847,22 @@ class PresetCatalogApp(QMainWindow):
                 self.statusBar().showMessage("No files selected", 3000)
                 return
                 
-            # Filtrar apenas os arquivos que têm sugestões de cluster
-            files_to_update = []
-            clusters_to_apply = []
+            # Filtrar apenas os arquivos que têm sugestões de cluster, cada um com seu cluster sugerido
+            targets = [(file_path, self.suggested_clusters[file_path], None)
+                       for file_path in selected_files if file_path in self.suggested_clusters]
             
-            for file_path in selected_files:
-                if file_path in self.suggested_clusters:
-                    files_to_update.append(file_path)
-                    clusters_to_apply.append(self.suggested_clusters[file_path])
-            
-            if not files_to_update:
+            if not targets:
                 self.statusBar().showMessage("No smart path suggestions for selected files", 3000)
                 return
             
-            # Criar barra de progresso
-            progress = QProgressDialog("Updating files with Smart Detection clusters...", "Abort", 0, len(files_to_update), self)
-            progress.setWindowTitle("Updating Clusters")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setMinimumDuration(0)  # Mostrar imediatamente
-            progress.setValue(0)
-                
-            # Atualizar cada arquivo com seu cluster sugerido
-            total_updated = 0
-            for i, file_path in enumerate(files_to_update):
-                if progress.wasCanceled():
-                    self.statusBar().showMessage("Update operation canceled", 3000)
-                    break
-                    
-                # Atualizar barra de progresso
-                progress.setValue(i)
-                filename = os.path.basename(file_path)
-                progress.setLabelText(f"Updating {i+1} of {len(files_to_update)}: {filename}")
-                QCoreApplication.processEvents()
-                
-                cluster_to_apply = clusters_to_apply[i]
-                count = self.xmp_manager.update_cluster([file_path], cluster_to_apply)
-                # Fix XML tags automatically (new functionality)
-                self.xmp_manager.fix_malformed_group_tags([file_path])
-                total_updated += count
-            
-            # Atualizar a barra de progresso para indicar que está carregando os arquivos
-            progress.setLabelText("Reloading files after update, please wait...")
-            progress.setValue(len(files_to_update))
-            QCoreApplication.processEvents()
-            
-            # Atualizar a barra de status
-            self.statusBar().showMessage(f"Reloading files after updating {total_updated} files with Smart Detection clusters...")
-            
-            # Recarregar arquivos e limpar estado de detecção
-            self.reset_smart_detection()
-            self.load_xmp_files(self.current_folder)
-            
-            # Fechar a barra de progresso somente depois que tudo estiver carregado
-            progress.close()
-            
-            # Atualizar a barra de status final
-            self.statusBar().showMessage(f"Updated {total_updated} files with Smart Detection clusters", 5000)
+            self._start_update_job(
+                "Updating files with Smart Detection clusters...",
+                lambda job: self._run_batch(job, targets),
+                lambda count: f"Updated {count} files with Smart Detection clusters",
+                'cluster',
+                [file_path for file_path, _, _ in targets],
+                smart=True
+            )
             return
         
         # Comportamento normal quando não estamos usando detecção inteligente
@@ -708,55 +875,15 @@ class PresetCatalogApp(QMainWindow):
             self.statusBar().showMessage("No files selected", 3000)
             return
         
-        # Criar barra de progresso
-        progress = QProgressDialog(f"Updating files with cluster '{new_cluster}'...", "Abort", 0, len(selected_files), self)
-        progress.setWindowTitle("Updating Clusters")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)  # Mostrar imediatamente
-        progress.setValue(0)
-        
-        # Show progress in status bar
-        self.statusBar().showMessage(f"Updating {len(selected_files)} files with cluster '{new_cluster}'...")
-        
-        # Fazer a atualização em lote, mas monitorando o progresso
-        count = 0
-        batch_size = min(20, len(selected_files))  # Processar em lotes menores para atualizar o progresso
-        for i in range(0, len(selected_files), batch_size):
-            if progress.wasCanceled():
-                self.statusBar().showMessage("Update operation canceled", 3000)
-                break
-                
-            # Atualizar a barra de progresso
-            progress.setValue(i)
-            if i + batch_size < len(selected_files):
-                progress.setLabelText(f"Processing files {i+1}-{i+batch_size} of {len(selected_files)}")
-            else:
-                progress.setLabelText(f"Processing files {i+1}-{len(selected_files)} of {len(selected_files)}")
-            QCoreApplication.processEvents()
-            
-            # Processar este lote
-            batch_files = selected_files[i:i+batch_size]
-            count += self.xmp_manager.update_cluster(batch_files, new_cluster)
-            
-            # Fix XML tags automatically after each batch (new functionality)
-            progress.setLabelText(f"Fixing XML tags in batch {i+1}-{min(i+batch_size, len(selected_files))}...")
-            QCoreApplication.processEvents()
-            self.xmp_manager.fix_malformed_group_tags(batch_files)
-        
-        # Atualizar a barra de progresso para indicar que está carregando os arquivos
-        progress.setLabelText("Reloading files after update, please wait...")
-        progress.setValue(len(selected_files))
-        QCoreApplication.processEvents()
-        
-        # Recarregar os arquivos (operação mais demorada)
-        self.statusBar().showMessage(f"Reloading files after updating {count} files with cluster '{new_cluster}'...")
-        self.load_xmp_files(self.current_folder)  # Refresh
-        
-        # Fechar a barra de progresso somente depois que tudo estiver carregado
-        progress.close()
-        
-        # Atualizar a barra de status
-        self.statusBar().showMessage(f"Updated {count} files with cluster '{new_cluster}'", 5000)
+        # Cluster e correção das tags de grupo em uma única leitura/gravação por arquivo
+        targets = [(file_path, new_cluster, None) for file_path in selected_files]
+        self._start_update_job(
+            f"Updating {len(selected_files)} files with cluster '{new_cluster}'...",
+            lambda job: self._run_batch(job, targets),
+            lambda count: f"Updated {count} files with cluster '{new_cluster}'",
+            'cluster',
+            selected_files
+        )
     
     def update_groups(self):
         new_group = self.group_input.text().strip()
@@ -769,62 +896,22 @@ class PresetCatalogApp(QMainWindow):
                 self.statusBar().showMessage("No files selected", 3000)
                 return
                 
-            # Filtrar apenas os arquivos que têm sugestões de grupo
-            files_to_update = []
-            groups_to_apply = []
-            
-            for file_path in selected_files:
-                if file_path in self.suggested_groups:
-                    files_to_update.append(file_path)
-                    groups_to_apply.append(self.suggested_groups[file_path])
+            # Filtrar apenas os arquivos que têm sugestões de grupo, cada um com seu grupo sugerido
+            targets = [(file_path, None, self.suggested_groups[file_path])
+                       for file_path in selected_files if file_path in self.suggested_groups]
             
-            if not files_to_update:
+            if not targets:
                 self.statusBar().showMessage("No smart path suggestions for selected files", 3000)
                 return
             
-            # Criar barra de progresso
-            progress = QProgressDialog("Updating files with Smart Detection groups...", "Abort", 0, len(files_to_update), self)
-            progress.setWindowTitle("Updating Groups")
-            progress.setWindowModality(Qt.WindowModal)
-            progress.setMinimumDuration(0)  # Mostrar imediatamente
-            progress.setValue(0)
-                
-            # Atualizar cada arquivo com seu grupo sugerido
-            total_updated = 0
-            for i, file_path in enumerate(files_to_update):
-                if progress.wasCanceled():
-                    self.statusBar().showMessage("Update operation canceled", 3000)
-                    break
-                
-                # Atualizar barra de progresso
-                progress.setValue(i)
-                filename = os.path.basename(file_path)
-                progress.setLabelText(f"Updating {i+1} of {len(files_to_update)}: {filename}")
-                QCoreApplication.processEvents()
-                
-                group_to_apply = groups_to_apply[i]
-                count = self.xmp_manager.update_group([file_path], group_to_apply)
-                # Fix XML tags automatically (new functionality)
-                self.xmp_manager.fix_malformed_group_tags([file_path])
-                total_updated += count
-            
-            # Atualizar a barra de progresso para indicar que está carregando os arquivos
-            progress.setLabelText("Reloading files after update, please wait...")
-            progress.setValue(len(files_to_update))
-            QCoreApplication.processEvents()
-            
-            # Atualizar a barra de status
-            self.statusBar().showMessage(f"Reloading files after updating {total_updated} files with Smart Detection groups...")
-            
-            # Recarregar arquivos e limpar estado de detecção
-            self.reset_smart_detection()
-            self.load_xmp_files(self.current_folder)
-            
-            # Fechar a barra de progresso somente depois que tudo estiver carregado
-            progress.close()
-            
-            # Atualizar a barra de status final
-            self.statusBar().showMessage(f"Updated {total_updated} files with Smart Detection groups", 5000)
+            self._start_update_job(
+                "Updating files with Smart Detection groups...",
+                lambda job: self._run_batch(job, targets),
+                lambda count: f"Updated {count} files with Smart Detection groups",
+                'group',
+                [file_path for file_path, _, _ in targets],
+                smart=True
+            )
             return
         
         # Comportamento normal quando não estamos usando detecção inteligente
@@ -837,323 +924,229 @@ class PresetCatalogApp(QMainWindow):
             self.statusBar().showMessage("No files selected", 3000)
             return
         
-        # Criar barra de progresso
-        progress = QProgressDialog(f"Updating files with group '{new_group}'...", "Abort", 0, len(selected_files), self)
-        progress.setWindowTitle("Updating Groups")
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setMinimumDuration(0)  # Mostrar imediatamente
-        progress.setValue(0)
-        
-        # Show progress in status bar
-        self.statusBar().showMessage(f"Updating {len(selected_files)} files with group '{new_group}'...")
-        
-        # Fazer a atualização em lote, mas monitorando o progresso
-        count = 0
-        batch_size = min(20, len(selected_files))  # Processar em lotes menores para atualizar o progresso
-        for i in range(0, len(selected_files), batch_size):
-            if progress.wasCanceled():
-                self.statusBar().showMessage("Update operation canceled", 3000)
-                break
-                
-            # Atualizar a barra de progresso
-            progress.setValue(i)
-            if i + batch_size < len(selected_files):
-                progress.setLabelText(f"Processing files {i+1}-{i+batch_size} of {len(selected_files)}")
-            else:
-                progress.setLabelText(f"Processing files {i+1}-{len(selected_files)} of {len(selected_files)}")
-            QCoreApplication.processEvents()
-            
-            # Processar este lote
-            batch_files = selected_files[i:i+batch_size]
-            count += self.xmp_manager.update_group(batch_files, new_group)
-            
-            # Fix XML tags automatically after each batch (new functionality)
-            progress.setLabelText(f"Fixing XML tags in batch {i+1}-{min(i+batch_size, len(selected_files))}...")
-            QCoreApplication.processEvents()
-            self.xmp_manager.fix_malformed_group_tags(batch_files)
-            
-        # Atualizar a barra de progresso para indicar que está carregando os arquivos
-        progress.setLabelText("Reloading files after update, please wait...")
-        progress.setValue(len(selected_files))
-        QCoreApplication.processEvents()
-        
-        # Recarregar os arquivos (operação mais demorada)
-        self.statusBar().showMessage(f"Reloading files after updating {count} files with group '{new_group}'...")
-        self.load_xmp_files(self.current_folder)  # Refresh
-        
-        # Fechar a barra de progresso somente depois que tudo estiver carregado
-        progress.close()
-        
-        # Atualizar a barra de status
-        self.statusBar().showMessage(f"Updated {count} files with group '{new_group}'", 5000)
+        # Grupo e correção das tags em uma única leitura/gravação por arquivo
+        targets = [(file_path, None, new_group) for file_path in selected_files]
+        self._start_update_job(
+            f"Updating {len(selected_files)} files with group '{new_group}'...",
+            lambda job: self._run_batch(job, targets),
+            lambda count: f"Updated {count} files with group '{new_group}'",
+            'group',
+            selected_files
+        )
     
-
-    def on_tree_selection_changed(self):
-        """Atualiza a seleção dos checkboxes na tabela com base na seleção da árvore"""
-        selected_items = self.folder_tree.selectedItems()
-        if not selected_items:
+    def _run_batch(self, job, targets):
+        """Função de job que grava os alvos (file_path, cluster, grupo) com XMPManager.execute_batch"""
+        def progress(done, total, files_per_second):
+            job.report_progress(done, total, f"Updated {done} of {total} files ({files_per_second:.0f} files/s)")
+        
+        # O diário permite concluir ou desfazer o lote se o aplicativo for fechado no meio dele
+        return self.xmp_manager.execute_batch(targets, repair_groups=True, journal_path=self.get_journal_path(),
+                                              progress=progress, is_canceled=job.is_canceled)
+    
+    def check_interrupted_batch(self):
+        """Oferece concluir ou desfazer uma atualização em lote interrompida (ver XMPManager.execute_batch)"""
+        from PySide6.QtWidgets import QMessageBox
+        
+        journal_path = self.get_journal_path()
+        journal = WriteJournal.load(journal_path)
+        if journal is None:
             return
+        counts = journal.counts()
+        file_paths = [entry['path'] for entry in journal.entries]
+        journal.close()
+        
+        box = QMessageBox(self)
+        box.setWindowTitle("Interrupted Update")
+        box.setIcon(QMessageBox.Question)
+        box.setText(f"A batch update did not finish: {counts['applied']} of {len(file_paths)} files "
+                    f"were processed and {counts['pending']} are still pending.")
+        box.setInformativeText("Resume the update, roll back the files already written, or keep the files as they are?")
+        resume_button = box.addButton("Resume", QMessageBox.AcceptRole)
+        rollback_button = box.addButton("Roll Back", QMessageBox.DestructiveRole)
+        box.addButton("Keep As Is", QMessageBox.RejectRole)
+        box.exec()
+        
+        if box.clickedButton() == resume_button:
+            def run_resume(job):
+                def progress(done, total, files_per_second):
+                    job.report_progress(done, total, f"Resumed {done} of {total} files ({files_per_second:.0f} files/s)")
+                return self.xmp_manager.resume_batch(journal_path, progress=progress,
+                                                     is_canceled=job.is_canceled) or []
             
-        # Desmarcar todos os itens primeiro
-        self.deselect_all_items()
-        
-        # Conjunto de arquivos a serem selecionados
-        files_to_select = set()
-        
-        # Processa os itens selecionados
-        for item in selected_items:
-            # Se é um arquivo, adiciona diretamente
-            if hasattr(item, 'file_path'):
-                files_to_select.add(item.file_path)
-            # Se é uma pasta, adiciona todos os arquivos sob ela
-            else:
-                self._collect_files_from_tree_item(item, files_to_select)
-        
-        # Agora marca os checkboxes dos arquivos encontrados
-        self._select_files_in_table(files_to_select)
-        
-        # Atualiza a contagem na barra de status
-        self.statusBar().showMessage(f"Selected {len(files_to_select)} files", 3000)
-    
-    def _collect_files_from_tree_item(self, item, files_set):
-        """Coleta recursivamente todos os caminhos de arquivos de um item da árvore e seus filhos"""
-        # Verifica se este item é um arquivo
-        if hasattr(item, 'file_path'):
-            files_set.add(item.file_path)
-        
-        # Recursivamente processa todos os filhos
-        for i in range(item.childCount()):
-            child = item.child(i)
-            self._collect_files_from_tree_item(child, files_set)
+            self._start_update_job("Resuming interrupted update...", run_resume,
+                                   lambda count: f"Resumed update: {count} files updated", None, file_paths)
+        elif box.clickedButton() == rollback_button:
+            self._start_update_job("Rolling back interrupted update...",
+                                   lambda job: self.xmp_manager.rollback_batch(journal_path) or [],
+                                   lambda count: f"Rolled back {count} files", None, file_paths)
+        else:
+            journal = WriteJournal.load(journal_path)
+            if journal is not None:
+                journal.discard()
     
-    def _select_files_in_table(self, file_paths):
-        """Seleciona arquivos na tabela baseado em seus caminhos"""
-        # Mapeia caminhos de arquivo para índices na tabela
-        file_path_to_row = {}
-        for row in range(self.file_table.rowCount()):
-            item = self.file_table.item(row, 3)  # Coluna do nome do arquivo
-            if item:
-                display_name = item.text()
-                # Encontra o caminho completo
-                for file_info in self.xmp_manager.xmp_files:
-                    if file_info.get('display_name') == display_name:
-                        file_path_to_row[file_info['path']] = row
-                        break
-        
-        # Agora seleciona os checkboxes para os arquivos identificados
-        for file_path in file_paths:
-            if file_path in file_path_to_row:
-                row = file_path_to_row[file_path]
-                checkbox_cell = self.file_table.cellWidget(row, 0)
-                if checkbox_cell:
-                    checkbox = checkbox_cell.findChild(QCheckBox)
-                    if checkbox:
-                        checkbox.setChecked(True)
+    def _update_undo_button(self):
+        """Habilita o botão Undo e descreve nele a última atualização que pode ser desfeita"""
+        snapshots = self.xmp_manager.snapshots
+        operations = snapshots.operations() if snapshots is not None else []
+        self.undo_button.setEnabled(bool(operations))
+        if operations:
+            operation = operations[0]
+            self.undo_button.setToolTip(f"Undo the last update: {operation['description']} "
+                                        f"({len(operation['files'])} files)")
+        else:
+            self.undo_button.setToolTip("Nothing to undo")
     
-    def build_folder_tree(self, folder, files):
-        """Constrói uma árvore de pastas e arquivos para visualização com checkboxes"""
-        self.folder_tree.clear()
+    def undo_last_update(self):
+        """Restaura o conteúdo original dos arquivos gravados pela última atualização"""
+        from PySide6.QtWidgets import QMessageBox
         
-        if not folder or not files:
+        snapshots = self.xmp_manager.snapshots
+        operations = snapshots.operations() if snapshots is not None else []
+        if not operations:
+            self.statusBar().showMessage("Nothing to undo", 3000)
             return
-            
-        # Cria o nó raiz
-        root_item = QTreeWidgetItem(self.folder_tree, [os.path.basename(folder), "", ""])
-        root_item.setExpanded(True)
-        root_item.setFlags(root_item.flags() | Qt.ItemIsUserCheckable)
-        root_item.setCheckState(0, Qt.Unchecked)
-        
-        # Mapeia caminhos de pasta para itens de árvore
-        self.folder_items = {folder: root_item}
-        self.file_items = {}  # Mapeia caminhos de arquivo para itens de árvore
-        
-        # Agrupa arquivos por pastas
-        folder_files = {}
-        
-        # Processa todos os arquivos
-        for file_info in files:
-            file_path = file_info['path']
-            parent_dir = os.path.dirname(file_path)
-            
-            # Adiciona a pasta pai à estrutura, se ainda não existir
-            if parent_dir not in self.folder_items:
-                # Cria cadeia de pastas pai, se necessário
-                self._create_parent_folders(parent_dir, folder, self.folder_items)
-            
-            # Adiciona arquivo à sua pasta pai
-            if parent_dir not in folder_files:
-                folder_files[parent_dir] = []
-            folder_files[parent_dir].append(file_info)
-        
-        # Adiciona arquivos às pastas correspondentes
-        for folder_path, files_list in folder_files.items():
-            folder_item = self.folder_items[folder_path]
-            
-            for file_info in files_list:
-                file_name = file_info['filename']
-                file_path = file_info['path']
-                cluster = file_info.get('cluster', '')
-                group = file_info.get('group', '')
-                
-                # Verificar se existem sugestões de Smart Detection para este arquivo
-                if self.smart_detection_active:
-                    if file_path in self.suggested_clusters:
-                        cluster = f"{cluster} → {self.suggested_clusters[file_path]}"
-                    if file_path in self.suggested_groups:
-                        group = f"{group} → {self.suggested_groups[file_path]}"
-                
-                file_item = QTreeWidgetItem(folder_item, [file_name, cluster, group])
-                file_item.setFlags(file_item.flags() | Qt.ItemIsUserCheckable)
-                file_item.setCheckState(0, Qt.Unchecked)
-                file_item.file_path = file_path  # Armazena o caminho do arquivo
-                
-                # Guarda referência ao item da árvore
-                self.file_items[file_path] = file_item
         
-        # Habilita a seleção de itens
-        self.folder_tree.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        
-        # Conecta o sinal de alteração de item
-        self.folder_tree.itemChanged.connect(self.on_tree_item_changed)
+        operation = operations[0]
+        file_paths = [entry['path'] for entry in operation['files']]
+        answer = QMessageBox.question(
+            self,
+            "Undo Update",
+            f"Restore {len(file_paths)} files changed by \"{operation['description']}\"?"
+        )
+        if answer != QMessageBox.Yes:
+            return
         
-        # Ordena a árvore
-        self.folder_tree.sortItems(0, Qt.AscendingOrder)
+        # Arquivos modificados depois da atualização não são restaurados (ver XMPManager.undo)
+        self._start_update_job(
+            f"Undoing \"{operation['description']}\"...",
+            lambda job: self.xmp_manager.undo(),
+            lambda count: f"Undo restored {count} files",
+            None,
+            file_paths
+        )
+    
+    def _start_update_job(self, message, fn, done_message, count_key, file_paths, smart=False):
+        """
+        Executa uma atualização de arquivos em segundo plano e atualiza as linhas afetadas ao final
+        
+        Args:
+            message: Mensagem exibida enquanto a atualização roda
+            fn: Função do job; deve retornar a lista de resultados de XMPManager.apply_edits
+            done_message: Função que recebe o número de arquivos atualizados e retorna a mensagem final
+            count_key: Chave dos resultados contada como arquivo atualizado ('cluster' ou 'group';
+                       None conta todos os arquivos gravados)
+            file_paths: Arquivos que a atualização pode gravar (relidos se o job falhar)
+            smart: Se True, limpa o estado de detecção inteligente ao final
+        """
+        timing = {}
+        
+        def count(results):
+            # Arquivos que já tinham os valores não são regravados (ver XMPManager.apply_edits)
+            return sum(1 for result in results or []
+                       if result['written'] and (count_key is None or result[count_key]))
+        
+        def summary(results):
+            unchanged = sum(1 for result in results or [] if result['unchanged'])
+            errors = sum(1 for result in results or [] if result['error'])
+            message = done_message(count(results))
+            if unchanged:
+                message = f"{message} ({unchanged} already up to date)"
+            if errors:
+                message = f"{message}, {errors} errors"
+            elapsed = time.perf_counter() - timing.get('started', time.perf_counter())
+            if results and elapsed > 0:
+                message = f"{message} in {elapsed:.1f}s, {len(results) / elapsed:.0f} files/s"
+            return message
+        
+        def canceled(results):
+            self._on_update_finished(f"Update operation canceled after {count(results)} files",
+                                     results or [], file_paths, smart)
+            # Os arquivos não iniciados ficam pendentes no diário do lote
+            self.check_interrupted_batch()
+        
+        job = Job("update", fn)
+        job.signals.started.connect(lambda: timing.setdefault('started', time.perf_counter()))
+        job.signals.progress.connect(self._on_job_progress)
+        job.signals.finished.connect(lambda results: self._on_update_finished(
+            summary(results), results, file_paths, smart))
+        job.signals.canceled.connect(canceled)
+        job.signals.failed.connect(lambda error: self._on_update_finished(
+            f"Error updating files: {error}", None, file_paths, smart))
+        
+        self.statusBar().showMessage(message)
+        self.job_manager.submit(job)
     
-    def _create_parent_folders(self, folder_path, base_folder, folder_items):
-        """Cria hierarquia de pastas na árvore"""
-        if folder_path == base_folder or folder_path in folder_items:
-            return folder_items[folder_path]
+    def _on_update_finished(self, message, results, file_paths, smart):
+        """
+        Atualiza na tabela e na árvore apenas as linhas dos arquivos gravados
         
-        # Obtém a pasta pai
-        parent_dir = os.path.dirname(folder_path)
+        O XMPManager já atualizou os registros e o catálogo com os valores gravados
+        (ver apply_edits), então nada precisa ser relido do disco. Sem os resultados
+        (job com erro) os arquivos são relidos.
+        """
+        if smart:
+            # Limpar estado de detecção e remover as sugestões visuais
+            self.reset_smart_detection()
+        self._update_undo_button()
         
-        # Se a pasta pai ainda não existe, cria recursivamente
-        if parent_dir not in folder_items:
-            parent_item = self._create_parent_folders(parent_dir, base_folder, folder_items)
-        else:
-            parent_item = folder_items[parent_dir]
-        
-        # Cria o item para esta pasta
-        folder_name = os.path.basename(folder_path)
-        folder_item = QTreeWidgetItem(parent_item, [folder_name, "", ""])
-        folder_item.setFlags(folder_item.flags() | Qt.ItemIsUserCheckable)
-        folder_item.setCheckState(0, Qt.Unchecked)
-        folder_items[folder_path] = folder_item
-        
-        return folder_item
-        
-    def on_tree_item_changed(self, item, column):
-        """Lida com a alteração de estado de checkbox em itens da árvore"""
-        if column == 0 and item.flags() & Qt.ItemIsUserCheckable:
-            # Obter o estado atual do checkbox
-            check_state = item.checkState(0)
-            
-            # Desconectar o sinal antes de fazer alterações para evitar recursão
-            self.folder_tree.itemChanged.disconnect(self.on_tree_item_changed)
-            
-            # Lógica diferente para pastas e arquivos
-            if not hasattr(item, 'file_path'):
-                # Se for uma pasta, propaga o estado para os filhos diretos
-                for i in range(item.childCount()):
-                    child = item.child(i)
-                    child.setCheckState(0, check_state)
-            
-            # Reconectar o sinal após as alterações
-            self.folder_tree.itemChanged.connect(self.on_tree_item_changed)
-            
-            # Atualiza os pais baseado no estado dos filhos
-            self.update_parent_check_state(item.parent())
+        if results is None:
+            self.statusBar().showMessage(f"Refreshing files... ({message})")
+            self.refresh_catalog(paths=file_paths, status_message=message)
+            return
+        
+        # Os ids dos presets são também as linhas da tabela e os índices dos arquivos na árvore
+        ids = [result['id'] for result in results if result['written'] and result['id'] is not None]
+        self.table_model.refresh_rows(ids)
+        self.tree_model.refresh_files(ids)
+        if ids and self.filter_input.text():
+            # Os valores novos podem entrar ou sair do filtro por cluster/grupo
+            self.apply_filter()
+        self.statusBar().showMessage(message, 5000)
     
-
-    def _set_check_state_recursive(self, item, check_state):
-        """Define o estado de checkbox para um item e todos os seus filhos recursivamente"""
-        # Primeiro, marca todos os itens de nível inferior
-        for i in range(item.childCount()):
-            child = item.child(i)
-            if child.flags() & Qt.ItemIsUserCheckable:
-                child.setCheckState(0, check_state)
-            self._set_check_state_recursive(child, check_state)
+    def build_folder_tree(self, folder, files):
+        """Constrói uma árvore de pastas e arquivos para visualização com checkboxes"""
+        self._init_folder_tree(folder)
+        self._add_files_to_tree(files)
+        self._finish_folder_tree()
     
-    def update_parent_check_state(self, parent):
-        """Atualiza o estado de checkbox do pai baseado nos filhos"""
-        if not parent:
-            return
-            
-        child_count = parent.childCount()
-        if child_count == 0:
+    def _init_folder_tree(self, folder):
+        """Limpa a árvore e cria o nó raiz da pasta escaneada"""
+        self.tree_model.reset_root(folder or None)
+        if folder:
+            self.folder_tree.expand(self.tree_model.index(0, 0))
+    
+    def _add_files_to_tree(self, files):
+        """Acrescenta arquivos (e as pastas que ainda não existem) à árvore"""
+        self.tree_model.add_files(files)
+    
+    def _finish_folder_tree(self):
+        """Finaliza a árvore depois que todos os arquivos foram adicionados"""
+        if self.tree_model.file_count() == 0:
+            # Nenhum arquivo encontrado: não mostrar uma pasta raiz vazia
+            self.tree_model.reset_root(None)
             return
-            
-        checked_count = 0
-        unchecked_count = 0
-        partially_checked_count = 0
-        
-        for i in range(child_count):
-            child = parent.child(i)
-            state = child.checkState(0)
-            if state == Qt.Checked:
-                checked_count += 1
-            elif state == Qt.Unchecked:
-                unchecked_count += 1
-            elif state == Qt.PartiallyChecked:
-                partially_checked_count += 1
-        
-        # Desconecta temporariamente o sinal para evitar recursão
-        self.folder_tree.itemChanged.disconnect(self.on_tree_item_changed)
-        
-        # Define o estado do pai
-        if checked_count == child_count:
-            parent.setCheckState(0, Qt.Checked)
-        elif unchecked_count == child_count:
-            parent.setCheckState(0, Qt.Unchecked)
-        else:
-            parent.setCheckState(0, Qt.PartiallyChecked)
         
-        # Reconecta o sinal
-        self.folder_tree.itemChanged.connect(self.on_tree_item_changed)
-            
-        # Propaga para cima na árvore
-        self.update_parent_check_state(parent.parent())
+        # Ordena os nós já exibidos
+        self.tree_model.finish_loading()
     
     def get_checked_files(self):
         """Retorna uma lista de caminhos de arquivo para todos os itens marcados na árvore"""
-        checked_files = []
-        self._collect_checked_files(self.folder_tree.invisibleRootItem(), checked_files)
-        return checked_files
+        return self.tree_model.checked_paths()
     
-    def _collect_checked_files(self, item, file_list):
-        """Coleta recursivamente os arquivos marcados"""
-        # Para cada item filho
-        for i in range(item.childCount()):
-            child = item.child(i)
-            
-            # Se o filho é um arquivo e está marcado
-            if hasattr(child, 'file_path') and child.checkState(0) == Qt.Checked:
-                file_list.append(child.file_path)
-            
-            # Se o filho é uma pasta e está completamente marcado (não parcialmente)
-            # colete todos os arquivos desta pasta diretamente
-            elif not hasattr(child, 'file_path') and child.checkState(0) == Qt.Checked:
-                self._collect_all_files_in_folder(child, file_list)
-            # Caso contrário, continue a verificação recursiva normal
-            elif child.childCount() > 0:
-                self._collect_checked_files(child, file_list)
-                
-        # Certifique-se de que os arquivos que têm caminhos armazenados diretamente são incluídos
-        # Isso é importante para compatibilidade com Smart Detection
-        if hasattr(item, 'file_path') and item.checkState(0) == Qt.Checked:
-            file_list.append(item.file_path)
+    def get_index_path(self):
+        """Retorna o caminho do índice de metadados, guardado junto com os dados do aplicativo"""
+        data_dir = QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation)
+        if not data_dir:
+            data_dir = os.path.expanduser("~")
+        return os.path.join(data_dir, "RafaelAndrade", "PresetCatalog", "metadata_index.sqlite")
     
-    def _collect_all_files_in_folder(self, folder_item, file_list):
-        """Coleta todos os arquivos em uma pasta, independente do estado do checkbox"""
-        for i in range(folder_item.childCount()):
-            child = folder_item.child(i)
-            
-            # Se é um arquivo, adiciona à lista
-            if hasattr(child, 'file_path'):
-                file_list.append(child.file_path)
-            # Se é uma pasta, coleta recursivamente
-            else:
-                self._collect_all_files_in_folder(child, file_list)
+    def get_snapshot_dir(self):
+        """Retorna a pasta dos snapshots usados para desfazer atualizações, ao lado do índice de metadados"""
+        return os.path.join(os.path.dirname(self.get_index_path()), "undo_snapshots")
+    
+    def get_journal_path(self):
+        """Retorna o caminho do diário das atualizações em lote, ao lado do índice de metadados"""
+        return os.path.join(os.path.dirname(self.get_index_path()), "batch_journal.jsonl")
     
     def get_default_preset_folder(self):
         """
@@ -1179,6 +1172,11 @@ class PresetCatalogApp(QMainWindow):
         # Salvar configurações antes de fechar
         if self.current_folder:
             self.settings.setValue("last_folder", self.current_folder)
+        
+        # Interromper as operações em segundo plano antes de destruir a janela
+        self.catalog_watcher.stop()
+        self.job_manager.cancel_all()
+        self.job_manager.wait_for_done()
         event.accept()  # Permite que o evento de fechamento continue
 
 def debug_file_access(directory):
@@ -1198,17 +1196,58 @@ def debug_file_access(directory):
         print(f"Error accessing directory: {str(e)}")
         return False
 
+class StartupProfiler(QObject):
+    """
+    Modo --startup-profile: mede o tempo até a primeira pintura da janela e até ela ficar
+    interativa (última pasta carregada e nenhuma operação em andamento), e encerra o aplicativo
+    """
+    
+    def __init__(self, app, window):
+        super().__init__(window)
+        self.app = app
+        self.window = window
+        self.first_paint = None
+        app.installEventFilter(self)
+        window.job_manager.busy_changed.connect(self._on_busy_changed)
+    
+    def eventFilter(self, obj, event):
+        if (self.first_paint is None and event.type() == QEvent.Paint
+                and isinstance(obj, QWidget) and obj.window() is self.window):
+            self.first_paint = time.perf_counter() - _STARTUP_START
+            print(f"Startup: first paint after {self.first_paint * 1000:.0f} ms")
+            self.app.removeEventFilter(self)
+            # Sem pasta para carregar, a janela já está interativa
+            QTimer.singleShot(0, lambda: self._on_busy_changed(self.window.job_manager.is_busy()))
+        return False
+    
+    def _on_busy_changed(self, busy):
+        if busy or self.first_paint is None:
+            return
+        interactive = time.perf_counter() - _STARTUP_START
+        print(f"Startup: interactive after {interactive * 1000:.0f} ms "
+              f"({len(self.window.xmp_manager.xmp_files)} presets loaded)")
+        self.app.quit()
+
+
 def main():
+    # Necessário para o modo de escaneamento com processos no executável do PyInstaller
+    import multiprocessing
+    multiprocessing.freeze_support()
+    
+    profile_startup = "--startup-profile" in sys.argv
     app = QApplication(sys.argv)
     app.setStyleSheet(STYLE_SHEET)
     window = PresetCatalogApp()
+    if profile_startup:
+        # Filho da janela (o Qt o mantém vivo); a referência deixa isso explícito
+        window.startup_profiler = StartupProfiler(app, window)
     window.show()
     
-    # Debug default location
+    # Debug default location (depois que a janela aparecer)
     debug_dir = window.get_default_preset_folder()
     if os.path.exists(debug_dir):
         print(f"Default directory accessible: {debug_dir}")
-        debug_file_access(debug_dir)
+        QTimer.singleShot(0, lambda: debug_file_access(debug_dir))
     
     sys.exit(app.exec())
 
@@ -0,0 +1,725 @@
+"""
+Qt item models for the Preset Catalog views
+
+The file table is a virtual model over the list of scanned presets: rows are
+only materialized by the view when they are painted, so loading time and memory
+do not grow with one widget per row. The folder tree keeps the folder structure
+and per-folder counts in compact entries and only creates view nodes when a
+folder is expanded.
+"""
+
+import os
+from array import array
+from bisect import bisect_left
+
+from PySide6.QtCore import Qt, QAbstractItemModel, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QBrush
+
+
+class PresetTableModel(QAbstractTableModel):
+    """
+    Modelo da tabela de arquivos: checkbox, cluster, grupo e nome do arquivo
+
+    Guarda todos os presets escaneados (posição = id do preset), mas pode exibir só
+    alguns (set_visible_rows): o filtro da barra de busca vira uma lista de ids
+    trocada de uma vez, sem uma chamada Python por linha para decidir o que aparece.
+    A ordenação também é feita aqui, sobre essa lista, pela posição de cada preset
+    na ordenação de todos (calculada uma vez por coluna), em vez de num
+    QSortFilterProxyModel, que chamaria data() em Python a cada comparação.
+    """
+
+    CHECK_COLUMN = 0
+    CLUSTER_COLUMN = 1
+    GROUP_COLUMN = 2
+    NAME_COLUMN = 3
+    HEADERS = ["", "Cluster", "Group", "File"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._files = []  # PresetRecord dos arquivos (compartilhados com o XMPManager)
+        self._checked = bytearray()  # Um byte por preset: 1 = marcado
+        self._rows = None  # Ids exibidos, na ordem da tabela (None = todos, na ordem do escaneamento)
+        self._sort_column = None  # Ordenação pedida pela view (aplicada às linhas do filtro)
+        self._sort_order = Qt.AscendingOrder
+        self._sort_ranks = None  # Posição de cada id na ordenação de todos os presets (cache, ver _sort_rows)
+        self._suggested_clusters = {}
+        self._suggested_groups = {}
+        self._highlight = QBrush(Qt.yellow)
+
+    # Interface do QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._files) if self._rows is None else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == self.CHECK_COLUMN:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        preset_id = self._preset_id(index.row())
+        column = index.column()
+        file_info = self._files[preset_id]
+
+        if column == self.CHECK_COLUMN:
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if self._checked[preset_id] else Qt.Unchecked
+            return None
+
+        if role == Qt.DisplayRole:
+            if column == self.CLUSTER_COLUMN:
+                return self._with_suggestion(file_info.cluster, self._suggested_clusters.get(file_info.path))
+            if column == self.GROUP_COLUMN:
+                return self._with_suggestion(file_info.group, self._suggested_groups.get(file_info.path))
+            if column == self.NAME_COLUMN:
+                return file_info.display_name
+        elif role == Qt.BackgroundRole:
+            # Destacar visualmente as células com sugestões
+            if column == self.CLUSTER_COLUMN and file_info.path in self._suggested_clusters:
+                return self._highlight
+            if column == self.GROUP_COLUMN and file_info.path in self._suggested_groups:
+                return self._highlight
+        elif role == Qt.UserRole:
+            return file_info.path
+
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Ordena as linhas exibidas pelo filtro (sem filtro, a tabela fica oculta e na ordem do escaneamento)"""
+        if column != self._sort_column:
+            self._sort_ranks = None
+        self._sort_column = column
+        self._sort_order = order
+        if self._rows:
+            self.beginResetModel()
+            self._sort_rows()
+            self.endResetModel()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != self.CHECK_COLUMN or role != Qt.CheckStateRole:
+            return False
+
+        self._checked[self._preset_id(index.row())] = 1 if Qt.CheckState(value) == Qt.Checked else 0
+        self._sort_ranks = None
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    # Operações em bloco
+
+    def clear(self):
+        self.beginResetModel()
+        self._files = []
+        self._checked = bytearray()
+        self._sort_ranks = None
+        if self._rows is not None:
+            self._rows = []
+        self._suggested_clusters = {}
+        self._suggested_groups = {}
+        self.endResetModel()
+
+    def set_visible_rows(self, rows):
+        """Exibe apenas os presets com os ids informados, na ordenação atual (None exibe todos)"""
+        self.beginResetModel()
+        self._rows = list(rows) if rows is not None else None
+        if self._rows:
+            self._sort_rows()
+        self.endResetModel()
+
+    def append_files(self, files):
+        """Acrescenta um bloco de arquivos ao final da tabela (fora do filtro, se houver um)"""
+        if not files:
+            return
+        self._sort_ranks = None
+        if self._rows is not None:
+            # Entram na tabela quando o filtro for recalculado
+            self._files.extend(files)
+            self._checked.extend(bytes(len(files)))
+            return
+        first_row = len(self._files)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(files) - 1)
+        self._files.extend(files)
+        self._checked.extend(bytes(len(files)))
+        self.endInsertRows()
+
+    def remove_rows(self, rows):
+        """Remove presets pelo id; os seguintes são renumerados, como em XMPManager.xmp_files"""
+        rows = sorted(rows)
+        if not rows:
+            return
+        # Faixas contíguas, removidas de baixo para cima para que as posições continuem válidas
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        self._sort_ranks = None
+
+        if self._rows is not None:
+            # Com filtro, as linhas exibidas não são os ids: reinicia o modelo com os ids renumerados
+            self.beginResetModel()
+            for first, last in reversed(ranges):
+                del self._files[first:last + 1]
+                del self._checked[first:last + 1]
+            removed = set(rows)
+            self._rows = [preset_id - bisect_left(rows, preset_id) for preset_id in self._rows
+                          if preset_id not in removed]
+            self.endResetModel()
+            return
+
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._files[first:last + 1]
+            del self._checked[first:last + 1]
+            self.endRemoveRows()
+
+    def refresh_rows(self, rows):
+        """Avisa a view de que cluster/grupo dos presets informados (ids) mudaram"""
+        rows = list(rows)
+        if not rows:
+            return
+        self._sort_ranks = None
+        if self._rows is not None:
+            # Sem o mapa id -> linha exibida: avisa sobre todas as linhas exibidas
+            rows = [0, len(self._rows) - 1] if self._rows else []
+            if not rows:
+                return
+        self.dataChanged.emit(
+            self.index(min(rows), self.CLUSTER_COLUMN),
+            self.index(max(rows), self.GROUP_COLUMN),
+            [Qt.DisplayRole, Qt.BackgroundRole]
+        )
+
+    def set_suggestions(self, suggested_clusters, suggested_groups):
+        """Exibe as sugestões da detecção inteligente ao lado dos valores atuais"""
+        self._suggested_clusters = suggested_clusters
+        self._suggested_groups = suggested_groups
+        if self.rowCount():
+            self.dataChanged.emit(
+                self.index(0, self.CLUSTER_COLUMN),
+                self.index(self.rowCount() - 1, self.GROUP_COLUMN),
+                [Qt.DisplayRole, Qt.BackgroundRole]
+            )
+
+    def files(self):
+        return self._files
+
+    def _preset_id(self, row):
+        return row if self._rows is None else self._rows[row]
+
+    def _sort_rows(self):
+        column = self._sort_column
+        if column is None or column < 0:
+            return
+        if self._sort_ranks is None:
+            # Uma chave Python por preset, só quando a coluna ou os presets mudam; a cada tecla
+            # do filtro as linhas exibidas são ordenadas pela posição já calculada
+            files = self._files
+            if column == self.CHECK_COLUMN:
+                key = self._checked.__getitem__
+            elif column == self.CLUSTER_COLUMN:
+                key = lambda preset_id: files[preset_id].cluster.lower()
+            elif column == self.GROUP_COLUMN:
+                key = lambda preset_id: files[preset_id].group.lower()
+            else:
+                key = lambda preset_id: files[preset_id].display_name.lower()
+            ranks = array('q', bytes(8 * len(files)))
+            for position, preset_id in enumerate(sorted(range(len(files)), key=key)):
+                ranks[preset_id] = position
+            self._sort_ranks = ranks
+        self._rows.sort(key=self._sort_ranks.__getitem__, reverse=self._sort_order == Qt.DescendingOrder)
+
+    @staticmethod
+    def _with_suggestion(current, suggested):
+        if suggested is None:
+            return current
+        return f"{current} → {suggested}"
+
+
+class _FolderEntry:
+    """Pasta da biblioteca (estrutura de apoio, sempre completa, mesmo para nós não expandidos)"""
+    __slots__ = ('path', 'name', 'parent', 'subfolders', 'files', 'total', 'checked_files', 'node')
+
+    def __init__(self, path, name, parent):
+        self.path = path
+        self.name = name
+        self.parent = parent
+        self.subfolders = []
+        self.files = []  # Índices dos arquivos diretamente nesta pasta
+        self.total = 0  # Número de arquivos nesta pasta e em todas as subpastas
+        self.checked_files = 0  # Quantos desses arquivos estão marcados
+        self.node = None  # _TreeNode correspondente, se já materializado
+
+    @property
+    def checked(self):
+        """Estado tri-state derivado dos contadores (valores de Qt.CheckState)"""
+        if self.checked_files == 0:
+            return 0
+        return 2 if self.checked_files == self.total else 1
+
+
+class _TreeNode:
+    """Nó materializado da árvore (criado apenas quando a pasta pai é expandida)"""
+    __slots__ = ('parent', 'row', 'folder', 'file_index', 'children')
+
+    def __init__(self, parent, row, folder=None, file_index=-1):
+        self.parent = parent
+        self.row = row
+        self.folder = folder  # _FolderEntry para pastas, None para arquivos
+        self.file_index = file_index
+        self.children = None  # None = filhos ainda não carregados
+
+
+class FolderTreeModel(QAbstractItemModel):
+    """
+    Modelo preguiçoso da árvore de pastas e arquivos com checkboxes
+
+    A estrutura de pastas e as contagens de arquivos são mantidas em _FolderEntry;
+    os nós da view (_TreeNode) só são criados em fetchMore, quando a pasta é expandida.
+    Cada pasta guarda quantos arquivos existem e quantos estão marcados abaixo dela,
+    então marcar um item só atualiza os contadores da cadeia de pastas pai (O(profundidade)).
+    """
+
+    HEADERS = ["Folders & Files", "Cluster", "Group"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._highlight = QBrush(Qt.yellow)
+        self._reset_data(None)
+
+    def _reset_data(self, root_folder):
+        self._root_folder = root_folder
+        self._files = []
+        self._checked_indices = set()  # Índices dos arquivos marcados (proporcional à seleção)
+        self._entries = {}  # Caminho da pasta -> _FolderEntry
+        self._suggested_clusters = {}
+        self._suggested_groups = {}
+        self._invisible = _TreeNode(None, 0)
+        self._invisible.children = []
+
+        if root_folder:
+            entry = _FolderEntry(root_folder, os.path.basename(root_folder) or root_folder, None)
+            self._entries[root_folder] = entry
+            entry.node = _TreeNode(self._invisible, 0, folder=entry)
+            self._invisible.children.append(entry.node)
+
+    # Carga dos dados
+
+    def reset_root(self, root_folder):
+        """Limpa o modelo e define a pasta raiz (None para deixar a árvore vazia)"""
+        self.beginResetModel()
+        self._reset_data(root_folder)
+        self.endResetModel()
+
+    def add_files(self, files):
+        """Acrescenta um bloco de arquivos escaneados, criando as pastas que ainda não existem"""
+        if self._root_folder is None or not files:
+            return
+
+        appended = {}  # Nó materializado -> novos filhos (inseridos com um único sinal por nó)
+        for file_info in files:
+            file_index = len(self._files)
+            self._files.append(file_info)
+
+            entry = self._folder_entry(os.path.dirname(file_info.path), appended)
+            entry.files.append(file_index)
+            # Arquivos que chegam numa pasta totalmente marcada entram marcados
+            bit = 1 if self._is_fully_checked(entry) else 0
+            if bit:
+                self._checked_indices.add(file_index)
+
+            parent = entry
+            while parent is not None:
+                parent.total += 1
+                parent.checked_files += bit
+                parent = parent.parent
+
+            if entry.node is not None and entry.node.children is not None:
+                appended.setdefault(entry.node, []).append((None, file_index))
+
+        for node, new_children in appended.items():
+            self._append_children(node, new_children)
+
+    def _folder_entry(self, folder_path, appended):
+        """Retorna a _FolderEntry de uma pasta, criando a cadeia de pastas pai se necessário"""
+        entry = self._entries.get(folder_path)
+        if entry is not None:
+            return entry
+
+        parent_path = os.path.dirname(folder_path)
+        if parent_path == folder_path:
+            # Fora da pasta raiz: pendurar direto na raiz
+            return self._entries[self._root_folder]
+
+        parent = self._folder_entry(parent_path, appended)
+        entry = _FolderEntry(folder_path, os.path.basename(folder_path), parent)
+        parent.subfolders.append(entry)
+        self._entries[folder_path] = entry
+
+        if parent.node is not None and parent.node.children is not None:
+            appended.setdefault(parent.node, []).append((entry, -1))
+        return entry
+
+    def _append_children(self, node, new_children):
+        first_row = len(node.children)
+        self.beginInsertRows(self._index_for_node(node), first_row, first_row + len(new_children) - 1)
+        for row, (folder, file_index) in enumerate(new_children, first_row):
+            child = _TreeNode(node, row, folder=folder, file_index=file_index)
+            if folder is not None:
+                folder.node = child
+            node.children.append(child)
+        self.endInsertRows()
+
+    def finish_loading(self):
+        """Ordena os nós já materializados depois que o escaneamento termina"""
+        self.layoutAboutToBeChanged.emit()
+        old_persistent = self.persistentIndexList()
+        persistent_nodes = [(index.internalPointer(), index.column()) for index in old_persistent]
+
+        stack = [self._invisible]
+        while stack:
+            node = stack.pop()
+            if node.children:
+                node.children.sort(key=self._sort_key)
+                for row, child in enumerate(node.children):
+                    child.row = row
+                    if child.children is not None:
+                        stack.append(child)
+
+        self.changePersistentIndexList(
+            old_persistent,
+            [self.createIndex(node.row, column, node) for node, column in persistent_nodes]
+        )
+        self.layoutChanged.emit()
+
+    def remove_files(self, file_indices):
+        """
+        Remove arquivos (índices na ordem do escaneamento) e as pastas que ficaram vazias
+
+        Os índices dos arquivos seguintes são renumerados, como em XMPManager.xmp_files.
+        """
+        removed = sorted(set(file_indices))
+        if self._root_folder is None or not removed:
+            return
+
+        root = self._entries[self._root_folder]
+        for file_index in removed:
+            entry = self._entries.get(os.path.dirname(self._files[file_index].path), root)
+            entry.files.remove(file_index)
+            if entry.node is not None and entry.node.children is not None:
+                self._remove_child(entry.node, next(child for child in entry.node.children
+                                                    if child.folder is None and child.file_index == file_index))
+
+            bit = 1 if file_index in self._checked_indices else 0
+            self._checked_indices.discard(file_index)
+            parent = entry
+            while parent is not None:
+                parent.total -= 1
+                parent.checked_files -= bit
+                parent = parent.parent
+
+            # Pastas sem arquivos saem da árvore (a raiz permanece)
+            while entry is not root and entry.total == 0:
+                parent = entry.parent
+                parent.subfolders.remove(entry)
+                del self._entries[entry.path]
+                if entry.node is not None:
+                    self._remove_child(parent.node, entry.node)
+                entry = parent
+
+        # Renumerar os índices dos arquivos restantes
+        new_index = lambda old: old - bisect_left(removed, old)
+        removed_set = set(removed)
+        self._files = [file_info for i, file_info in enumerate(self._files) if i not in removed_set]
+        self._checked_indices = {new_index(i) for i in self._checked_indices}
+        for entry in self._entries.values():
+            entry.files = [new_index(i) for i in entry.files]
+        stack = [self._invisible]
+        while stack:
+            node = stack.pop()
+            for child in node.children:
+                if child.folder is None:
+                    child.file_index = new_index(child.file_index)
+                elif child.children is not None:
+                    stack.append(child)
+
+        # Contagens e estado dos checkboxes das pastas
+        self._emit_subtree_changed(self._invisible, [Qt.CheckStateRole, Qt.ToolTipRole])
+
+    def _remove_child(self, node, child):
+        row = child.row
+        self.beginRemoveRows(self._index_for_node(node), row, row)
+        del node.children[row]
+        for sibling in node.children[row:]:
+            sibling.row -= 1
+        self.endRemoveRows()
+
+    def refresh_files(self, file_indices):
+        """Avisa a view de que cluster/grupo dos arquivos informados mudaram"""
+        if self._root_folder is None:
+            return
+        # Só os arquivos de pastas já expandidas têm nós na view; um sinal por pasta
+        root = self._entries[self._root_folder]
+        by_node = {}
+        for file_index in file_indices:
+            entry = self._entries.get(os.path.dirname(self._files[file_index].path), root)
+            if entry.node is not None and entry.node.children is not None:
+                by_node.setdefault(entry.node, set()).add(file_index)
+
+        for node, indices in by_node.items():
+            rows = [child.row for child in node.children if child.folder is None and child.file_index in indices]
+            if rows:
+                first, last = node.children[min(rows)], node.children[max(rows)]
+                self.dataChanged.emit(
+                    self.createIndex(first.row, 1, first),
+                    self.createIndex(last.row, 2, last),
+                    [Qt.DisplayRole, Qt.BackgroundRole]
+                )
+
+    def _sort_key(self, node):
+        if node.folder is not None:
+            return node.folder.name.lower()
+        return self._files[node.file_index].filename.lower()
+
+    def set_suggestions(self, suggested_clusters, suggested_groups):
+        """Exibe as sugestões da detecção inteligente ao lado dos valores atuais"""
+        self._suggested_clusters = suggested_clusters
+        self._suggested_groups = suggested_groups
+        self._emit_subtree_changed(self._invisible, [Qt.DisplayRole, Qt.BackgroundRole], last_column=2)
+
+    # Interface do QAbstractItemModel
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = parent.internalPointer() if parent.isValid() else self._invisible
+        if node.children is None or not (0 <= row < len(node.children)):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._invisible:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            if parent.column() != 0:
+                return 0
+            node = parent.internalPointer()
+        else:
+            node = self._invisible
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._invisible.children)
+        node = parent.internalPointer()
+        if node.folder is None or parent.column() != 0:
+            return False
+        return bool(node.folder.subfolders or node.folder.files)
+
+    def canFetchMore(self, parent):
+        if not parent.isValid():
+            return False
+        node = parent.internalPointer()
+        return node.folder is not None and node.children is None
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        node = parent.internalPointer()
+        entry = node.folder
+
+        children = [(folder, -1) for folder in entry.subfolders] + [(None, i) for i in entry.files]
+        node.children = []
+        if children:
+            children.sort(key=lambda child: child[0].name.lower() if child[0] is not None
+                          else self._files[child[1]].filename.lower())
+            self._append_children(node, children)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        node = index.internalPointer()
+        column = index.column()
+
+        if node.folder is not None:
+            entry = node.folder
+            if column == 0:
+                if role == Qt.DisplayRole:
+                    return entry.name
+                if role == Qt.CheckStateRole:
+                    return Qt.CheckState(entry.checked)
+                if role == Qt.ToolTipRole:
+                    return f"{entry.total} presets"
+            elif role == Qt.DisplayRole:
+                return ""
+            return None
+
+        file_info = self._files[node.file_index]
+        path = file_info.path
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return file_info.filename
+            if column == 1:
+                return PresetTableModel._with_suggestion(file_info.cluster, self._suggested_clusters.get(path))
+            return PresetTableModel._with_suggestion(file_info.group, self._suggested_groups.get(path))
+        if role == Qt.CheckStateRole and column == 0:
+            return Qt.Checked if node.file_index in self._checked_indices else Qt.Unchecked
+        if role == Qt.BackgroundRole:
+            # Destacar visualmente as células com sugestões
+            if (column == 1 and path in self._suggested_clusters) or (column == 2 and path in self._suggested_groups):
+                return self._highlight
+        if role == Qt.ToolTipRole and column == 0:
+            return path
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+
+        node = index.internalPointer()
+        checked = Qt.CheckState(value) != Qt.Unchecked
+
+        if node.folder is not None:
+            delta = self._set_folder_checked(node.folder, checked)
+            self._emit_subtree_changed(node, [Qt.CheckStateRole])
+            parent_entry = node.folder.parent
+        else:
+            was_checked = node.file_index in self._checked_indices
+            if checked:
+                self._checked_indices.add(node.file_index)
+            else:
+                self._checked_indices.discard(node.file_index)
+            delta = int(checked) - int(was_checked)
+            parent_entry = node.parent.folder
+
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        if delta:
+            self._update_ancestors(parent_entry, delta)
+        return True
+
+    # Estado dos checkboxes
+
+    @staticmethod
+    def _is_fully_checked(entry):
+        """Pasta (ou a primeira pasta pai com arquivos) com todos os arquivos marcados"""
+        while entry is not None and entry.total == 0:
+            entry = entry.parent
+        return entry is not None and entry.checked_files == entry.total
+
+    def _set_folder_checked(self, entry, checked):
+        """
+        Marca/desmarca uma pasta e tudo o que está abaixo dela
+
+        Returns:
+            Variação no número de arquivos marcados (a aplicar nas pastas pai)
+        """
+        delta = (entry.total if checked else 0) - entry.checked_files
+        update = self._checked_indices.update if checked else self._checked_indices.difference_update
+        stack = [entry]
+        while stack:
+            folder = stack.pop()
+            folder.checked_files = folder.total if checked else 0
+            update(folder.files)
+            stack.extend(folder.subfolders)
+        return delta
+
+    def _update_ancestors(self, entry, delta):
+        """Aplica a variação de arquivos marcados em cada pasta pai, até a raiz"""
+        while entry is not None:
+            entry.checked_files += delta
+            if entry.node is not None:
+                index = self._index_for_node(entry.node)
+                self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+            entry = entry.parent
+
+    def set_all_checked(self, checked):
+        """Marca/desmarca todos os itens da árvore em uma única operação"""
+        if self._root_folder is None:
+            return
+        self._checked_indices = set(range(len(self._files))) if checked else set()
+        for entry in self._entries.values():
+            entry.checked_files = entry.total if checked else 0
+
+        # Só os nós já materializados precisam ser avisados
+        self._emit_subtree_changed(self._invisible, [Qt.CheckStateRole])
+
+    def set_checked_files(self, file_indices):
+        """Marca exatamente os arquivos informados (índices na ordem do escaneamento) e desmarca os demais"""
+        if self._root_folder is None:
+            return
+        self._checked_indices = set(file_indices)
+        for entry in self._entries.values():
+            entry.checked_files = 0
+
+        root = self._entries[self._root_folder]
+        for file_index in self._checked_indices:
+            entry = self._entries.get(os.path.dirname(self._files[file_index].path), root)
+            while entry is not None:
+                entry.checked_files += 1
+                entry = entry.parent
+
+        self._emit_subtree_changed(self._invisible, [Qt.CheckStateRole])
+
+    def checked_paths(self):
+        """Caminhos dos arquivos marcados, na ordem do escaneamento (O(marcados), não O(biblioteca))"""
+        files = self._files
+        return [files[i].path for i in sorted(self._checked_indices)]
+
+    def file_count(self):
+        return len(self._files)
+
+    def _index_for_node(self, node):
+        if node is self._invisible:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def _emit_subtree_changed(self, node, roles, last_column=0):
+        """Notifica a view sobre mudanças em todos os nós materializados abaixo de node"""
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.children:
+                parent_index = self._index_for_node(current)
+                self.dataChanged.emit(
+                    self.index(0, 0, parent_index),
+                    self.index(len(current.children) - 1, last_column, parent_index),
+                    roles
+                )
+                stack.extend(child for child in current.children if child.children)
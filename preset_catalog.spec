@@ -3,7 +3,9 @@
 block_cipher = None
 
 a = Analysis(
-    ['main.py', 'xmp_manager.py', 'styles.py'],  # Incluir todos os módulos principais
+    # Incluir todos os módulos principais (todos os importados pelo aplicativo)
+    ['main.py', 'xmp_manager.py', 'xmp_index.py', 'atomic_io.py', 'catalog_index.py', 'search_index.py',
+     'write_journal.py', 'snapshot_store.py', 'workers.py', 'models.py', 'catalog_watcher.py', 'styles.py'],
     pathex=['.'],
     binaries=[],
     datas=[
@@ -0,0 +1,160 @@
+"""
+Search index behind the catalog filter bar
+
+Preset names are kept lowercased in a single newline-separated string with the
+offset of each name, so a selective substring search is a handful of str.find
+calls in C instead of one Python comparison per preset (broad queries, which
+match a large part of the library, scan the list of names instead), and in an
+array of ids sorted by name for prefix searches. Clusters and groups are matched once per distinct
+value through the CatalogIndex vocabulary, and folders once per folder. The
+index follows XMPManager.xmp_files as it grows during a scan and is rebuilt
+when a new scan starts.
+"""
+
+import os
+import re
+from array import array
+from bisect import bisect_right
+
+# Modos de busca e campos pesquisáveis aceitos por PresetSearchIndex.search
+SEARCH_MODES = ('contains', 'prefix', 'regex')
+SEARCH_FIELDS = ('name', 'cluster', 'group', 'folder')
+
+
+class PresetSearchIndex:
+    """Índice de busca por nome, cluster, grupo e pasta sobre os presets escaneados"""
+
+    def __init__(self):
+        self._records = None
+        self._reset()
+
+    def _reset(self):
+        self._count = 0  # Número de registros já indexados
+        self._names = []  # Nomes em minúsculas, por id
+        self._blob = ""  # Os mesmos nomes, cada um seguido de '\n'
+        self._starts = array('q', [0])  # Posição de cada nome no blob, mais a posição final
+        self._by_name = None  # Ids ordenados pelo nome (criado sob demanda)
+        self._folders = {}  # Pasta relativa à pasta escaneada, em minúsculas -> lista de ids
+
+    def sync(self, records):
+        """Indexa os registros ainda não vistos de records (a lista de presets de XMPManager)"""
+        if records is not self._records:
+            # Novo escaneamento: a lista foi substituída
+            self._records = records
+            self._reset()
+
+        if len(records) == self._count:
+            return
+
+        names = []
+        position = len(self._blob)
+        for preset_id in range(self._count, len(records)):
+            record = records[preset_id]
+            name = record.filename.lower().replace("\n", " ")
+            names.append(name)
+            position += len(name) + 1
+            self._starts.append(position)
+            self._folders.setdefault(os.path.dirname(record.rel_path).lower(), []).append(preset_id)
+
+        self._names.extend(names)
+        self._blob += "\n".join(names) + "\n"
+        self._count = len(records)
+        self._by_name = None
+
+    def search(self, query, catalog, mode='contains', fields=SEARCH_FIELDS):
+        """
+        Ids dos presets (em ordem de escaneamento) em que algum dos campos casa com query
+
+        A comparação ignora maiúsculas/minúsculas.
+
+        Args:
+            query: Texto buscado (ou expressão regular no modo 'regex')
+            catalog: CatalogIndex dos mesmos registros, usado para cluster e grupo
+            mode: 'contains', 'prefix' ou 'regex'
+            fields: Campos pesquisados (subconjunto de SEARCH_FIELDS)
+
+        Raises:
+            ValueError: modo desconhecido
+            re.error: expressão regular inválida
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+
+        # matches recebe valores já em minúsculas
+        if mode == 'regex':
+            pattern = re.compile(query, re.IGNORECASE)
+            matches = lambda value: pattern.search(value) is not None
+        else:
+            query = query.lower()
+            if mode == 'contains':
+                matches = lambda value: query in value
+            else:
+                matches = lambda value: value.startswith(query)
+        predicate = lambda value: matches(value.lower())
+
+        name_ids = []
+        if 'name' in fields:
+            if mode == 'contains':
+                name_ids = self._names_containing(query)
+            elif mode == 'prefix':
+                name_ids = sorted(self._names_starting_with(query))
+            else:
+                name_ids = [preset_id for preset_id, name in enumerate(self._names) if pattern.search(name)]
+
+        ids = set()
+        if 'cluster' in fields:
+            ids.update(catalog.ids_matching_cluster(predicate))
+        if 'group' in fields:
+            ids.update(catalog.ids_matching_group(predicate))
+        if 'folder' in fields:
+            for folder, folder_ids in self._folders.items():
+                if matches(folder):
+                    ids.update(folder_ids)
+
+        if not ids:
+            return list(name_ids)
+        ids.update(name_ids)
+        return sorted(ids)
+
+    # Busca nos nomes
+
+    def _names_containing(self, query):
+        if "\n" in query:
+            return []
+        # Consulta abrangente (ex.: uma única letra): percorrer os nomes sai mais barato
+        # do que localizar cada ocorrência no blob
+        if not query or self._blob.count(query) * 8 > self._count:
+            return [preset_id for preset_id, name in enumerate(self._names) if query in name]
+
+        blob = self._blob
+        starts = self._starts
+        ids = []
+        position = blob.find(query)
+        while position != -1:
+            preset_id = bisect_right(starts, position) - 1
+            ids.append(preset_id)
+            # Continuar no nome seguinte: cada preset entra uma única vez
+            position = blob.find(query, starts[preset_id + 1])
+        return ids
+
+    def _names_starting_with(self, query):
+        names = self._names
+        if self._by_name is None:
+            self._by_name = array('q', sorted(range(self._count), key=names.__getitem__))
+        by_name = self._by_name
+
+        # Busca binária pelo primeiro nome >= query
+        low, high = 0, len(by_name)
+        while low < high:
+            middle = (low + high) // 2
+            if names[by_name[middle]] < query:
+                low = middle + 1
+            else:
+                high = middle
+
+        ids = []
+        for preset_id in by_name[low:]:
+            if not names[preset_id].startswith(query):
+                break
+            ids.append(preset_id)
+        return ids
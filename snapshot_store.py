@@ -0,0 +1,224 @@
+"""
+Content-addressed snapshots of modified presets, for undo
+
+Every update that rewrites presets records an operation: for each file written,
+the hash of its original bytes and the hash of the bytes written, so an undo can
+tell whether the file was changed again afterwards. The original bytes are
+stored once per distinct content, compressed, under objects/<first two hex
+digits>/<sha256>, so snapshotting the same preset twice (or identical presets in
+different folders) costs nothing extra. Only the last max_operations operations
+are kept; objects no longer referenced by any of them are deleted, except the
+ones held by the journal of an interrupted batch (see WriteJournal), which
+uses the objects as its copies of the original files.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from atomic_io import AtomicWriter
+
+
+def file_digest(file_path):
+    """Hash SHA-256 (hex) do conteúdo de um arquivo"""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class SnapshotOperation:
+    """Operação em andamento: arquivos gravados e o hash do conteúdo original de cada um"""
+
+    def __init__(self, store, description):
+        self.store = store
+        self.description = description
+        self.created = time.time()
+        self.files = []
+        self._lock = threading.Lock()
+
+    def add(self, file_path, digest, written):
+        """
+        Registra um arquivo já gravado
+
+        Args:
+            file_path: Arquivo gravado
+            digest: Retorno de SnapshotStore.put para os bytes originais
+            written: Bytes gravados (o hash é calculado deles, sem reler o arquivo)
+        """
+        written = hashlib.sha256(written).hexdigest()
+        with self._lock:
+            self.files.append({'path': file_path, 'hash': digest, 'written': written})
+
+    def commit(self):
+        """Grava a operação no histórico (operações sem arquivos gravados são descartadas)"""
+        if self.files:
+            self.store._commit(self)
+
+
+class SnapshotStore:
+    """Histórico de operações e armazenamento, por hash, do conteúdo original dos arquivos modificados"""
+
+    def __init__(self, root, max_operations=20, compress_level=6):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.operations_dir = os.path.join(root, "operations")
+        self.holds_dir = os.path.join(root, "holds")
+        self.max_operations = max_operations
+        self.compress_level = compress_level
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.operations_dir, exist_ok=True)
+        os.makedirs(self.holds_dir, exist_ok=True)
+
+    def begin(self, description):
+        """Inicia uma operação; chame commit() depois das gravações"""
+        return SnapshotOperation(self, description)
+
+    def put(self, data, fsync=False):
+        """
+        Guarda os bytes originais de um arquivo, uma única vez por conteúdo
+
+        Pode ser chamado de várias threads ao mesmo tempo.
+
+        Args:
+            data: Bytes originais
+            fsync: Se True, o conteúdo do objeto é gravado em disco; a pasta do objeto
+                   (object_folder) fica para quem chamou sincronizar, uma vez por lote
+
+        Returns:
+            Hash SHA-256 (hex) do conteúdo
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Sem o flush do writer: a sincronização da pasta fica com quem chamou (ver WriteJournal.sync)
+            AtomicWriter(fsync=fsync).write_bytes(path, zlib.compress(data, self.compress_level))
+        return digest
+
+    def object_folder(self, digest):
+        """Pasta em que o objeto com o hash informado é guardado"""
+        return os.path.dirname(self._object_path(digest))
+
+    def get(self, digest):
+        """Retorna os bytes originais guardados com o hash informado"""
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def hold(self, journal_path):
+        """
+        Protege da limpeza (prune) os objetos citados por um diário de lote
+
+        O diário é um arquivo JSON Lines; os objetos são os valores da chave "original".
+        A proteção vale até release(), ou até o diário deixar de existir.
+        """
+        with AtomicWriter(fsync=True) as writer:
+            writer.write_text(self._hold_path(journal_path), os.path.abspath(journal_path))
+
+    def release(self, journal_path):
+        """Remove a proteção de hold() (lote concluído, desfeito ou descartado)"""
+        try:
+            os.remove(self._hold_path(journal_path))
+        except FileNotFoundError:
+            pass
+
+    def operations(self):
+        """
+        Operações que podem ser desfeitas, da mais recente para a mais antiga
+
+        Returns:
+            Lista de dicionários com id, created, description e files (path, hash do
+            conteúdo original e written, hash do conteúdo gravado, de cada arquivo)
+        """
+        operations = []
+        for name in sorted(os.listdir(self.operations_dir), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.operations_dir, name), 'r', encoding='utf-8') as f:
+                    operation = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable snapshot {name}: {str(e)}")
+                continue
+            operation['id'] = name[:-len(".json")]
+            operations.append(operation)
+        return operations
+
+    def remove_operation(self, operation_id):
+        """Remove uma operação do histórico (depois de desfeita) e os objetos que ficaram sem uso"""
+        try:
+            os.remove(os.path.join(self.operations_dir, f"{operation_id}.json"))
+        except FileNotFoundError:
+            pass
+        self.prune()
+
+    def update_operation(self, operation_id, files):
+        """Mantém no histórico só os arquivos de uma operação que ainda não foram desfeitos"""
+        path = os.path.join(self.operations_dir, f"{operation_id}.json")
+        with open(path, 'r', encoding='utf-8') as f:
+            operation = json.load(f)
+        operation['files'] = files
+        with AtomicWriter(fsync=False) as writer:
+            writer.write_text(path, json.dumps(operation, ensure_ascii=False))
+        self.prune()
+
+    def prune(self):
+        """Mantém só as últimas max_operations operações e apaga os objetos não referenciados"""
+        operations = self.operations()
+        for operation in operations[self.max_operations:]:
+            os.remove(os.path.join(self.operations_dir, f"{operation['id']}.json"))
+
+        referenced = {entry['hash'] for operation in operations[:self.max_operations] for entry in operation['files']}
+        referenced |= self._held_digests()
+        for folder in os.listdir(self.objects_dir):
+            folder_path = os.path.join(self.objects_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                # Inclui temporários de gravações interrompidas
+                if name not in referenced:
+                    os.remove(os.path.join(folder_path, name))
+
+    def _commit(self, operation):
+        # O nome ordena as operações cronologicamente
+        name = f"{time.time_ns():020d}.json"
+        content = json.dumps({'created': operation.created, 'description': operation.description,
+                              'files': operation.files}, ensure_ascii=False)
+        with AtomicWriter(fsync=False) as writer:
+            writer.write_text(os.path.join(self.operations_dir, name), content)
+        self.prune()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _hold_path(self, journal_path):
+        name = hashlib.sha1(os.path.abspath(journal_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.holds_dir, f"{name}.txt")
+
+    def _held_digests(self):
+        digests = set()
+        for name in os.listdir(self.holds_dir):
+            if not name.endswith(".txt"):
+                continue
+            hold_path = os.path.join(self.holds_dir, name)
+            try:
+                with open(hold_path, 'r', encoding='utf-8') as f:
+                    journal_path = f.read()
+                with open(journal_path, 'r', encoding='utf-8') as f:
+                    lines = f.read().splitlines()
+            except FileNotFoundError:
+                # Diário apagado: a proteção não vale mais
+                if os.path.exists(hold_path):
+                    os.remove(hold_path)
+                continue
+            except OSError:
+                continue
+            for line in lines:
+                try:
+                    digest = json.loads(line).get('original')
+                except ValueError:
+                    continue
+                if digest:
+                    digests.add(digest)
+        return digests
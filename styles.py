@@ -17,7 +17,7 @@ QLineEdit {
     padding: 4px;
 }
 
-QTableWidget {
+QTableView {
     gridline-color: #e0e0e0;
     border: none;
     border-radius: 4px;
@@ -36,7 +36,7 @@ QTableView::item {
 }
 
 /* Define a cor das linhas alternadas para ser mais sutil */
-QTableWidget {
+QTableView {
     alternate-background-color: #f7f7f7;
 }
 
@@ -0,0 +1,40 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+import cli
+
+# Verificações da interface de linha de comando sobre uma biblioteca pequena
+# Pode ser executado diretamente (python test_cli.py) ou com pytest
+
+PRESET = ('<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF><rdf:Description rdf:about="" crs:Cluster="{cluster}">\n'
+          '   <crs:Group>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">{group}</rdf:li>\n    </rdf:Alt>\n'
+          '   </crs:Group>\n</rdf:Description></rdf:RDF></x:xmpmeta>\n')
+
+
+def run_cli(argv):
+    """Executa a CLI e retorna (código de saída, saída padrão)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        code = cli.main(argv + ['--quiet'])
+    return code, out.getvalue()
+
+
+def test_smart_detect_json():
+    # As sugestões carregam o PresetRecord em file_info, que não pode ir para o JSON
+    with tempfile.TemporaryDirectory() as folder:
+        os.makedirs(os.path.join(folder, "Portraits", "Warm"))
+        with open(os.path.join(folder, "Portraits", "Warm", "soft.xmp"), 'w', encoding='utf-8') as f:
+            f.write(PRESET.format(cluster="", group=""))
+
+        code, output = run_cli(['smart-detect', folder])
+        rows = json.loads(output)
+        assert code == 0
+        assert rows and all(set(row) == set(cli.DETECTION_FIELDS) for row in rows)
+
+
+if __name__ == "__main__":
+    test_smart_detect_json()
+    print("OK")
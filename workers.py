@@ -0,0 +1,155 @@
+"""
+Background job engine for the Preset Catalog GUI
+
+Runs XMPManager operations on a QThreadPool so the main window never blocks.
+Jobs report progress, partial results and completion through Qt signals, can
+be canceled cooperatively, and jobs that touch the same resource (by default
+the preset library) are queued and executed one at a time.
+"""
+
+import threading
+import traceback
+from collections import deque
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class JobSignals(QObject):
+    """Sinais emitidos por um Job (entregues na thread da interface)"""
+    started = Signal()
+    progress = Signal(int, int, str)  # concluídos, total (0 = indeterminado), mensagem
+    chunk = Signal(list)  # resultados parciais
+    finished = Signal(object)  # resultado da função
+    failed = Signal(str)
+    canceled = Signal(object)  # resultado parcial (ou None)
+    done = Signal()  # sempre emitido por último, qualquer que seja o desfecho
+
+
+class Job(QRunnable):
+    """
+    Executa uma função fora da thread da interface
+
+    A função recebe o próprio job como único argumento e pode usar
+    report_progress, emit_chunk e is_canceled para se comunicar com a interface.
+    """
+
+    def __init__(self, name, fn, resource="library"):
+        super().__init__()
+        self.setAutoDelete(False)  # O JobManager controla o tempo de vida
+        self.name = name
+        self.fn = fn
+        self.resource = resource
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """Solicita o cancelamento; a função encerra no próximo ponto de verificação"""
+        self._cancel_event.set()
+
+    def is_canceled(self):
+        return self._cancel_event.is_set()
+
+    def report_progress(self, done, total=0, message=""):
+        self.signals.progress.emit(done, total, message)
+
+    def emit_chunk(self, items):
+        if items:
+            self.signals.chunk.emit(list(items))
+
+    def run(self):
+        result = None
+        try:
+            if not self.is_canceled():
+                self.signals.started.emit()
+                result = self.fn(self)
+
+            if self.is_canceled():
+                self.signals.canceled.emit(result)
+            else:
+                self.signals.finished.emit(result)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+        finally:
+            self.signals.done.emit()
+
+
+class JobManager(QObject):
+    """
+    Fila de jobs em segundo plano
+
+    Jobs com o mesmo `resource` nunca rodam ao mesmo tempo: o segundo espera
+    o primeiro terminar. Jobs de recursos diferentes rodam em paralelo.
+    """
+
+    busy_changed = Signal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool.globalInstance()
+        self._running = {}  # resource -> job em execução
+        self._queues = {}  # resource -> deque de jobs aguardando
+
+    def submit(self, job):
+        """Agenda um job; ele começa imediatamente se o recurso estiver livre"""
+        job.signals.done.connect(lambda job=job: self._on_job_done(job))
+
+        was_busy = self.is_busy()
+        if job.resource in self._running:
+            self._queues.setdefault(job.resource, deque()).append(job)
+        else:
+            self._start(job)
+
+        if not was_busy:
+            self.busy_changed.emit(True)
+        return job
+
+    def is_busy(self):
+        return bool(self._running)
+
+    def running_jobs(self):
+        return list(self._running.values())
+
+    def cancel(self, job):
+        """Cancela um job em execução ou retira-o da fila"""
+        queue = self._queues.get(job.resource)
+        if queue and job in queue:
+            queue.remove(job)
+            job.cancel()
+            job.signals.canceled.emit(None)
+            job.signals.done.emit()
+            return
+        job.cancel()
+
+    def cancel_all(self):
+        """Cancela todos os jobs, inclusive os que estão na fila"""
+        for queue in self._queues.values():
+            while queue:
+                job = queue.popleft()
+                job.cancel()
+                job.signals.canceled.emit(None)
+                job.signals.done.emit()
+        for job in self._running.values():
+            job.cancel()
+
+    def wait_for_done(self, msecs=-1):
+        """Bloqueia até que os jobs em execução terminem (usado ao fechar a janela)"""
+        return self.pool.waitForDone(msecs)
+
+    def _start(self, job):
+        self._running[job.resource] = job
+        self.pool.start(job)
+
+    def _on_job_done(self, job):
+        if self._running.get(job.resource) is not job:
+            # Job retirado da fila antes de começar
+            return
+
+        del self._running[job.resource]
+
+        queue = self._queues.get(job.resource)
+        if queue:
+            self._start(queue.popleft())
+
+        if not self.is_busy():
+            self.busy_changed.emit(False)
@@ -0,0 +1,243 @@
+"""
+Journal for batch preset writes
+
+Before a batch update touches any preset, the journal records the files it is
+going to edit and the values to apply. While the batch runs it records the
+state of each file (pending, applied or failed) and keeps a copy of the
+original bytes of every file before it is overwritten. If the run is
+interrupted (app closed, crash, power loss) the batch can be resumed, applying
+only what is still pending, or rolled back, restoring the files already written.
+
+The journal is a JSON Lines file; every line is flushed as soon as it is
+written and a truncated last line is ignored when loading. The original
+contents are appended to a single file next to it ("<journal>.orig"), or, when
+undo snapshots are enabled, kept as objects of the SnapshotStore, so they are
+stored only once. The executor calls sync() once per chunk of files, before any
+file of the chunk is replaced, instead of syncing after every copy.
+"""
+
+import json
+import os
+import threading
+import time
+
+from atomic_io import fsync_directory
+from snapshot_store import SnapshotStore
+
+PENDING = 'pending'
+APPLIED = 'applied'
+FAILED = 'failed'
+
+
+class WriteJournal:
+    """Diário de uma gravação em lote (ver XMPManager.execute_batch)"""
+
+    VERSION = 1
+
+    def __init__(self, path, entries, repair_groups, fsync=True, snapshots=None):
+        # Use create() ou load()
+        self.path = path
+        self.originals_path = path + ".orig"
+        self.entries = entries  # Dicionários com path, cluster, group, state, written, error e original
+        self.repair_groups = repair_groups
+        self.fsync = fsync
+        self.snapshots = snapshots  # SnapshotStore que guarda os originais (None = pasta própria)
+        self._file = None
+        self._originals = None  # Arquivo "<journal>.orig", aberto no primeiro original guardado
+        self._lock = threading.Lock()
+        self._pending_dirs = set()  # Pastas com originais novos ainda não sincronizadas
+
+    @classmethod
+    def create(cls, path, targets, repair_groups=False, fsync=True, snapshots=None):
+        """
+        Cria o diário de um lote, com todos os arquivos pendentes
+
+        Args:
+            path: Arquivo do diário (um diário anterior no mesmo caminho é descartado)
+            targets: Tuplas (file_path, cluster, grupo), com None para o que não muda
+            repair_groups: Se True, o lote corrige tags crs:Group malformadas
+            fsync: Se True, as cópias dos originais são gravadas em disco antes de os arquivos serem substituídos
+            snapshots: SnapshotStore opcional onde guardar os originais
+        """
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        entries = [{'path': file_path, 'cluster': cluster, 'group': group,
+                    'state': PENDING, 'written': False, 'error': None, 'original': None, 'offset': None}
+                   for file_path, cluster, group in targets]
+        journal = cls(path, entries, repair_groups, fsync, snapshots)
+        journal._remove_files()
+        if snapshots is not None:
+            snapshots.hold(path)
+
+        lines = [{'journal': cls.VERSION, 'created': time.time(), 'repair_groups': repair_groups,
+                  'snapshots': snapshots.root if snapshots is not None else None}]
+        lines += [{'i': i, 'path': entry['path'], 'cluster': entry['cluster'], 'group': entry['group']}
+                  for i, entry in enumerate(entries)]
+        journal._file = open(path, 'w', encoding='utf-8')
+        journal._file.write(''.join(json.dumps(line, ensure_ascii=False) + '\n' for line in lines))
+        journal._sync()
+        return journal
+
+    @classmethod
+    def load(cls, path, fsync=True, snapshots=None):
+        """
+        Carrega o diário de um lote interrompido
+
+        snapshots é o SnapshotStore do lote; se não for informado, é aberto o registrado no diário.
+
+        Returns:
+            WriteJournal, ou None se o diário não existe ou não pode ser lido
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return None
+
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Última linha incompleta (interrupção no meio da gravação)
+                break
+        if not records or records[0].get('journal') != cls.VERSION:
+            print(f"Ignoring unreadable write journal {path}")
+            return None
+
+        entries = []
+        for record in records[1:]:
+            i = record['i']
+            if 'path' in record:
+                entries.append({'path': record['path'], 'cluster': record['cluster'], 'group': record['group'],
+                                'state': PENDING, 'written': False, 'error': None, 'original': None, 'offset': None})
+            elif i >= len(entries):
+                continue
+            elif 'original' in record:
+                entries[i]['original'] = record['original']
+            elif 'offset' in record:
+                entries[i]['offset'] = (record['offset'], record['size'])
+            else:
+                entries[i].update(state=record['state'], written=record.get('written', False),
+                                  error=record.get('error'))
+        if snapshots is None and records[0].get('snapshots'):
+            snapshots = SnapshotStore(records[0]['snapshots'])
+        journal = cls(path, entries, records[0].get('repair_groups', False), fsync, snapshots)
+        journal._file = open(path, 'a', encoding='utf-8')
+        return journal
+
+    def pending(self):
+        """Retorna as tuplas (índice, file_path, cluster, grupo) dos arquivos ainda não processados"""
+        return [(i, entry['path'], entry['cluster'], entry['group'])
+                for i, entry in enumerate(self.entries) if entry['state'] == PENDING]
+
+    def counts(self):
+        """Número de arquivos em cada estado (pending, applied, failed)"""
+        counts = {PENDING: 0, APPLIED: 0, FAILED: 0}
+        for entry in self.entries:
+            counts[entry['state']] += 1
+        return counts
+
+    def save_original(self, i, data):
+        """
+        Guarda os bytes originais do arquivo i; chame sync() antes de substituir o arquivo
+
+        Pode ser chamado de várias threads ao mesmo tempo.
+
+        Returns:
+            Hash do objeto no SnapshotStore, ou None se os originais ficam no arquivo do diário
+        """
+        if self.snapshots is not None:
+            digest = self.snapshots.put(data, fsync=self.fsync)
+            with self._lock:
+                self.entries[i]['original'] = digest
+                self._file.write(json.dumps({'i': i, 'original': digest}) + '\n')
+                self._pending_dirs.add(self.snapshots.object_folder(digest))
+            return digest
+
+        with self._lock:
+            if self._originals is None:
+                self._originals = open(self.originals_path, 'ab')
+                self._pending_dirs.add(os.path.dirname(os.path.abspath(self.originals_path)))
+            offset = self._originals.seek(0, os.SEEK_END)
+            self._originals.write(data)
+            self.entries[i]['offset'] = (offset, len(data))
+            self._file.write(json.dumps({'i': i, 'offset': offset, 'size': len(data)}) + '\n')
+        return None
+
+    def sync(self):
+        """Grava em disco as cópias dos originais salvas desde a última chamada e, depois, o diário"""
+        with self._lock:
+            pending, self._pending_dirs = self._pending_dirs, set()
+            if self._originals is not None:
+                self._originals.flush()
+                if self.fsync:
+                    os.fsync(self._originals.fileno())
+        if self.fsync:
+            for folder in pending:
+                fsync_directory(folder)
+        with self._lock:
+            self._sync()
+
+    def load_original(self, i):
+        """Retorna os bytes originais do arquivo i, ou None se ele não chegou a ser gravado"""
+        entry = self.entries[i]
+        try:
+            if entry.get('original'):
+                return self.snapshots.get(entry['original']) if self.snapshots is not None else None
+            if not entry.get('offset'):
+                return None
+            offset, size = entry['offset']
+            with open(self.originals_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size)
+        except OSError:
+            return None
+        # Cópia incompleta (interrupção antes do sync)
+        return data if len(data) == size else None
+
+    def mark(self, i, state, written=False, error=None):
+        """Registra o desfecho do arquivo i"""
+        entry = self.entries[i]
+        entry.update(state=state, written=written, error=error)
+        record = {'i': i, 'state': state}
+        if written:
+            record['written'] = True
+        if error:
+            record['error'] = error
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+        self._close_originals()
+
+    def discard(self):
+        """Fecha e apaga o diário e as cópias dos originais (lote concluído ou desfeito)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._close_originals()
+        self._remove_files()
+        if self.snapshots is not None:
+            self.snapshots.release(self.path)
+
+    def _close_originals(self):
+        if self._originals is not None:
+            self._originals.close()
+            self._originals = None
+
+    def _remove_files(self):
+        for path in (self.path, self.originals_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _sync(self):
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
@@ -0,0 +1,143 @@
+"""
+Persistent metadata index for XMP presets
+
+Stores the cluster/group extracted from each XMP file in a small SQLite database,
+keyed by the full path and validated by mtime/size/inode, so a rescan only needs
+to parse files that are new or were modified since the last scan.
+"""
+
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+class XMPIndex:
+    """Cache em disco dos metadados extraídos dos arquivos XMP"""
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        with self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                # Formato antigo ou desconhecido: descartar e recriar
+                conn.execute("DROP TABLE IF EXISTS files")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " path TEXT PRIMARY KEY,"
+                " mtime_ns INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " inode INTEGER NOT NULL,"
+                " cluster TEXT NOT NULL,"
+                " grp TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Uma conexão curta por operação: o índice pode ser usado a partir de qualquer thread
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _folder_range(folder_path):
+        """Intervalo de chaves que cobre todos os caminhos dentro de folder_path"""
+        prefix = os.path.join(folder_path, "")
+        return prefix, prefix + "\U0010ffff"
+
+    @staticmethod
+    def stat_key(st):
+        """Retorna a tupla (mtime_ns, size, inode) usada para validar uma entrada"""
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def load_folder(self, folder_path):
+        """
+        Load every indexed entry below a folder
+
+        Args:
+            folder_path: Root folder of the scan
+
+        Returns:
+            Dictionary path -> (mtime_ns, size, inode, cluster, group)
+        """
+        low, high = self._folder_range(folder_path)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT path, mtime_ns, size, inode, cluster, grp FROM files"
+                    " WHERE path >= ? AND path < ?",
+                    (low, high)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading metadata index {self.db_path}: {str(e)}")
+            return {}
+
+        return {row[0]: row[1:] for row in rows}
+
+    def update_folder(self, folder_path, entries, seen_paths=None):
+        """
+        Grava as entradas novas/modificadas e remove as que não existem mais
+
+        Args:
+            folder_path: Pasta raiz do escaneamento
+            entries: Lista de tuplas (path, mtime_ns, size, inode, cluster, group)
+            seen_paths: Conjunto com todos os caminhos encontrados no escaneamento.
+                        Se informado, entradas abaixo de folder_path que não estão
+                        no conjunto são removidas do índice.
+        """
+        try:
+            with self._connect() as conn:
+                if entries:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO files (path, mtime_ns, size, inode, cluster, grp)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        entries
+                    )
+
+                if seen_paths is not None:
+                    low, high = self._folder_range(folder_path)
+                    stale = [
+                        (row[0],) for row in conn.execute(
+                            "SELECT path FROM files WHERE path >= ? AND path < ?", (low, high)
+                        )
+                        if row[0] not in seen_paths
+                    ]
+                    if stale:
+                        conn.executemany("DELETE FROM files WHERE path = ?", stale)
+        except sqlite3.Error as e:
+            print(f"Error updating metadata index {self.db_path}: {str(e)}")
+
+    def remove_paths(self, paths):
+        """Remove as entradas de arquivos que deixaram de existir"""
+        if not paths:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
+        except sqlite3.Error as e:
+            print(f"Error updating metadata index {self.db_path}: {str(e)}")
+
+    def clear(self, folder_path=None):
+        """Remove as entradas de uma pasta (ou do índice inteiro) para forçar a releitura"""
+        try:
+            with self._connect() as conn:
+                if folder_path:
+                    low, high = self._folder_range(folder_path)
+                    conn.execute("DELETE FROM files WHERE path >= ? AND path < ?", (low, high))
+                else:
+                    conn.execute("DELETE FROM files")
+        except sqlite3.Error as e:
+            print(f"Error clearing metadata index {self.db_path}: {str(e)}")
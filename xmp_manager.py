@@ -1,190 +1,1505 @@
+import codecs
+import io
+import json
+import mmap
 import os
 import re
+import sys
+import time
+from collections import deque
+from atomic_io import AtomicWriter, TEMP_SUFFIX
+from catalog_index import CatalogIndex
+from search_index import PresetSearchIndex, SEARCH_FIELDS
+from xmp_index import XMPIndex
+from write_journal import WriteJournal, APPLIED, FAILED
+from snapshot_store import SnapshotStore, file_digest
+
+# Modos de extração de metadados aceitos por scan_xmp_files
+SCAN_MODES = ('serial', 'thread', 'process')
+
+# Modos de leitura dos arquivos em extract_metadata: 'full' lê e decodifica o arquivo
+# inteiro; 'prefix' lê blocos até que cluster e grupo estejam resolvidos; 'mmap' busca
+# nos bytes do arquivo mapeado em memória e decodifica apenas os valores encontrados
+READ_MODES = ('full', 'prefix', 'mmap')
+
+# Tamanho do primeiro bloco lido no modo 'prefix'; os blocos seguintes dobram de tamanho
+PREFIX_CHUNK_SIZE = 16 * 1024
+
+
+def _scan_file_task(task):
+    """
+    Lê os metadados de um arquivo; executado em série ou dentro de um pool de threads/processos
+    
+    Args:
+        task: Tupla (file_path, entrada do índice ou None, usar índice, modo de leitura)
+    
+    Returns:
+        Tupla (cluster, grupo, chave (mtime_ns, tamanho, inode) do arquivo ou None, mensagem de erro ou None)
+    """
+    file_path, cached_entry, use_index, read_mode = task
+    try:
+        # A chave também é guardada no registro, para detectar modificações depois do escaneamento
+        key = XMPIndex.stat_key(os.stat(file_path))
+        if use_index and cached_entry is not None and cached_entry[:3] == key:
+            return cached_entry[3], cached_entry[4], key, None
+        
+        cluster, group = _task_manager.extract_metadata(file_path, read_mode)
+        return cluster, group, key, None
+    except Exception as e:
+        return '(error)', '(error)', None, str(e)
+
+
+def _scan_batch_task(tasks):
+    """Processa um lote de tarefas de escaneamento (reduz a comunicação com os workers do pool)"""
+    return [_scan_file_task(task) for task in tasks]
+
+
+# Transformações puras do conteúdo XMP (sem E/S): combinadas por XMPManager.apply_edits
+# para que cada arquivo seja lido e gravado uma única vez, qualquer que seja a edição.
+
+def set_cluster(content, new_cluster):
+    """
+    Define o valor de crs:Cluster, adicionando o atributo se ele não existir
+    
+    Returns:
+        Tupla (conteúdo atualizado, número de substituições)
+    """
+    # Procura pelo padrão crs:Cluster="valor_anterior"
+    cluster_pattern = r'(crs:Cluster\s*=\s*")[^"]*(")'
+    updated_content, changes = re.subn(
+        cluster_pattern,
+        fr'\1{new_cluster}\2',
+        content
+    )
+    
+    # Se não encontrou o padrão, pode ser que o arquivo não tenha o atributo Cluster
+    # Nesse caso, vamos adicionar o atributo
+    if changes == 0:
+        # Procura pela tag rdf:Description para adicionar o atributo
+        desc_pattern = r'(<rdf:Description[^>]*)'
+        updated_content, changes = re.subn(
+            desc_pattern,
+            fr'\1 crs:Cluster="{new_cluster}"',
+            content
+        )
+    
+    return updated_content, changes
+
+
+def set_group(content, new_group):
+    """
+    Remove todas as tags crs:Group existentes e insere uma nova tag com o formato correto
+    
+    Returns:
+        Tupla (conteúdo atualizado, 1 se o grupo foi inserido ou 0 se não há rdf:Description)
+    """
+    updated_content = content
+    
+    # Remover QUALQUER tag crs:Group existente (independente de formatação)
+    # Primeiro, tentar encontrar todas as possíveis variações de tags de grupo
+    group_patterns = [
+        r'<crs:Group>.*?</crs:Group>',  # Tag completa com qualquer conteúdo
+        r'<crs:Group\s*>.*?</crs:Group\s*>',  # Variação com espaços
+        r'<crs:Group>[^<]*</rdf:li></rdf:Alt></crs:Group>',  # Grupo malformado com texto solto
+        r'[^<]*</rdf:li></rdf:Alt></crs:Group>',  # Apenas fechamento sem abertura
+        r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li[^>]*>.*?</rdf:li>.*?</rdf:Alt>.*?</crs:Group>',  # Grupo bem formado
+    ]
+    
+    # Remover todas as ocorrências de cada padrão
+    for pattern in group_patterns:
+        updated_content = re.sub(pattern, '', updated_content, flags=re.DOTALL)
+    
+    # Limpar linhas em branco ou espaços que possam ter sido deixados
+    updated_content = re.sub(r'\n\s*\n', '\n', updated_content)
+    
+    # Criar uma nova tag Group com o formato correto
+    new_group_xml = f'   <crs:Group>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">{new_group}</rdf:li>\n    </rdf:Alt>\n   </crs:Group>\n'
+    
+    # Inserir a nova tag antes de </rdf:Description>
+    description_end = updated_content.find('</rdf:Description>')
+    if description_end == -1:
+        # Se não encontrar </rdf:Description>, não há como inserir o grupo
+        return content, 0
+    
+    # Encontrar o último elemento antes do fechamento da Description
+    # para posicionar corretamente a nova tag
+    last_tag_end = updated_content.rfind('>', 0, description_end)
+    if last_tag_end != -1:
+        # Inserir a nova tag após o último elemento e antes do fechamento da Description
+        updated_content = updated_content[:last_tag_end+1] + '\n' + new_group_xml + updated_content[last_tag_end+1:]
+    else:
+        # Fallback: inserir antes do fechamento da Description
+        updated_content = updated_content[:description_end] + new_group_xml + updated_content[description_end:]
+    return updated_content, 1
+
+
+def extract_group_for_repair(content, file_path):
+    """
+    Extrai o nome do grupo de um arquivo possivelmente malformado
+    
+    Tenta os padrões conhecidos de tags crs:Group e, se nenhum funcionar,
+    usa o nome da pasta do arquivo.
+    
+    Returns:
+        Nome do grupo ou None
+    """
+    # Padrões para tentar extrair o nome do grupo existente (qualquer formato)
+    extraction_patterns = [
+        # Grupo bem formado
+        r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li xml:lang="x-default">(.*?)</rdf:li>',
+        # Grupo com indentação variada
+        r'<crs:Group>\s*<rdf:Alt>\s*<rdf:li[^>]*>(.*?)</rdf:li>',
+        # Texto solto seguido de fechamentos de tag
+        r'([^<>]+)</rdf:li></rdf:Alt></crs:Group>',
+        # Outro formato possível
+        r'<crs:Group><rdf:Alt><rdf:li xml:lang="x-default">(.*?)</rdf:li></rdf:Alt></crs:Group>'
+    ]
+    
+    # Procurar pelo nome do grupo usando todos os padrões
+    for pattern in extraction_patterns:
+        match = re.search(pattern, content, re.DOTALL)
+        if match:
+            extracted_name = match.group(1).strip()
+            if extracted_name and len(extracted_name) < 100:  # Limite razoável para nome de grupo
+                return extracted_name
+    
+    # Se não encontramos um nome de grupo, usar o nome da pasta como grupo
+    parent_folder = os.path.basename(os.path.dirname(file_path))
+    if parent_folder and parent_folder != "Settings":
+        return parent_folder
+    return None
+
+
+def repair_group_tags(content, group_name):
+    """
+    Recria a tag crs:Group na posição correta da rdf:Description
+    
+    Abordagem de reconstrução completa:
+    1. Separar o arquivo em três partes: início da tag Description, conteúdo e fechamento
+    2. Remover completamente qualquer tag Group existente do conteúdo
+    3. Inserir a nova tag Group logo após as propriedades principais e antes de outras tags
+    
+    Returns:
+        Conteúdo corrigido, ou None se as tags rdf:Description não foram encontradas
+    """
+    # Encontrar a tag Description principal
+    desc_start_match = re.search(r'<rdf:Description rdf:about=""[^>]*>', content)
+    desc_end_match = re.search(r'</rdf:Description>', content)
+    
+    if not (desc_start_match and desc_end_match):
+        return None
+    
+    desc_start_end = desc_start_match.end()
+    desc_end_start = desc_end_match.start()
+    
+    # Pegar o conteúdo entre o início e o fim da Description
+    description_content = content[desc_start_end:desc_end_start]
+    
+    # Remover todas as ocorrências de tags Group existentes
+    removal_patterns = [
+        r'<crs:Group>.*?</crs:Group>',
+        r'<crs:Group\s*>.*?</crs:Group\s*>',
+        r'[^<>]*</rdf:li></rdf:Alt></crs:Group>',
+        r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li[^>]*>.*?</rdf:li>.*?</rdf:Alt>.*?</crs:Group>'
+    ]
+    
+    cleaned_content = description_content
+    for pattern in removal_patterns:
+        cleaned_content = re.sub(pattern, '', cleaned_content, flags=re.DOTALL)
+    
+    # Encontrar um ponto apropriado para inserir a tag Group
+    # Normalmente após as propriedades (atributos) e antes das subtags
+    
+    # Primeiro, procurar o final dos atributos (propriedades com "=")
+    # Eles normalmente têm um formato crs:PropertyName="value"
+    prop_pattern = r'crs:[A-Za-z0-9]+=("[^"]*")'
+    all_props = list(re.finditer(prop_pattern, cleaned_content))
+    
+    # Encontrar a posição da primeira subtag (<crs:Name>, etc.)
+    subtag_match = re.search(r'<crs:', cleaned_content)
+    
+    if all_props and subtag_match:
+        # Inserir após a última propriedade e antes da primeira subtag
+        last_prop_end = all_props[-1].end()
+        first_subtag_start = subtag_match.start()
+        
+        if last_prop_end < first_subtag_start:
+            # Tem espaço entre o último atributo e a primeira subtag - ideal
+            insertion_point = last_prop_end
+        else:
+            # Inserir no início da primeira subtag
+            insertion_point = first_subtag_start
+    elif all_props:
+        # Inserir após a última propriedade
+        insertion_point = all_props[-1].end()
+    elif subtag_match:
+        # Inserir antes da primeira subtag
+        insertion_point = subtag_match.start()
+    else:
+        # Não encontrou propriedades ou subtags - inserir no início
+        insertion_point = 0
+    
+    # Criar a nova tag Group bem formatada
+    new_group_xml = f'\n   <crs:Group>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">{group_name}</rdf:li>\n    </rdf:Alt>\n   </crs:Group>\n'
+    
+    # Reconstituir o arquivo completo
+    fixed_content = (
+        content[:desc_start_end] +  # Início do arquivo até o fim da abertura da tag Description
+        cleaned_content[:insertion_point] +   # Conteúdo da Description até o ponto de inserção
+        new_group_xml +                      # Nova tag Group
+        cleaned_content[insertion_point:] +  # Resto do conteúdo da Description
+        content[desc_end_start:]     # Fechamento da Description até o fim do arquivo
+    )
+    
+    # Limpar linhas em branco ou espaços extras que possam ter sido deixados
+    return re.sub(r'\n\s*\n', '\n', fixed_content)
+
+
+# Extração de metadados com padrões pré-compilados: cada busca é limitada à
+# rdf:Description principal e usa um prefixo literal, então o motor de regex
+# salta direto para os candidatos em vez de tentar casar em cada posição.
+# Os mesmos padrões são compilados para str (conteúdo decodificado) e para
+# bytes (arquivo mapeado em memória no modo de leitura 'mmap').
+
+_DESCRIPTION_CLOSE = '</rdf:Description>'
+_GROUP_OPEN = '<crs:Group>'
+_CLUSTER_ATTR = r'crs:Cluster\s*=\s*"([^"]*)"'
+_GROUP_ATTR = r'crs:Group="([^"]*)"'
+# Valor da tag crs:Group, limitado ao próprio elemento
+_GROUP_VALUE = r'<crs:Group>(?:(?!</crs:Group>).)*?<rdf:li xml:lang="x-default">(.*?)</rdf:li>'
+_GROUP_VALUE_COMPACT = r'<crs:Group><rdf:Alt><rdf:li[^>]*>(.*?)</rdf:li>'
+
+
+def _compile_metadata_patterns(as_bytes):
+    """Retorna (fim da descrição, abertura do grupo, cluster, atributo de grupo, tag de grupo, tag compacta)"""
+    convert = (lambda text: text.encode('ascii')) if as_bytes else (lambda text: text)
+    return (
+        convert(_DESCRIPTION_CLOSE),
+        convert(_GROUP_OPEN),
+        re.compile(convert(_CLUSTER_ATTR)),
+        re.compile(convert(_GROUP_ATTR)),
+        re.compile(convert(_GROUP_VALUE), re.DOTALL),
+        re.compile(convert(_GROUP_VALUE_COMPACT), re.DOTALL),
+    )
+
+
+_TEXT_PATTERNS = _compile_metadata_patterns(as_bytes=False)
+_BYTES_PATTERNS = _compile_metadata_patterns(as_bytes=True)
+
+
+def _find_metadata(content, patterns):
+    """
+    Núcleo de scan_metadata, para str ou para bytes/mmap com os padrões correspondentes
+    
+    Returns:
+        Tupla (cluster ou None, grupo ou None, completo, limite), onde limite é a
+        posição até onde o conteúdo foi examinado
+    """
+    description_close, group_open, cluster_attr, group_attr, group_value, group_value_compact = patterns
+    end = content.find(description_close)
+    limit = end if end != -1 else len(content)
+    
+    cluster = None
+    match = cluster_attr.search(content, 0, limit)
+    if match:
+        cluster = match.group(1)
+    
+    group = None
+    start = content.find(group_open, 0, limit)
+    while start != -1 and group is None:
+        match = group_value.match(content, start) or group_value_compact.match(content, start)
+        if match:
+            group = match.group(1)
+        else:
+            start = content.find(group_open, start + 1, limit)
+    
+    if group is not None and cluster is not None:
+        return cluster, group, True, limit
+    
+    if group is None:
+        match = group_attr.search(content, 0, limit)
+        if match:
+            group = match.group(1)
+    return cluster, group, end != -1, limit
+
+
+def scan_metadata(content):
+    """
+    Localiza crs:Cluster e crs:Group no conteúdo (completo ou inicial) de um arquivo XMP
+    
+    Apenas o trecho até o primeiro </rdf:Description> é considerado, e a tag
+    crs:Group tem prioridade sobre o atributo crs:Group="...".
+    
+    Returns:
+        Tupla (cluster ou None, grupo ou None, completo), onde completo indica que
+        o resultado não depende do restante do arquivo (cluster e tag de grupo
+        encontrados, ou fim da rdf:Description presente no conteúdo)
+    """
+    return _find_metadata(content, _TEXT_PATTERNS)[:3]
+
+
+def _decode_capture(value):
+    """Decodifica um valor capturado em bytes como a leitura em modo texto faria"""
+    if value is None:
+        return None
+    return value.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_metadata_full(file_path):
+    """
+    Lê o arquivo inteiro como texto e localiza cluster e grupo com scan_metadata
+    
+    Returns:
+        Tupla (cluster ou None, grupo ou None, bytes lidos)
+    """
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+        size = os.fstat(f.fileno()).st_size
+    cluster, group, _ = scan_metadata(content)
+    return cluster, group, size
+
+
+def read_metadata_prefix(file_path, chunk_size=PREFIX_CHUNK_SIZE):
+    """
+    Lê apenas o início do arquivo necessário para resolver cluster e grupo
+    
+    O arquivo é lido em modo binário, em blocos de tamanho crescente, e cada bloco é
+    decodificado (UTF-8 com substituição e quebras de linha universais, como na leitura
+    em modo texto) ao ser acrescentado ao conteúdo. A leitura para assim que scan_metadata
+    indica um resultado completo; sem isso o arquivo acaba lido até o fim, com o mesmo
+    resultado de read_metadata_full.
+    
+    Returns:
+        Tupla (cluster ou None, grupo ou None, bytes lidos)
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='replace'), translate=True)
+    content = ''
+    bytes_read = 0
+    
+    with open(file_path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            bytes_read += len(data)
+            content += decoder.decode(data, final=not data)
+            
+            cluster, group, complete = scan_metadata(content)
+            if complete or not data:
+                return cluster, group, bytes_read
+            # Blocos dobrando de tamanho mantêm linear o custo de reanalisar o conteúdo acumulado
+            chunk_size *= 2
+
+
+def read_metadata_mmap(file_path):
+    """
+    Localiza cluster e grupo direto nos bytes do arquivo mapeado em memória
+    
+    Os padrões em bytes são aplicados ao mapeamento sem decodificar o arquivo; só os
+    valores capturados são convertidos para str. Apenas as páginas até o primeiro
+    </rdf:Description> chegam a ser lidas do disco.
+    
+    Returns:
+        Tupla (cluster ou None, grupo ou None, bytes examinados)
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap não aceita arquivos vazios
+            return None, None, 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            cluster, group, _, limit = _find_metadata(mapped, _BYTES_PATTERNS)
+            return _decode_capture(cluster), _decode_capture(group), limit
+
+
+_METADATA_READERS = {
+    'full': read_metadata_full,
+    'prefix': read_metadata_prefix,
+    'mmap': read_metadata_mmap,
+}
+
+
+class PresetRecord:
+    """
+    Preset escaneado: caminho completo, cluster e grupo
+    
+    Registro compacto (sem __dict__) usado em XMPManager.xmp_files e nos modelos da
+    interface. O nome do arquivo e o caminho relativo à pasta escaneada não são
+    guardados em strings próprias: são fatias do caminho, calculadas sob demanda.
+    """
+    __slots__ = ('path', 'cluster', 'group', 'mtime_ns', '_name_start', '_rel_start')
+    
+    def __init__(self, path, name_start, rel_start, cluster='', group='', mtime_ns=0):
+        self.path = path
+        self.cluster = cluster
+        self.group = group
+        self.mtime_ns = mtime_ns  # Data de modificação vista no escaneamento (detecta alterações externas)
+        self._name_start = name_start  # Posição do nome do arquivo em path
+        self._rel_start = rel_start  # Posição do caminho relativo à pasta escaneada em path
+    
+    @property
+    def filename(self):
+        return self.path[self._name_start:]
+    
+    @property
+    def rel_path(self):
+        return self.path[self._rel_start:]
+    
+    @property
+    def display_name(self):
+        """Nome exibido: caminho relativo (igual ao nome do arquivo na pasta raiz)"""
+        return self.path[self._rel_start:]
+    
+    def __repr__(self):
+        return f"PresetRecord({self.path!r}, cluster={self.cluster!r}, group={self.group!r})"
+
+
+class PlannedEdit:
+    """Mudança planejada para um preset (ver XMPManager.plan_edits)"""
+    __slots__ = ('path', 'cluster', 'group', 'old_cluster', 'old_group', 'new_cluster', 'new_group',
+                 'repair', 'changed', 'bytes', 'mtime_ns', 'error')
+    
+    def __init__(self, path, cluster, group):
+        self.path = path
+        self.cluster = cluster  # Cluster a aplicar (None = não alterar)
+        self.group = group  # Grupo a aplicar (None = não alterar)
+        self.old_cluster = self.new_cluster = ""
+        self.old_group = self.new_group = ""
+        self.repair = False  # As tags de grupo precisam de correção
+        self.changed = False  # O conteúdo do arquivo muda (caso contrário ele não é gravado)
+        self.bytes = 0  # Tamanho estimado do arquivo gravado
+        self.mtime_ns = 0  # Data de modificação lida no planejamento
+        self.error = None
+    
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+    
+    def __repr__(self):
+        return (f"PlannedEdit({self.path!r}, {self.old_cluster!r}->{self.new_cluster!r}, "
+                f"{self.old_group!r}->{self.new_group!r}, changed={self.changed})")
+
+
+class EditPlan:
+    """Conjunto de mudanças calculado por XMPManager.plan_edits, sem nada gravado ainda"""
+    
+    VERSION = 1
+    
+    def __init__(self, entries, repair_groups):
+        self.entries = entries
+        self.repair_groups = repair_groups
+    
+    def save(self, path):
+        """Grava o plano em um arquivo JSON, para revisá-lo e executá-lo depois (ver load)"""
+        content = json.dumps({'plan': self.VERSION, 'created': time.time(), 'repair_groups': self.repair_groups,
+                              'entries': [entry.as_dict() for entry in self.entries]}, ensure_ascii=False, indent=2)
+        with AtomicWriter(fsync=False) as writer:
+            writer.write_text(path, content)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        Carrega um plano gravado por save
+        
+        Raises:
+            OSError: o arquivo não pode ser lido
+            ValueError: o arquivo não é um plano válido
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or data.get('plan') != cls.VERSION:
+            raise ValueError(f"not an edit plan: {path}")
+        entries = []
+        try:
+            for fields in data['entries']:
+                entry = PlannedEdit(fields['path'], fields['cluster'], fields['group'])
+                for field in PlannedEdit.__slots__:
+                    setattr(entry, field, fields[field])
+                entries.append(entry)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"invalid edit plan {path}: {str(e)}")
+        return cls(entries, data.get('repair_groups', True))
+    
+    def changes(self):
+        """Entradas cujos arquivos seriam gravados"""
+        return [entry for entry in self.entries if entry.changed and entry.error is None]
+    
+    def summary(self):
+        changes = self.changes()
+        return {
+            'files': len(self.entries),
+            'changed': len(changes),
+            'unchanged': sum(1 for entry in self.entries if not entry.changed and entry.error is None),
+            'errors': sum(1 for entry in self.entries if entry.error is not None),
+            'cluster_changes': sum(1 for entry in changes if entry.new_cluster != entry.old_cluster),
+            'group_changes': sum(1 for entry in changes if entry.new_group != entry.old_group),
+            'group_repairs': sum(1 for entry in changes if entry.repair),
+            'bytes': sum(entry.bytes for entry in changes),
+        }
+
 
 class XMPManager:
     """Class to handle XMP file operations for Adobe Lightroom presets"""
     
-    def __init__(self):
+    def __init__(self, index_path=None, read_mode='prefix', fsync=True, snapshot_dir=None):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read mode: {read_mode}")
+        self.read_mode = read_mode
+        # Gravações sincronizadas com o disco antes de substituir o arquivo (ver AtomicWriter)
+        self.fsync = fsync
         self.xmp_files = []
+        self.ids_by_path = {}  # Caminho -> id do preset (posição em xmp_files), reconstruído a cada escaneamento
+        self.catalog = CatalogIndex()  # Vocabulário e índices invertidos cluster/grupo/pasta -> ids
+        self.search_index = PresetSearchIndex()  # Busca da barra de filtro, atualizada sob demanda
+        # Último escaneamento, usado pelas atualizações incrementais (refresh_folders/refresh_paths)
+        self.root_folder = None
+        self.recursive = True
+        self.scanned_folders = set()
+        # Índice persistente de metadados (opcional); sem ele todo escaneamento relê todos os arquivos
+        self.index = None
+        if index_path:
+            try:
+                self.index = XMPIndex(index_path)
+            except Exception as e:
+                print(f"Metadata index unavailable ({index_path}): {str(e)}")
+        # Conteúdo original dos arquivos modificados por cada atualização, para undo (opcional)
+        self.snapshots = None
+        if snapshot_dir:
+            try:
+                self.snapshots = SnapshotStore(snapshot_dir)
+            except Exception as e:
+                print(f"Undo snapshots unavailable ({snapshot_dir}): {str(e)}")
     
-    def scan_xmp_files(self, folder_path, recursive=True):
+    def scan_xmp_files(self, folder_path, recursive=True, force_rebuild=False, mode='serial', workers=None):
         """
         Scan for XMP files in the specified folder
         
         Args:
             folder_path: Path to the folder to scan
             recursive: If True, scan subdirectories recursively
+            force_rebuild: If True, ignore the metadata index and re-read every file
+            mode: 'serial', 'thread' (I/O bound, e.g. network shares) or 'process' (CPU bound parsing)
+            workers: Number of parallel workers for 'thread'/'process' (None = pool default)
         
         Returns:
-            List of dictionaries with XMP file information
+            List of PresetRecord with XMP file information
+        """
+        for _ in self.iter_xmp_files(folder_path, recursive, force_rebuild, mode, workers):
+            pass
+        
+        print(f"Processed {len(self.xmp_files)} XMP files in total")
+        return self.xmp_files
+    
+    def iter_xmp_files(self, folder_path, recursive=True, force_rebuild=False, mode='serial', workers=None,
+                       batch_size=64):
         """
-        result = []
+        Versão incremental de scan_xmp_files: produz cada arquivo assim que seus metadados são lidos
+        
+        Os arquivos são produzidos na mesma ordem de scan_xmp_files e acumulados em self.xmp_files.
+        Fechar o gerador (ou simplesmente parar de consumi-lo) cancela o escaneamento; nesse caso
+        self.xmp_files contém apenas os arquivos produzidos até ali.
+        
+        Args:
+            folder_path: Pasta a ser escaneada
+            recursive: Se True, escaneia as subpastas
+            force_rebuild: Se True, ignora o índice de metadados e relê todos os arquivos
+            mode: 'serial', 'thread' ou 'process'
+            workers: Número de workers do pool (None = padrão do pool)
+            batch_size: Número de arquivos enviados de uma vez para cada worker do pool
+        
+        Yields:
+            PresetRecord de cada arquivo XMP
+        """
+        if mode not in SCAN_MODES:
+            raise ValueError(f"Unknown scan mode: {mode}")
+        
+        self.xmp_files = []
+        self.ids_by_path = {}
+        self.catalog.clear()
+        self.root_folder = folder_path
+        self.recursive = recursive
+        self.scanned_folders = set()
+        
+        # Entradas já conhecidas pelo índice e entradas novas/modificadas a gravar
+        cached = {}
+        pending = []
+        use_index = self.index is not None
+        if use_index:
+            if force_rebuild:
+                print(f"Rebuilding metadata index for {folder_path}")
+                self.index.clear(folder_path)
+            else:
+                cached = self.index.load_folder(folder_path)
+        
+        def finish(file_info, scan_result):
+            cluster, group, key, error = scan_result
+            if error is not None:
+                # Still add the file with empty metadata
+                print(f"Error extracting metadata from {file_info.filename}: {error}")
+            elif use_index:
+                cached_entry = cached.get(file_info.path)
+                if cached_entry is None or cached_entry[:3] != key:
+                    pending.append((file_info.path, *key, cluster, group))
+            
+            file_info.cluster = cluster
+            file_info.group = group
+            file_info.mtime_ns = key[0] if key is not None else 0
+            self._add_record(file_info)
+            return file_info
+        
+        batches = self._iter_file_batches(folder_path, recursive, batch_size)
+        executor = None
+        completed = False
         
         try:
-            if recursive:
-                # Walk through all subdirectories
-                print(f"Starting recursive scan in {folder_path}")
-                for root, dirs, files in os.walk(folder_path):
-                    rel_path = os.path.relpath(root, folder_path) if root != folder_path else ""
-                    if rel_path:
-                        print(f"Scanning subdirectory: {rel_path}")
-                    
-                    xmp_files = [f for f in files if f.lower().endswith('.xmp')]
-                    if xmp_files:
-                        print(f"Found {len(xmp_files)} XMP files in {root}")
-                    
-                    for file in xmp_files:
-                        file_path = os.path.join(root, file)
-                        rel_file_path = os.path.relpath(file_path, folder_path)
-                        
-                        try:
-                            cluster, group = self.extract_metadata(file_path)
-                            
-                            # For display purposes, include relative path if in subdirectory
-                            display_name = rel_file_path if rel_path else file
-                            
-                            result.append({
-                                'filename': file,
-                                'display_name': display_name,
-                                'path': file_path,
-                                'rel_path': rel_file_path,
-                                'cluster': cluster,
-                                'group': group
-                            })
-                        except Exception as e:
-                            print(f"Error extracting metadata from {file}: {str(e)}")
-                            # Still add the file with empty metadata
-                            result.append({
-                                'filename': file,
-                                'display_name': rel_file_path if rel_path else file,
-                                'path': file_path,
-                                'rel_path': rel_file_path,
-                                'cluster': '(error)',
-                                'group': '(error)'
-                            })
+            if mode != 'serial':
+                try:
+                    # Importado só aqui: concurrent.futures traz logging e multiprocessing,
+                    # que pesam no tempo de inicialização e não são usados no modo serial
+                    if mode == 'thread':
+                        from concurrent.futures import ThreadPoolExecutor
+                        executor = ThreadPoolExecutor(max_workers=workers)
+                    else:
+                        from concurrent.futures import ProcessPoolExecutor
+                        executor = ProcessPoolExecutor(max_workers=workers)
+                    print(f"Extracting metadata with {mode} pool ({workers or 'default'} workers)")
+                except Exception as e:
+                    print(f"Parallel scan unavailable ({str(e)}), falling back to serial scan")
+            
+            if executor is None:
+                for batch in batches:
+                    for file_info in batch:
+                        task = (file_info.path, cached.get(file_info.path), use_index, self.read_mode)
+                        yield finish(file_info, _scan_file_task(task))
             else:
-                # Only scan the specified folder without recursion (original behavior)
-                files = os.listdir(folder_path)
-                print(f"Found {len(files)} files in directory (non-recursive)")
+                # Janela limitada de lotes em andamento: mantém a ordem e evita ler a árvore
+                # inteira antes de produzir os primeiros resultados
+                max_in_flight = (workers or os.cpu_count() or 1) * 2
+                in_flight = deque()
                 
-                for file in files:
-                    if file.lower().endswith('.xmp'):
-                        file_path = os.path.join(folder_path, file)
-                        
-                        try:
-                            cluster, group = self.extract_metadata(file_path)
-                            result.append({
-                                'filename': file,
-                                'display_name': file,
-                                'path': file_path,
-                                'rel_path': file,
-                                'cluster': cluster,
-                                'group': group
-                            })
-                        except Exception as e:
-                            print(f"Error extracting metadata from {file}: {str(e)}")
-                            # Still add the file with empty metadata
-                            result.append({
-                                'filename': file,
-                                'display_name': file,
-                                'path': file_path,
-                                'rel_path': file,
-                                'cluster': '(error)',
-                                'group': '(error)'
-                            })
+                for batch in batches:
+                    tasks = [(file_info.path, cached.get(file_info.path), use_index, self.read_mode)
+                             for file_info in batch]
+                    in_flight.append((batch, tasks, executor.submit(_scan_batch_task, tasks)))
+                    
+                    if len(in_flight) >= max_in_flight:
+                        for file_info, scan_result in self._collect_batch(*in_flight.popleft()):
+                            yield finish(file_info, scan_result)
+                
+                while in_flight:
+                    for file_info, scan_result in self._collect_batch(*in_flight.popleft()):
+                        yield finish(file_info, scan_result)
+            
+            completed = True
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            
+            if use_index:
+                # Só é seguro remover entradas obsoletas quando a árvore inteira foi percorrida
+                seen_paths = None
+                if recursive and completed:
+                    seen_paths = {file_info.path for file_info in self.xmp_files}
+                self.index.update_folder(folder_path, pending, seen_paths)
+                print(f"Metadata index: {len(self.xmp_files) - len(pending)} files reused, {len(pending)} files parsed")
+    
+    def _iter_file_batches(self, folder_path, recursive, batch_size):
+        """Percorre a pasta produzindo lotes de PresetRecord, com os campos de metadados ainda vazios"""
+        # Os caminhos produzidos começam com folder_path, então o caminho relativo
+        # de todos os arquivos começa na mesma posição
+        rel_start = len(os.path.join(folder_path, ''))
+        if recursive:
+            # Walk through all subdirectories
+            print(f"Starting recursive scan in {folder_path}")
+            for root, dirs, files in os.walk(folder_path):
+                self.scanned_folders.add(root)
+                rel_path = os.path.relpath(root, folder_path) if root != folder_path else ""
+                if rel_path:
+                    print(f"Scanning subdirectory: {rel_path}")
+                
+                xmp_files = [f for f in files if f.lower().endswith('.xmp')]
+                if xmp_files:
+                    print(f"Found {len(xmp_files)} XMP files in {root}")
+                
+                batch = []
+                for file in xmp_files:
+                    file_path = os.path.join(root, file)
+                    batch.append(PresetRecord(file_path, len(file_path) - len(file), rel_start))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+                
+                if batch:
+                    yield batch
+        else:
+            # Only scan the specified folder without recursion (original behavior)
+            try:
+                files = os.listdir(folder_path)
+            except Exception as e:
+                print(f"Error scanning folder {folder_path}: {str(e)}")
+                return
+            print(f"Found {len(files)} files in directory (non-recursive)")
+            self.scanned_folders.add(folder_path)
+            
+            batch = []
+            for file in files:
+                if file.lower().endswith('.xmp'):
+                    batch.append(PresetRecord(os.path.join(folder_path, file), rel_start, rel_start))
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+            
+            if batch:
+                yield batch
+    
+    def _collect_batch(self, batch, tasks, future):
+        """Retorna os pares (file_info, resultado) de um lote enviado ao pool"""
+        try:
+            results = future.result()
         except Exception as e:
-            print(f"Error scanning folder {folder_path}: {str(e)}")
+            # Pool quebrado (ex.: processo filho encerrado): processar o lote aqui mesmo
+            print(f"Parallel scan batch failed ({str(e)}), processing it serially")
+            results = _scan_batch_task(tasks)
+        return zip(batch, results)
+    
+    def _add_record(self, file_info):
+        """Acrescenta um preset a xmp_files e aos índices em memória"""
+        preset_id = len(self.xmp_files)
+        self.xmp_files.append(file_info)
+        self.ids_by_path[file_info.path] = preset_id
+        # Internar cluster/grupo no vocabulário e indexar o preset
+        self.catalog.add(preset_id, file_info)
+    
+    def refresh_folders(self, folders, recursive=False):
+        """
+        Atualiza o catálogo com as mudanças em disco de algumas pastas, sem reescanear a biblioteca
         
-        print(f"Processed {len(result)} XMP files in total")
-        self.xmp_files = result
-        return result
+        Arquivos novos e modificados (data de modificação diferente da vista no
+        escaneamento) são lidos; arquivos que sumiram são removidos. Subpastas que não
+        existiam no escaneamento são percorridas por inteiro.
+        
+        Args:
+            folders: Pastas a verificar (normalmente as notificadas pelo sistema de arquivos)
+            recursive: Se True, verifica também todas as subpastas já conhecidas
+        
+        Returns:
+            Dicionário de mudanças (ver _refresh)
+        """
+        on_disk = {}
+        known = set()
+        new_folders = []
+        for folder in folders:
+            if self.root_folder is None:
+                break
+            if not os.path.isdir(folder):
+                continue
+            known.update(record.path for record in self.files_in_folder(folder, recursive))
+            self._list_folder(folder, recursive, on_disk, new_folders)
+        
+        # Subpastas removidas ou renomeadas: tudo o que havia nelas sai do catálogo
+        for folder in [scanned for scanned in self.scanned_folders if not os.path.isdir(scanned)]:
+            if folder in self.scanned_folders:
+                prefix = os.path.join(folder, '')
+                known.update(record.path for record in self.files_in_folder(folder))
+                self.scanned_folders = {scanned for scanned in self.scanned_folders
+                                        if scanned != folder and not scanned.startswith(prefix)}
+        
+        changes = self._refresh(on_disk, known)
+        changes['folders'] = new_folders
+        return changes
+    
+    def refresh_paths(self, file_paths):
+        """
+        Atualiza o catálogo com o estado em disco de arquivos específicos (ex.: após uma gravação)
+        
+        Returns:
+            Dicionário de mudanças (ver _refresh)
+        """
+        on_disk = {}
+        for file_path in file_paths:
+            try:
+                on_disk[file_path] = XMPIndex.stat_key(os.stat(file_path))
+            except OSError:
+                pass
+        known = {file_path for file_path in file_paths if file_path in self.ids_by_path}
+        changes = self._refresh(on_disk, known)
+        changes['folders'] = []
+        return changes
     
-    def extract_metadata(self, file_path):
-        """Extract cluster and group information from an XMP file"""
+    def _list_folder(self, folder, recursive, on_disk, new_folders):
+        """Coleta os arquivos XMP de uma pasta (caminho -> chave) e percorre as subpastas novas"""
+        try:
+            entries = list(os.scandir(folder))
+        except OSError as e:
+            print(f"Error scanning folder {folder}: {str(e)}")
+            return
+        
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    # os.walk, usado no escaneamento, também não entra em links simbólicos
+                    if not self.recursive or entry.is_symlink():
+                        continue
+                    if entry.path not in self.scanned_folders:
+                        self.scanned_folders.add(entry.path)
+                        new_folders.append(entry.path)
+                        self._list_folder(entry.path, True, on_disk, new_folders)
+                    elif recursive:
+                        self._list_folder(entry.path, True, on_disk, new_folders)
+                elif entry.name.lower().endswith('.xmp'):
+                    on_disk[entry.path] = XMPIndex.stat_key(entry.stat())
+            except OSError as e:
+                print(f"Error reading {entry.path}: {str(e)}")
+    
+    def _refresh(self, on_disk, known):
+        """
+        Aplica ao catálogo o estado em disco de uma parte da biblioteca
+        
+        Args:
+            on_disk: Caminho -> chave (mtime_ns, tamanho, inode) dos arquivos XMP presentes nessa parte
+            known: Caminhos já catalogados nessa parte
+        
+        Returns:
+            Dicionário com removed (ids anteriores dos presets removidos, em ordem crescente),
+            modified (ids atuais dos presets relidos) e added (PresetRecord acrescentados
+            ao final de xmp_files)
+        """
+        removed = sorted(self.ids_by_path[path] for path in known if path not in on_disk)
+        stale = [path for path, key in on_disk.items()
+                 if path not in self.ids_by_path or self.xmp_files[self.ids_by_path[path]].mtime_ns != key[0]]
+        
+        # Leitura antes de qualquer alteração nos índices
+        results = {path: _scan_file_task((path, None, False, self.read_mode)) for path in stale}
+        
+        if removed:
+            self._remove_ids(removed)
+        
+        modified = []
+        added = []
+        pending = []
+        rel_start = len(os.path.join(self.root_folder, '')) if self.root_folder else 0
+        for path in sorted(results):
+            cluster, group, key, error = results[path]
+            if error is not None:
+                print(f"Error extracting metadata from {os.path.basename(path)}: {error}")
+            elif self.index is not None:
+                pending.append((path, *key, cluster, group))
+            
+            mtime_ns = key[0] if key is not None else 0
+            preset_id = self.ids_by_path.get(path)
+            if preset_id is None:
+                record = PresetRecord(path, len(path) - len(os.path.basename(path)), rel_start,
+                                      cluster, group, mtime_ns)
+                self._add_record(record)
+                added.append(record)
+            else:
+                record = self.xmp_files[preset_id]
+                self.catalog.update(preset_id, record, cluster, group)
+                record.mtime_ns = mtime_ns
+                modified.append(preset_id)
+        
+        if self.index is not None:
+            self.index.update_folder(self.root_folder, pending)
+            self.index.remove_paths([path for path in known if path not in on_disk])
+        
+        if removed or modified or added:
+            print(f"Catalog refreshed: {len(added)} added, {len(removed)} removed, {len(modified)} modified")
+        return {'removed': removed, 'modified': sorted(modified), 'added': added}
+    
+    def _remove_ids(self, preset_ids):
+        """Remove presets de xmp_files; os ids dos presets seguintes são renumerados"""
+        removed = set(preset_ids)
+        # Lista nova (não alterada no lugar), como em um escaneamento: o índice de busca é refeito
+        self.xmp_files = [record for preset_id, record in enumerate(self.xmp_files) if preset_id not in removed]
+        self.ids_by_path = {}
+        self.catalog.clear()
+        for preset_id, record in enumerate(self.xmp_files):
+            self.ids_by_path[record.path] = preset_id
+            self.catalog.add(preset_id, record)
+    
+    def get_file_info(self, file_path):
+        """Retorna as informações de um arquivo escaneado (ou None) sem percorrer xmp_files"""
+        preset_id = self.ids_by_path.get(file_path)
+        return self.xmp_files[preset_id] if preset_id is not None else None
+    
+    def files_with_cluster(self, cluster):
+        """Presets com o cluster informado ('' = sem cluster), na ordem do escaneamento"""
+        return [self.xmp_files[i] for i in self.catalog.ids_with_cluster(cluster)]
+    
+    def files_with_group(self, group):
+        """Presets com o grupo informado ('' = sem grupo), na ordem do escaneamento"""
+        return [self.xmp_files[i] for i in self.catalog.ids_with_group(group)]
+    
+    def files_in_folder(self, folder, recursive=True):
+        """Presets de uma pasta (e, se recursive, das subpastas), na ordem do escaneamento"""
+        return [self.xmp_files[i] for i in self.catalog.ids_in_folder(folder, recursive)]
+    
+    def search_presets(self, query, mode='contains', fields=SEARCH_FIELDS):
+        """
+        Busca presets por nome, cluster, grupo e/ou pasta (ver PresetSearchIndex.search)
+        
+        Returns:
+            Ids (posições em xmp_files) dos presets encontrados, na ordem do escaneamento
+        """
+        self.search_index.sync(self.xmp_files)
+        return self.search_index.search(query, self.catalog, mode, fields)
+    
+    def extract_metadata(self, file_path, read_mode=None):
+        """
+        Extract cluster and group information from an XMP file
+        
+        Args:
+            file_path: Caminho do arquivo XMP
+            read_mode: Um de READ_MODES (None = self.read_mode)
+        """
         cluster = ""
         group = ""
+        reader = _METADATA_READERS[read_mode or self.read_mode]
         
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-                
-                # Extract cluster
-                cluster_match = re.search(r'crs:Cluster\s*=\s*"([^"]*)"', content)
-                if cluster_match:
-                    cluster = cluster_match.group(1)
-                
-                # Extract group - try different patterns that might exist in XMP files
-                group_patterns = [
-                    r'<crs:Group>.*?<rdf:li xml:lang="x-default">(.*?)</rdf:li>',
-                    r'<crs:Group><rdf:Alt><rdf:li.*?>(.*?)</rdf:li>',
-                    r'crs:Group="([^"]*)"'
-                ]
-                
-                for pattern in group_patterns:
-                    group_match = re.search(pattern, content, re.DOTALL)
-                    if group_match:
-                        group = group_match.group(1)
-                        break
-        except UnicodeDecodeError:
-            print(f"Unicode decode error in {file_path}, trying alternative encoding")
-            try:
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    content = f.read()
-                    cluster_match = re.search(r'crs:Cluster\s*=\s*"([^"]*)"', content)
-                    if cluster_match:
-                        cluster = cluster_match.group(1)
-            except Exception as e:
-                print(f"Failed with alternative encoding: {str(e)}")
+            found_cluster, found_group, _ = reader(file_path)
+            cluster = found_cluster or ""
+            group = found_group or ""
         except Exception as e:
             print(f"Error reading file {file_path}: {str(e)}")
         
         return cluster, group
     
-    def update_cluster(self, file_paths, new_cluster):
+    def apply_edits(self, file_paths, cluster=None, group=None, repair_groups=False):
         """
-        Atualiza o valor do cluster nos arquivos XMP especificados.
-        Também aplica a correção nas tags de grupo para garantir que o arquivo fique consistente.
+        Aplica um conjunto de edições a cada arquivo com uma leitura e uma gravação
+        
+        As edições são aplicadas em memória, nesta ordem: correção das tags de grupo,
+        cluster, grupo e, se um novo grupo foi definido, uma última correção das tags.
+        
+        Args:
+            file_paths: Lista de caminhos dos arquivos
+            cluster: Novo cluster (None = não alterar)
+            group: Novo grupo (None = não alterar)
+            repair_groups: Se True, corrige tags crs:Group malformadas
+            
+        Returns:
+            Lista de dicionários por arquivo com as chaves path, repaired, cluster,
+            group (edições aplicadas), written, unchanged (as edições não alteraram o
+            conteúdo, então o arquivo não foi regravado), error, new_cluster e new_group
+            (valores gravados no arquivo, ou None se ele não foi gravado) e id (id do
+            preset, ou None se o arquivo não foi escaneado)
         """
-        count = 0
+        snapshot = self._begin_snapshot([cluster], [group], repair_groups)
+        # Um writer por lote: as pastas são sincronizadas com o disco uma vez por lote, não por arquivo
+        with AtomicWriter(fsync=self.fsync) as writer:
+            results = [self._apply_edits_to_file(file_path, cluster, group, repair_groups, writer, snapshot)
+                       for file_path in file_paths]
+        if snapshot is not None:
+            snapshot.commit()
         
-        for file_path in file_paths:
+        changed = sum(1 for result in results if result['written'])
+        unchanged = sum(1 for result in results if result['unchanged'])
+        if unchanged:
+            print(f"{changed} files changed, {unchanged} files already up to date (not rewritten)")
+        
+        self._index_written(results)
+        return results
+    
+    def _index_written(self, results):
+        """Grava no índice de metadados os valores dos arquivos gravados (resultados de apply_edits)"""
+        if self.index is None:
+            return
+        # Os valores gravados já são conhecidos: o próximo escaneamento não precisa reler esses arquivos
+        entries = []
+        for result in results:
+            if result['written']:
+                try:
+                    key = XMPIndex.stat_key(os.stat(result['path']))
+                except OSError:
+                    continue
+                entries.append((result['path'], *key, result['new_cluster'], result['new_group']))
+        if entries:
+            self.index.update_folder(self.root_folder, entries)
+    
+    @staticmethod
+    def _new_result(file_path, preset_id):
+        return {'path': file_path, 'repaired': False, 'cluster': False, 'group': False,
+                'written': False, 'unchanged': False, 'error': None, 'new_cluster': None, 'new_group': None,
+                'id': preset_id}
+    
+    def _apply_edits_to_file(self, file_path, cluster, group, repair_groups, writer=None, snapshot=None):
+        result = self._new_result(file_path, self.ids_by_path.get(file_path))
+        name = os.path.basename(file_path)
+        try:
+            data, original = self._read_for_edit(file_path, repair_groups)
+            content, result['repaired'], result['cluster'], result['group'] = self._edit_content(
+                original, file_path, cluster, group, repair_groups)
+            
+            if content == original:
+                # Nada mudou: não regravar, preservando a data de modificação do preset
+                # (o Lightroom e as ferramentas de sincronização reimportariam o arquivo)
+                result['unchanged'] = result['repaired'] or result['cluster'] or result['group']
+            elif result['repaired'] or result['cluster'] or result['group']:
+                digest = self.snapshots.put(data) if snapshot is not None else None
+                written = self._write_file(file_path, content, writer)
+                result['written'] = True
+                if snapshot is not None:
+                    snapshot.add(file_path, digest, written)
+                result['new_cluster'], result['new_group'] = self._reindex_file(file_path, content)
+                if result['cluster']:
+                    print(f"Cluster atualizado em {name}")
+                if result['group']:
+                    print(f"Grupo atualizado com sucesso em {name}")
+        except Exception as e:
+            result['error'] = str(e)
+            print(f"Error updating {file_path}: {str(e)}")
+        
+        return result
+    
+    @staticmethod
+    def _read_for_edit(file_path, repair_groups):
+        """Retorna os bytes do arquivo e o texto decodificado como pelo modo texto de open()"""
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        # A correção das tags lê com substituição de caracteres inválidos, como antes
+        errors = 'replace' if repair_groups else 'strict'
+        return data, io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors=errors).read()
+    
+    def _begin_snapshot(self, clusters, groups, repair_groups):
+        """Inicia o snapshot de uma atualização (None sem SnapshotStore), descrita pelos valores aplicados"""
+        if self.snapshots is None:
+            return None
+        parts = []
+        for label, values in (("cluster", clusters), ("group", groups)):
+            values = {value for value in values if value is not None}
+            if len(values) == 1:
+                parts.append(f"Set {label} '{values.pop()}'")
+            elif values:
+                parts.append(f"Set {label} ({len(values)} values)")
+        if not parts and repair_groups:
+            parts.append("Repair group tags")
+        return self.snapshots.begin(", ".join(parts) or "Update presets")
+    
+    def _edit_content(self, content, file_path, cluster, group, repair_groups, verbose=True):
+        """
+        Aplica as edições de apply_edits ao conteúdo, em memória
+        
+        Returns:
+            Tupla (conteúdo editado, tags de grupo corrigidas, cluster definido, grupo definido)
+        """
+        repaired = cluster_set = group_set = False
+        if repair_groups:
+            content, repaired = self._repair_content(content, file_path, verbose)
+        
+        if cluster is not None:
+            content, changes = set_cluster(content, cluster)
+            cluster_set = changes > 0
+        
+        if group is not None:
+            content, changes = set_group(content, group)
+            group_set = changes > 0
+            if not changes:
+                if verbose:
+                    print(f"Não foi possível encontrar tag de fechamento rdf:Description em {file_path}")
+            elif repair_groups:
+                content, repaired_again = self._repair_content(content, file_path, verbose)
+                repaired = repaired or repaired_again
+        
+        return content, repaired, cluster_set, group_set
+    
+    def plan_edits(self, targets, repair_groups=False):
+        """
+        Calcula as mudanças de uma edição em lote sem gravar nada (dry run)
+        
+        Cada arquivo é lido e editado em memória exatamente como em apply_edits, e o
+        plano guarda só o resumo: valores atuais e resultantes, se as tags de grupo
+        precisam de correção e quantos bytes seriam gravados.
+        
+        Args:
+            targets: Tuplas (file_path, cluster, grupo), com None para o que não muda; ver
+                     também smart_detection_targets
+            repair_groups: Se True, corrige tags crs:Group malformadas
+        
+        Returns:
+            EditPlan, executável com execute_plan
+        """
+        entries = []
+        for file_path, cluster, group in targets:
+            entry = PlannedEdit(file_path, cluster, group)
             try:
-                # Primeiro corrige as tags Group para garantir consistência
-                self.fix_malformed_group_tags([file_path])
+                entry.mtime_ns = os.stat(file_path).st_mtime_ns
+                content = self._read_for_edit(file_path, repair_groups)[1]
+                old_cluster, old_group, _ = scan_metadata(content)
+                entry.old_cluster = entry.new_cluster = old_cluster or ""
+                entry.old_group = entry.new_group = old_group or ""
                 
-                # Lê o conteúdo do arquivo corrigido
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Atualiza o valor do cluster
-                # Procura pelo padrão crs:Cluster="valor_anterior"
-                cluster_pattern = r'(crs:Cluster\s*=\s*")[^"]*(")'
-                updated_content, changes = re.subn(
-                    cluster_pattern,
-                    fr'\1{new_cluster}\2',
-                    content
-                )
-                
-                # Se não encontrou o padrão, pode ser que o arquivo não tenha o atributo Cluster
-                # Nesse caso, vamos adicionar o atributo
-                if changes == 0:
-                    # Procura pela tag rdf:Description para adicionar o atributo
-                    desc_pattern = r'(<rdf:Description[^>]*)'
-                    updated_content, changes = re.subn(
-                        desc_pattern,
-                        fr'\1 crs:Cluster="{new_cluster}"',
-                        content
-                    )
-                
-                if changes > 0:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(updated_content)
-                    count += 1
-                    print(f"Cluster atualizado em {os.path.basename(file_path)}")
+                if repair_groups:
+                    entry.repair = self._repair_content(content, file_path, verbose=False)[0] != content
+                edited = self._edit_content(content, file_path, cluster, group, repair_groups, verbose=False)[0]
+                if edited != content:
+                    entry.changed = True
+                    entry.bytes = len(edited.encode('utf-8'))
+                    new_cluster, new_group, _ = scan_metadata(edited)
+                    entry.new_cluster = new_cluster or ""
+                    entry.new_group = new_group or ""
+            except Exception as e:
+                entry.error = str(e)
+            entries.append(entry)
+        return EditPlan(entries, repair_groups)
+    
+    def smart_detection_targets(self, base_folder, file_paths=None):
+        """
+        Alvos de plan_edits com os valores sugeridos pela estrutura de pastas (ver auto_discover_metadata)
+        
+        Args:
+            base_folder: Pasta base para cálculo dos caminhos relativos
+            file_paths: Arquivos considerados (padrão: todos os arquivos escaneados)
+        
+        Returns:
+            Lista de tuplas (file_path, cluster ou None, grupo ou None), só com os arquivos
+            que têm alguma sugestão diferente do valor atual
+        """
+        selected = set(file_paths) if file_paths is not None else None
+        targets = []
+        for discovery in self.auto_discover_metadata(base_folder):
+            if selected is not None and discovery['path'] not in selected:
+                continue
+            cluster = discovery['suggested_cluster'] if discovery['needs_cluster_update'] else None
+            group = discovery['suggested_group'] if discovery['needs_group_update'] else None
+            if cluster is not None or group is not None:
+                targets.append((discovery['path'], cluster, group))
+        return targets
+    
+    def execute_plan(self, plan, journal_path=None, workers=None, progress=None, is_canceled=None):
+        """
+        Grava as mudanças de um plano de plan_edits com execute_batch
+        
+        Só os arquivos que mudam são gravados. Um arquivo modificado depois do planejamento
+        não é gravado (o plano pode não valer mais para ele) e aparece com erro no resultado.
+        Os demais argumentos são os de execute_batch.
+        
+        Returns:
+            Resultados no formato de apply_edits, na ordem do plano: os arquivos que não
+            mudam aparecem como 'unchanged' e os que falharam no planejamento com o erro
+        """
+        results = {}
+        targets = []
+        for entry in plan.entries:
+            if entry.error is not None:
+                error = entry.error
+            elif not entry.changed:
+                error = None
+            else:
+                try:
+                    modified = os.stat(entry.path).st_mtime_ns != entry.mtime_ns
+                except OSError as e:
+                    error = str(e)
+                else:
+                    error = "file was modified after the plan was made" if modified else None
+                if error is None:
+                    targets.append((entry.path, entry.cluster, entry.group))
+                    continue
+                print(f"Skipping {entry.path}: {error}")
+            result = self._new_result(entry.path, self.ids_by_path.get(entry.path))
+            result['error'] = error
+            result['unchanged'] = error is None
+            results[entry.path] = result
+        
+        for result in self.execute_batch(targets, plan.repair_groups, journal_path, workers, progress, is_canceled):
+            results[result['path']] = result
+        # Arquivos não processados (lote cancelado) ficam de fora
+        return [results[entry.path] for entry in plan.entries if entry.path in results]
+    
+    def execute_batch(self, targets, repair_groups=True, journal_path=None, workers=None,
+                      progress=None, is_canceled=None):
+        """
+        Aplica uma lista de edições com um pool de threads
+        
+        Cada arquivo é editado como em apply_edits (uma leitura e uma gravação atômica).
+        Com journal_path, o lote é registrado em um WriteJournal: o estado de cada arquivo
+        e os bytes originais dos arquivos gravados. Se o lote for interrompido, o diário
+        fica em disco para resume_batch ou rollback_batch; se terminar, ele é apagado.
+        
+        Args:
+            targets: Tuplas (file_path, cluster, grupo), com None para o que não muda
+            repair_groups: Se True, corrige tags crs:Group malformadas
+            journal_path: Arquivo do diário do lote (None = sem diário)
+            workers: Número de threads (None = padrão do ThreadPoolExecutor)
+            progress: Função opcional chamada a cada bloco de arquivos com (concluídos, total,
+                      arquivos por segundo)
+            is_canceled: Função opcional; quando retorna True os arquivos ainda não
+                         iniciados ficam pendentes
+        
+        Returns:
+            Resultados no formato de apply_edits, na ordem dos alvos, só dos arquivos processados
+        """
+        journal = None
+        if journal_path:
+            journal = WriteJournal.create(journal_path, targets, repair_groups, self.fsync, self.snapshots)
+        items = [(i, file_path, cluster, group) for i, (file_path, cluster, group) in enumerate(targets)]
+        return self._run_batch(items, repair_groups, journal, workers, progress, is_canceled)
+    
+    def resume_batch(self, journal_path, workers=None, progress=None, is_canceled=None):
+        """
+        Conclui um lote interrompido, aplicando só os arquivos pendentes no diário
+        
+        Um arquivo gravado pouco antes da interrupção (ainda pendente no diário) já tem as
+        edições, então não é regravado.
+        
+        Returns:
+            Resultados dos arquivos processados (ver execute_batch), ou None se o diário não existe
+        """
+        journal = WriteJournal.load(journal_path, self.fsync, self.snapshots)
+        if journal is None:
+            return None
+        print(f"Resuming batch: {len(journal.pending())} of {len(journal.entries)} files pending")
+        return self._run_batch(journal.pending(), journal.repair_groups, journal, workers, progress, is_canceled)
+    
+    def rollback_batch(self, journal_path):
+        """
+        Desfaz um lote interrompido, restaurando os bytes originais dos arquivos já gravados
+        
+        O diário é apagado ao final.
+        
+        Returns:
+            Resultados no formato de apply_edits ('written' = arquivo restaurado), ou None
+            se o diário não existe
+        """
+        journal = WriteJournal.load(journal_path, self.fsync, self.snapshots)
+        if journal is None:
+            return None
+        
+        results = []
+        with AtomicWriter(fsync=self.fsync) as writer:
+            for i, entry in enumerate(journal.entries):
+                original = journal.load_original(i)
+                if original is None:
+                    continue
+                file_path = entry['path']
+                result = self._new_result(file_path, self.ids_by_path.get(file_path))
+                try:
+                    with open(file_path, 'rb') as f:
+                        current = f.read()
+                    if current == original:
+                        result['unchanged'] = True
+                    else:
+                        writer.write_bytes(file_path, original)
+                        result['written'] = True
+                        content = original.decode('utf-8', errors='replace')
+                        result['new_cluster'], result['new_group'] = self._reindex_file(file_path, content)
+                except OSError as e:
+                    result['error'] = str(e)
+                    print(f"Error restoring {file_path}: {str(e)}")
+                results.append(result)
+        
+        self._index_written(results)
+        restored = sum(1 for result in results if result['written'])
+        failed = sum(1 for result in results if result['error'])
+        if failed:
+            # Mantém o diário: os originais que não puderam ser restaurados continuam guardados
+            journal.close()
+        else:
+            journal.discard()
+        print(f"Rolled back batch: {restored} files restored, {failed} errors")
+        return results
+    
+    def undo(self, count=1, force=False):
+        """
+        Desfaz as últimas operações registradas no SnapshotStore, da mais recente para a mais antiga
+        
+        Um arquivo modificado depois da operação (conteúdo diferente do gravado por ela) não
+        é restaurado, a menos que force seja True; nesse caso a operação continua no
+        histórico só com esses arquivos e as mais antigas não são desfeitas. Arquivos que
+        já têm o conteúdo original são considerados desfeitos.
+        
+        Args:
+            count: Número de operações a desfazer
+            force: Se True, restaura os arquivos mesmo que tenham sido modificados depois
+        
+        Returns:
+            Resultados no formato de apply_edits ('written' = arquivo restaurado)
+        """
+        if self.snapshots is None:
+            raise RuntimeError("Undo snapshots are not enabled")
+        
+        results = []
+        for operation in self.snapshots.operations()[:count]:
+            operation_results = []
+            remaining = []  # Entradas que não puderam ser desfeitas
+            with AtomicWriter(fsync=self.fsync) as writer:
+                for entry in operation['files']:
+                    file_path = entry['path']
+                    result = self._new_result(file_path, self.ids_by_path.get(file_path))
+                    try:
+                        current = file_digest(file_path)
+                        if current == entry['hash']:
+                            # Já restaurado (por exemplo, numa tentativa anterior interrompida por um conflito)
+                            result['unchanged'] = True
+                        elif not force and current != entry['written']:
+                            result['error'] = "file was modified after the operation"
+                        else:
+                            original = self.snapshots.get(entry['hash'])
+                            writer.write_bytes(file_path, original)
+                            result['written'] = True
+                            content = original.decode('utf-8', errors='replace')
+                            result['new_cluster'], result['new_group'] = self._reindex_file(file_path, content)
+                    except Exception as e:
+                        result['error'] = str(e)
+                    if result['error']:
+                        print(f"Cannot undo {file_path}: {result['error']}")
+                        remaining.append(entry)
+                    operation_results.append(result)
+            
+            self._index_written(operation_results)
+            results += operation_results
+            restored = sum(1 for result in operation_results if result['written'])
+            print(f"Undo '{operation['description']}': {restored} of {len(operation_results)} files restored")
+            if remaining:
+                self.snapshots.update_operation(operation['id'], remaining)
+                break
+            self.snapshots.remove_operation(operation['id'])
+        return results
+    
+    def _run_batch(self, items, repair_groups, journal, workers, progress, is_canceled):
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def prepare(item):
+            # Roda nas threads do pool: leitura, edição em memória e cópia do original
+            i, file_path, cluster, group = item
+            result = self._new_result(file_path, None)
+            content = digest = None
+            try:
+                data, original = self._read_for_edit(file_path, repair_groups)
+                # Sem mensagens por arquivo: elas se misturariam entre as threads
+                edited, result['repaired'], result['cluster'], result['group'] = self._edit_content(
+                    original, file_path, cluster, group, repair_groups, verbose=False)
+                if edited == original:
+                    result['unchanged'] = result['repaired'] or result['cluster'] or result['group']
+                elif result['repaired'] or result['cluster'] or result['group']:
+                    content = edited
+                    if journal is not None:
+                        # Com snapshots, o objeto do diário é o mesmo do snapshot (guardado uma vez só)
+                        digest = journal.save_original(i, data)
+                    if snapshot is not None and digest is None:
+                        digest = self.snapshots.put(data)
             except Exception as e:
-                print(f"Error updating cluster in {file_path}: {str(e)}")
+                result['error'] = str(e)
+            return i, result, content, digest
+        
+        def write(prepared):
+            # Roda nas threads do pool, depois que as cópias dos originais do bloco estão em disco
+            i, result, content, digest = prepared
+            if content is not None:
+                try:
+                    written = writer.write_text(result['path'], content)
+                    result['written'] = True
+                    if snapshot is not None:
+                        snapshot.add(result['path'], digest, written)
+                except Exception as e:
+                    result['error'] = str(e)
+            return prepared
         
-        return count
+        results = {}
+        total = len(items)
+        started = time.perf_counter()
+        snapshot = self._begin_snapshot([item[2] for item in items], [item[3] for item in items], repair_groups)
+        try:
+            with AtomicWriter(fsync=self.fsync) as writer, ThreadPoolExecutor(max_workers=workers) as pool:
+                # Blocos do tamanho do lote de sincronização de pastas do writer: o diário é
+                # sincronizado uma vez por bloco, antes de qualquer arquivo do bloco ser substituído
+                chunk_size = writer.dir_sync_batch
+                for start in range(0, total, chunk_size):
+                    if is_canceled is not None and is_canceled():
+                        # Os arquivos ainda não iniciados ficam pendentes no diário
+                        break
+                    prepared = list(pool.map(prepare, items[start:start + chunk_size]))
+                    if journal is not None:
+                        journal.sync()
+                    for i, result, content, _ in pool.map(write, prepared):
+                        file_path = result['path']
+                        # Registros e catálogo só são alterados nesta thread
+                        result['id'] = self.ids_by_path.get(file_path)
+                        if result['written']:
+                            result['new_cluster'], result['new_group'] = self._reindex_file(file_path, content)
+                        elif result['error']:
+                            print(f"Error updating {file_path}: {result['error']}")
+                        if journal is not None:
+                            journal.mark(i, FAILED if result['error'] else APPLIED, result['written'],
+                                         result['error'])
+                        results[i] = result
+                    
+                    if progress is not None:
+                        elapsed = time.perf_counter() - started
+                        progress(len(results), total, len(results) / elapsed if elapsed > 0 else 0.0)
+        finally:
+            if snapshot is not None:
+                # Também num lote cancelado: os arquivos já gravados podem ser desfeitos
+                snapshot.commit()
+            if journal is not None:
+                if journal.pending():
+                    journal.close()
+                else:
+                    journal.discard()
+        
+        ordered = [results[i] for i, _, _, _ in items if i in results]
+        self._index_written(ordered)
+        
+        elapsed = time.perf_counter() - started
+        written = sum(1 for result in ordered if result['written'])
+        rate = len(ordered) / elapsed if elapsed > 0 else 0.0
+        print(f"Batch: {len(ordered)} of {total} files processed ({written} written) "
+              f"in {elapsed:.2f}s, {rate:.0f} files/s")
+        return ordered
+    
+    def _reindex_file(self, file_path, content):
+        """
+        Atualiza o registro escaneado e o catálogo com os valores gravados no arquivo
+        
+        A data de modificação do registro também é atualizada, para que a gravação não
+        seja tomada por uma alteração externa (e relida) por refresh_folders.
+        
+        Returns:
+            Tupla (cluster, grupo) gravados
+        """
+        cluster, group, _ = scan_metadata(content)
+        cluster = cluster or ""
+        group = group or ""
+        preset_id = self.ids_by_path.get(file_path)
+        if preset_id is not None:
+            record = self.xmp_files[preset_id]
+            self.catalog.update(preset_id, record, cluster, group)
+            try:
+                record.mtime_ns = os.stat(file_path).st_mtime_ns
+            except OSError:
+                pass
+        return cluster, group
+    
+    def _repair_content(self, content, file_path, verbose=True):
+        """Aplica repair_group_tags e reporta os problemas como fix_malformed_group_tags sempre fez"""
+        name = os.path.basename(file_path)
+        group_name = extract_group_for_repair(content, file_path)
+        if not group_name:
+            if verbose:
+                print(f"Não foi possível extrair nome do grupo para {name}")
+            return content, False
+        
+        fixed_content = repair_group_tags(content, group_name)
+        if fixed_content is None:
+            if verbose:
+                print(f"Não foi possível encontrar as tags rdf:Description em {name}")
+            return content, False
+        
+        if verbose:
+            print(f"Fixed group tag in {name}")
+        return fixed_content, True
+    
+    def _write_file(self, file_path, content, writer=None):
+        """Grava o arquivo de forma atômica (ver AtomicWriter), com o writer do lote ou um avulso; retorna os bytes gravados"""
+        if writer is not None:
+            return writer.write_text(file_path, content)
+        with AtomicWriter(fsync=self.fsync) as single_writer:
+            return single_writer.write_text(file_path, content)
+    
+    def update_cluster(self, file_paths, new_cluster):
+        """
+        Atualiza o valor do cluster nos arquivos XMP especificados.
+        Também aplica a correção nas tags de grupo para garantir que o arquivo fique consistente.
+        Arquivos que já estão assim não são regravados nem contados.
+        """
+        results = self.apply_edits(file_paths, cluster=new_cluster, repair_groups=True)
+        return sum(1 for result in results if result['cluster'] and result['written'])
     
     def update_group(self, file_paths, new_group):
         """
@@ -192,66 +1507,10 @@ class XMPManager:
         Em vez de tentar reparar tags malformadas, esta implementação remove
         completamente todas as tags crs:Group existentes e insere uma nova tag
         com o formato correto.
+        Arquivos que já estão assim não são regravados nem contados.
         """
-        count = 0
-        
-        for file_path in file_paths:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                updated_content = content
-                
-                # Remover QUALQUER tag crs:Group existente (independente de formatação)
-                # Primeiro, tentar encontrar todas as possíveis variações de tags de grupo
-                group_patterns = [
-                    r'<crs:Group>.*?</crs:Group>',  # Tag completa com qualquer conteúdo
-                    r'<crs:Group\s*>.*?</crs:Group\s*>',  # Variação com espaços
-                    r'<crs:Group>[^<]*</rdf:li></rdf:Alt></crs:Group>',  # Grupo malformado com texto solto
-                    r'[^<]*</rdf:li></rdf:Alt></crs:Group>',  # Apenas fechamento sem abertura
-                    r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li[^>]*>.*?</rdf:li>.*?</rdf:Alt>.*?</crs:Group>',  # Grupo bem formado
-                ]
-                
-                # Remover todas as ocorrências de cada padrão
-                for pattern in group_patterns:
-                    updated_content = re.sub(pattern, '', updated_content, flags=re.DOTALL)
-                
-                # Limpar linhas em branco ou espaços que possam ter sido deixados
-                updated_content = re.sub(r'\n\s*\n', '\n', updated_content)
-                
-                # Criar uma nova tag Group com o formato correto
-                new_group_xml = f'   <crs:Group>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">{new_group}</rdf:li>\n    </rdf:Alt>\n   </crs:Group>\n'
-                
-                # Inserir a nova tag antes de </rdf:Description>
-                description_end = updated_content.find('</rdf:Description>')
-                if description_end != -1:
-                    # Encontrar o último elemento antes do fechamento da Description
-                    # para posicionar corretamente a nova tag
-                    last_tag_end = updated_content.rfind('>', 0, description_end)
-                    if last_tag_end != -1:
-                        # Inserir a nova tag após o último elemento e antes do fechamento da Description
-                        updated_content = updated_content[:last_tag_end+1] + '\n' + new_group_xml + updated_content[last_tag_end+1:]
-                        changes = 1
-                    else:
-                        # Fallback: inserir antes do fechamento da Description
-                        updated_content = updated_content[:description_end] + new_group_xml + updated_content[description_end:]
-                        changes = 1
-                else:
-                    # Se não encontrar </rdf:Description>, não há como inserir o grupo
-                    print(f"Não foi possível encontrar tag de fechamento rdf:Description em {file_path}")
-                    changes = 0
-                
-                # Escrever o conteúdo atualizado de volta ao arquivo
-                if changes > 0:
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(updated_content)
-                    count += 1
-                    print(f"Grupo atualizado com sucesso em {os.path.basename(file_path)}")
-                
-            except Exception as e:
-                print(f"Error updating group in {file_path}: {str(e)}")
-        
-        return count
+        results = self.apply_edits(file_paths, group=new_group)
+        return sum(1 for result in results if result['group'] and result['written'])
     
     def detect_cluster_group_from_path(self, file_path, base_path):
         """
@@ -275,7 +1534,8 @@ class XMPManager:
             group_parts = parts[1:-1]  # Do segundo até antes do arquivo
             group = ' - '.join(group_parts)
             
-            return cluster, group.strip()
+            # Sugestões de milhares de arquivos repetem os mesmos poucos valores
+            return sys.intern(cluster), sys.intern(group.strip())
         except Exception as e:
             print(f"Error detecting cluster/group from path: {str(e)}")
             return '', ''
@@ -294,18 +1554,18 @@ class XMPManager:
         discoveries = []
         
         for file_info in self.xmp_files:
-            file_path = file_info['path']
+            file_path = file_info.path
             auto_cluster, auto_group = self.detect_cluster_group_from_path(file_path, base_folder)
             
             discoveries.append({
                 'file_info': file_info,
                 'path': file_path,
-                'current_cluster': file_info['cluster'],
-                'current_group': file_info['group'],
+                'current_cluster': file_info.cluster,
+                'current_group': file_info.group,
                 'suggested_cluster': auto_cluster,
                 'suggested_group': auto_group,
-                'needs_cluster_update': auto_cluster != file_info['cluster'] and auto_cluster != '',
-                'needs_group_update': auto_group != file_info['group'] and auto_group != ''
+                'needs_cluster_update': auto_cluster != file_info.cluster and auto_cluster != '',
+                'needs_group_update': auto_group != file_info.group and auto_group != ''
             })
         
         return discoveries
@@ -324,160 +1584,86 @@ class XMPManager:
         Returns:
             Número de arquivos corrigidos
         """
-        count = 0
+        results = self.apply_edits(file_paths, repair_groups=True)
+        return sum(1 for result in results if result['repaired'] and result['written'])
+
+    def create_backup(self, backup_path, base_folder, file_paths=None, progress_callback=None, should_cancel=None):
+        """
+        Cria um arquivo ZIP com os arquivos XMP, preservando a estrutura de pastas
         
-        for file_path in file_paths:
-            try:
-                # Ler o conteúdo do arquivo
-                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    original_content = f.read()
-                
-                # Tentar extrair o nome do grupo do arquivo atual
-                group_name = None
-                
-                # Padrões para tentar extrair o nome do grupo existente (qualquer formato)
-                extraction_patterns = [
-                    # Grupo bem formado
-                    r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li xml:lang="x-default">(.*?)</rdf:li>',
-                    # Grupo com indentação variada
-                    r'<crs:Group>\s*<rdf:Alt>\s*<rdf:li[^>]*>(.*?)</rdf:li>',
-                    # Texto solto seguido de fechamentos de tag
-                    r'([^<>]+)</rdf:li></rdf:Alt></crs:Group>',
-                    # Outro formato possível
-                    r'<crs:Group><rdf:Alt><rdf:li xml:lang="x-default">(.*?)</rdf:li></rdf:Alt></crs:Group>'
-                ]
-                
-                # Procurar pelo nome do grupo usando todos os padrões
-                for pattern in extraction_patterns:
-                    match = re.search(pattern, original_content, re.DOTALL)
-                    if match:
-                        extracted_name = match.group(1).strip()
-                        if extracted_name and len(extracted_name) < 100:  # Limite razoável para nome de grupo
-                            group_name = extracted_name
-                            print(f"Nome do grupo extraído: '{group_name}' de {os.path.basename(file_path)}")
+        Args:
+            backup_path: Caminho do arquivo ZIP a ser criado
+            base_folder: Pasta raiz da biblioteca; o ZIP contém esta pasta e suas subpastas
+            file_paths: Arquivos a incluir (padrão: todos os arquivos escaneados)
+            progress_callback: Função opcional chamada como progress_callback(concluídos, total, nome_do_arquivo)
+            should_cancel: Função opcional; quando retorna True o backup é interrompido
+        
+        Returns:
+            Número de arquivos incluídos, ou None se o backup foi cancelado
+        """
+        import zipfile
+        
+        if file_paths is None:
+            file_paths = [file_info.path for file_info in self.xmp_files]
+        
+        total_files = len(file_paths)
+        parent_folder = os.path.dirname(base_folder)
+        
+        # O ZIP é montado num arquivo temporário e só substitui backup_path quando está completo
+        temp_path = f"{backup_path}.{os.getpid()}{TEMP_SUFFIX}"
+        completed = False
+        try:
+            with open(temp_path, 'wb') as f:
+                with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for i, file_path in enumerate(file_paths):
+                        if should_cancel and should_cancel():
                             break
-                
-                # Se não encontramos um nome de grupo, tentar extrair do caminho do arquivo
-                if not group_name:
-                    try:
-                        # Usar o nome da pasta como grupo
-                        parent_folder = os.path.basename(os.path.dirname(file_path))
-                        if parent_folder and parent_folder != "Settings":
-                            group_name = parent_folder
-                            print(f"Nome do grupo extraído do caminho: '{group_name}' para {os.path.basename(file_path)}")
-                    except:
-                        pass
-                
-                # Se não conseguimos extrair um nome de grupo, não podemos corrigir este arquivo
-                if not group_name:
-                    print(f"Não foi possível extrair nome do grupo para {os.path.basename(file_path)}")
-                    continue
-                
-                # Abordagem de reconstrução completa:
-                # 1. Separar o arquivo em três partes: início da tag Description, conteúdo e fechamento
-                # 2. Remover completamente qualquer tag Group existente do conteúdo
-                # 3. Inserir a nova tag Group logo após as propriedades principais e antes de outras tags
-                
-                # Encontrar a tag Description principal
-                desc_start_match = re.search(r'<rdf:Description rdf:about=""[^>]*>', original_content)
-                desc_end_match = re.search(r'</rdf:Description>', original_content)
-                
-                if desc_start_match and desc_end_match:
-                    desc_start_end = desc_start_match.end()
-                    desc_end_start = desc_end_match.start()
-                    
-                    # Pegar o conteúdo entre o início e o fim da Description
-                    description_content = original_content[desc_start_end:desc_end_start]
-                    
-                    # Remover todas as ocorrências de tags Group existentes
-                    removal_patterns = [
-                        r'<crs:Group>.*?</crs:Group>',
-                        r'<crs:Group\s*>.*?</crs:Group\s*>',
-                        r'[^<>]*</rdf:li></rdf:Alt></crs:Group>',
-                        r'<crs:Group>.*?<rdf:Alt>.*?<rdf:li[^>]*>.*?</rdf:li>.*?</rdf:Alt>.*?</crs:Group>'
-                    ]
-                    
-                    cleaned_content = description_content
-                    for pattern in removal_patterns:
-                        cleaned_content = re.sub(pattern, '', cleaned_content, flags=re.DOTALL)
-                    
-                    # Encontrar um ponto apropriado para inserir a tag Group
-                    # Normalmente após as propriedades (atributos) e antes das subtags
-                    
-                    # Primeiro, procurar o final dos atributos (propriedades com "=")
-                    # Eles normalmente têm um formato crs:PropertyName="value"
-                    prop_pattern = r'crs:[A-Za-z0-9]+=("[^"]*")'
-                    all_props = list(re.finditer(prop_pattern, cleaned_content))
-                    
-                    # Encontrar a posição da primeira subtag (<crs:Name>, etc.)
-                    subtag_match = re.search(r'<crs:', cleaned_content)
-                    
-                    if all_props and subtag_match:
-                        # Inserir após a última propriedade e antes da primeira subtag
-                        last_prop_end = all_props[-1].end()
-                        first_subtag_start = subtag_match.start()
                         
-                        if last_prop_end < first_subtag_start:
-                            # Tem espaço entre o último atributo e a primeira subtag - ideal
-                            insertion_point = last_prop_end
-                        else:
-                            # Inserir no início da primeira subtag
-                            insertion_point = first_subtag_start
-                    elif all_props:
-                        # Inserir após a última propriedade
-                        insertion_point = all_props[-1].end()
-                    elif subtag_match:
-                        # Inserir antes da primeira subtag
-                        insertion_point = subtag_match.start()
+                        if progress_callback:
+                            progress_callback(i, total_files, os.path.basename(file_path))
+                        
+                        # Calculate relative path for maintaining folder structure
+                        zipf.write(file_path, os.path.relpath(file_path, parent_folder))
                     else:
-                        # Não encontrou propriedades ou subtags - inserir no início
-                        insertion_point = 0
-                    
-                    # Criar a nova tag Group bem formatada
-                    new_group_xml = f'\n   <crs:Group>\n    <rdf:Alt>\n     <rdf:li xml:lang="x-default">{group_name}</rdf:li>\n    </rdf:Alt>\n   </crs:Group>\n'
-                    
-                    # Reconstituir o arquivo completo
-                    fixed_content = (
-                        original_content[:desc_start_end] +  # Início do arquivo até o fim da abertura da tag Description
-                        cleaned_content[:insertion_point] +   # Conteúdo da Description até o ponto de inserção
-                        new_group_xml +                      # Nova tag Group
-                        cleaned_content[insertion_point:] +  # Resto do conteúdo da Description
-                        original_content[desc_end_start:]     # Fechamento da Description até o fim do arquivo
-                    )
-                    
-                    # Limpar linhas em branco ou espaços extras que possam ter sido deixados
-                    fixed_content = re.sub(r'\n\s*\n', '\n', fixed_content)
-                    
-                    # Escrever o conteúdo corrigido de volta ao arquivo
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fixed_content)
-                    
-                    count += 1
-                    print(f"Fixed group tag in {os.path.basename(file_path)}")
-                else:
-                    print(f"Não foi possível encontrar as tags rdf:Description em {os.path.basename(file_path)}")
+                        completed = True
+                if completed and self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
             
-            except Exception as e:
-                print(f"Error fixing group tag in {file_path}: {str(e)}")
-        
-        return count
-
+            if completed:
+                os.replace(temp_path, backup_path)
+                if progress_callback:
+                    progress_callback(total_files, total_files, "")
+                return total_files
+        finally:
+            # Cancelado ou com erro: descartar o ZIP parcial
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return None
+    
     def batch_process_folder(self, folder_path, cluster_name=None, group_name=None):
         """Process all XMP files in a folder to update cluster and/or group"""
         files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) 
                 if f.lower().endswith('.xmp')]
         
-        cluster_count = 0
-        group_count = 0
-        
-        if cluster_name:
-            cluster_count = self.update_cluster(files, cluster_name)
-            
-        if group_name:
-            group_count = self.update_group(files, group_name)
+        # Cluster e grupo aplicados juntos: cada arquivo é lido e gravado uma única vez
+        results = self.apply_edits(
+            files,
+            cluster=cluster_name or None,
+            group=group_name or None,
+            repair_groups=bool(cluster_name)
+        )
+        cluster_count = sum(1 for result in results if result['cluster'] and result['written'])
+        group_count = sum(1 for result in results if result['group'] and result['written'])
+        unchanged_count = sum(1 for result in results if result['unchanged'])
             
         return {
             'total_files': len(files),
             'cluster_updated': cluster_count,
-            'group_updated': group_count
+            'group_updated': group_count,
+            'unchanged': unchanged_count
         }
+
+
+# Instância sem índice usada pelas tarefas de escaneamento (inclusive nos processos filhos)
+_task_manager = XMPManager()